@@ -3,10 +3,14 @@ import os
 import discord
 import dotenv
 
+from utils import loop
 from utils.extensions import DJDiscord
 
 dotenv.load_dotenv()
 
+print("Running on the %s event loop" %
+      loop.install(os.environ.get("EVENT_LOOP", "uvloop")))
+
 bot = DJDiscord(
     command_prefix=os.environ["BOT_PREFIX"],
     intents=discord.Intents(
@@ -18,5 +22,6 @@ bot = DJDiscord(
         typing=True,
     ),
 )
+loop.configure(bot.loop, int(os.environ.get("EXECUTOR_WORKERS") or 0))
 
 bot.run(os.environ["BOT_TOKEN"])
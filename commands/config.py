@@ -24,13 +24,16 @@ async def config(
         if key not in (
                 "announcement",
                 "dj_role",
+                "prefix",
         ):
             continue
 
         if value is not None:
             await ctx.database.run(
                 """UPDATE configuration SET {}=$1 WHERE ID=$2;""".format(key),
-                value.id if value is not None else value, ctx.guild.id)
+                value if key == "prefix" else value.id, ctx.guild.id)
+            if key == "prefix":
+                ctx.bot.prefixes.set(ctx.guild.id, value)
 
     return await ctx.send(args)
 
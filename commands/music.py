@@ -1,3 +1,5 @@
+import asyncio
+import os
 import typing
 import uuid
 
@@ -6,13 +8,17 @@ import discord
 import datetime
 import PIL.Image
 import PIL.ImageDraw
+import aiohttp
 import discord.ext.commands
 import discord.ext.commands
 import discord.ext.menus
 import lavalink
 import rethinkdb
+import youtube_dl
 
-from utils.exceptions import OutOfBoundVolumeError, VolumeTypeError
+from utils.exceptions import OutOfBoundVolumeError, VolumeTypeError, PlayerNotFoundError, PlaylistGivenError
+from utils.exceptions import CircuitOpenError, NoResultsError, RateLimitedError
+from utils.exceptions import PlaylistFormatError
 from utils.convert import IndexConverter
 from utils.convert import TrackPositionConverter
 from utils.convert import PlaylistConverter
@@ -20,9 +26,17 @@ from utils.convert import PlaylistPaginator
 from utils.convert import SongConverter
 from utils.convert import StationConverter
 from utils.convert import VolumeConverter
+from utils.convert import resolve_song
+from utils.convert import spotify_search
+from utils.equalizer import BUILTIN_PRESETS, MAX_PRESET_NAME, apply_gains
 from utils.extensions import DJDiscord, DJDiscordContext
+from utils import tracing
+from utils import transfer
+from utils.spotify import parse_url
 from utils.objects import (
     Playlist,
+    Song,
+    TrackMeta,
     BeforeCogInvokeOp,
     AfterCogInvokeOp,
     ErrorOp,
@@ -48,58 +62,148 @@ def milliseconds_to_str(millis: int) -> str:
     return ", ".join(formatted_arr)
 
 
+def render_progress(image: PIL.Image.Image, position: float,
+                    duration: float) -> bytes:
+    """render_progress -> Draw the playback position onto the progress bar and encode it as a PNG"""
+    with io.BytesIO() as buffer:
+        draw = PIL.ImageDraw.Draw(image)
+        per = (position / duration) * 600
+        draw.ellipse([per, 8, per + 34, 42], fill=(255, 127, 81))
+        PIL.ImageDraw.floodfill(image,
+                                xy=(14, 24),
+                                value=(255, 127, 81),
+                                thresh=40)
+        image.save(buffer, format="png")
+        return buffer.getvalue()
+
+
+def now_playing_embed(meta: TrackMeta) -> discord.Embed:
+    embed = discord.Embed(title="Now playing", color=0xDC333C)
+    if meta.kind == TrackMeta.SONG:
+        embed.add_field(name="Song Title", value=meta.title, inline=False)
+        embed.add_field(name="Song Author", value=meta.uploader, inline=False)
+        embed.add_field(name="Song Duration",
+                        value=milliseconds_to_str(meta.duration),
+                        inline=False)
+        embed.add_field(name="Original Link",
+                        value="[Click Here](%s)" % meta.url,
+                        inline=False)
+    else:
+        embed.add_field(name="Radio Station Call Sign",
+                        value=meta.title,
+                        inline=False)
+        embed.add_field(name='Radio Station Frequency',
+                        value=meta.uploader,
+                        inline=False)
+        embed.add_field(name="Radio Station Link",
+                        value="[Click Here]({})".format(meta.url),
+                        inline=False)
+    if meta.thumbnail:
+        embed.set_thumbnail(url=meta.thumbnail)
+    return embed
+
+
 class Music(discord.ext.commands.Cog):
     """The voice/music commands that you love"""
+    # Commands that may create a player and connect it to the author's channel
+    connect_commands = ("play", "rawplay", "radiostart")
+    # Commands that only make sense with an existing player
+    player_commands = ("position", "equalizer", "equalizer preset",
+                       "equalizer save", "equalizer reset", "now", "volume",
+                       "skip", "loop", "stop")
+
     def __init__(self, bot: discord.ext.commands.Bot):
         self.bot = bot
+        self.import_concurrency = int(
+            os.environ.get("SPOTIFY_IMPORT_CONCURRENCY", 4))
+        self._prefetched: typing.Dict[int, typing.Tuple[lavalink.AudioTrack,
+                                                        discord.Embed]] = {}
+        self._prefetching: typing.Set[int] = set()
+        self._progress_image: typing.Optional[PIL.Image.Image] = None
         lavalink.add_event_hook(self.on_track_start,
                                 event=lavalink.TrackStartEvent)
         lavalink.add_event_hook(self.on_queue_end,
                                 event=lavalink.QueueEndEvent)
 
     async def on_track_start(self, event: lavalink.TrackStartEvent):
-        embed = discord.Embed(title="Now playing",
-                              color=0xDC333C,
-                              timestamp=datetime.datetime.now())
-        if "thumbnails" in event.track.extra.get("raw_info"):
-            embed.add_field(name="Song Title",
-                            value=event.track.title,
-                            inline=False)
-            embed.add_field(name="Song Author",
-                            value=event.track.author,
-                            inline=False)
-            embed.add_field(name="Song Duration",
-                            value=milliseconds_to_str(event.track.duration),
-                            inline=False)
-            embed.add_field(name="Original Link",
-                            value="[Click Here](%s)" %
-                            event.track.extra["raw_info"]["url"],
-                            inline=False)
-            embed.set_thumbnail(
-                url=event.track.extra["raw_info"]["thumbnails"][-1]["url"])
+        prepared = self._prefetched.pop(event.player.guild_id, None)
+        if prepared is not None and prepared[0] is event.track:
+            embed = prepared[1]
         else:
-            embed.add_field(name="Radio Station Call Sign",
-                            value=event.track.extra["raw_info"]["call_sign"],
-                            inline=False)
-            embed.add_field(name='Radio Station Frequency',
-                            value=event.track.extra["raw_info"]["frequency"],
-                            inline=False)
-            embed.add_field(name="Radio Station Link",
-                            value="[Click Here]({})".format(
-                                event.track.extra["raw_info"]["url"]),
-                            inline=False)
-            embed.set_thumbnail(url=event.track.extra["raw_info"]["thumbnail"])
-        await event.track.extra["context"].send(embed=embed)
+            embed = now_playing_embed(event.track.extra["meta"])
+        embed.timestamp = datetime.datetime.now()
+
+        channel = self.bot.get_channel(event.player.fetch("channel"))
+        if channel is not None:
+            await channel.send(embed=embed)
+
+        self.schedule_prefetch(event.player)
 
     async def on_queue_end(self, event: lavalink.QueueEndEvent):
+        self._prefetched.pop(event.player.guild_id, None)
         ws = self.bot._connection._get_websocket(event.player.guild_id)
         await ws.voice_state(str(event.player.guild_id), None)
 
+    def schedule_prefetch(self, player: lavalink.DefaultPlayer) -> None:
+        if not player.queue or player.guild_id in self._prefetching:
+            return
+
+        prepared = self._prefetched.get(player.guild_id)
+        if prepared is None or prepared[0] is not player.queue[0]:
+            self._prefetching.add(player.guild_id)
+            tracing.detach(self.bot.loop, self.prefetch(player))
+
+    async def prefetch(self, player: lavalink.DefaultPlayer) -> None:
+        """**`[coroutine]`** prefetch -> Validate the next queued track and prepare its announcement
+
+        Tracks whose source no longer loads are dropped from the queue before playback reaches them"""
+        try:
+            while player.queue:
+                track = player.queue[0]
+                try:
+                    await self.bot.get_tracks(player.node, track.uri)
+                except NoResultsError:
+                    if track in player.queue:
+                        player.queue.remove(track)
+                    continue
+                except Exception:
+                    # Our own outage isn't a reason to throw the track away
+                    pass
+
+                self._prefetched[player.guild_id] = (
+                    track, now_playing_embed(track.extra["meta"]))
+                return
+        finally:
+            self._prefetching.discard(player.guild_id)
+
+    @property
+    def progress_image(self) -> PIL.Image.Image:
+        if self._progress_image is None:
+            self._progress_image = PIL.Image.open(
+                "./assets/progress.png").convert("RGB")
+        return self._progress_image.copy()
+
+    async def cog_check(self, ctx: DJDiscordContext) -> bool:
+        if (ctx.guild is not None
+                and ctx.command.qualified_name in self.player_commands
+                and ctx.player is None):
+            raise PlayerNotFoundError
+        return True
+
+    async def bot_check_once(self, ctx: DJDiscordContext) -> bool:
+        # Runs before arguments are converted, so a throttled command never reaches youtube_dl.
+        # The command's own checks go first, a command that can't run isn't charged for
+        if await ctx.command.can_run(ctx):
+            await ctx.bot.admission.admit(ctx)
+        return True
+
     async def cog_before_invoke(self, ctx: DJDiscordContext) -> None:
         if ctx.guild is None:
             return
 
-        if ctx.author.voice is not None:
+        if ctx.author.voice is not None and (
+                ctx.command.name in self.connect_commands
+                or ctx.command.qualified_name in self.player_commands):
             await self.ensure_voice(ctx)
 
         await ctx.database.log(
@@ -114,6 +218,20 @@ class Music(discord.ext.commands.Cog):
 
     async def cog_command_error(self, ctx: DJDiscordContext,
                                 error: Exception) -> None:
+        if isinstance(error, (PlayerNotFoundError, RateLimitedError)):
+            await ctx.send(str(error))
+            return
+        if isinstance(getattr(error, "original", None), NoResultsError):
+            await ctx.send("I couldn't find anything to play for that")
+            return
+        if isinstance(getattr(error, "original", None), CircuitOpenError):
+            await ctx.send(str(error.original))
+            return
+        if isinstance(getattr(error, "original", None), PlaylistGivenError):
+            await ctx.send(
+                "That's a playlist, use `%sspotify <link>` to import it" %
+                ctx.prefix)
+            return
         if hasattr(error, "original") and isinstance(error.original, (
                 VolumeTypeError,
                 OutOfBoundVolumeError,
@@ -127,12 +245,18 @@ class Music(discord.ext.commands.Cog):
         print(f"An error occurred during command runtime. Case ID: {_id.hex}")
 
     async def ensure_voice(self, ctx: DJDiscordContext):
-        if not ctx.player.is_connected:
+        if ctx.player is None or not ctx.player.is_connected:
+            if ctx.command.name not in self.connect_commands:
+                return
+
             permissions = ctx.author.voice.channel.permissions_for(ctx.me)
 
             if not permissions.connect or not permissions.speak:  # Check user limit too?
                 raise discord.ext.commands.CommandInvokeError(
                     'I need the `CONNECT` and `SPEAK` permissions.')
+
+            if ctx.player is None:
+                ctx.create_player()
         else:
             if int(ctx.player.channel_id) != ctx.author.voice.channel.id:
                 raise discord.ext.commands.CommandInvokeError(
@@ -159,22 +283,28 @@ class Music(discord.ext.commands.Cog):
                 )
             playlist = Playlist.from_json(playlist)
 
-        ws = ctx.bot._connection._get_websocket(ctx.guild.id)
-        await ws.voice_state(str(ctx.guild.id),
-                             str(ctx.author.voice.channel.id))
+        await ctx.update_voice_state(ctx.author.voice.channel.id)
+        ctx.player.store("channel", ctx.channel.id)
 
         for song in playlist.songs:
-            results = await ctx.player.node.get_tracks(song["url"])
+            try:
+                results = await ctx.get_tracks(song.url)
+            except NoResultsError:
+                continue
 
-            track = lavalink.AudioTrack(results["tracks"][0],
-                                        requester=ctx.author.id,
-                                        context=ctx,
-                                        raw_info=song)
+            track = lavalink.AudioTrack(
+                results["tracks"][0],
+                requester=ctx.author.id,
+                meta=TrackMeta.from_song(
+                    song, results["tracks"][0]["info"]["length"]))
 
             ctx.player.add(requester=ctx.author.id, track=track)
 
         if not ctx.player.is_playing:
-            await ctx.player.play()
+            with tracing.span("lavalink.play"):
+                await ctx.player.play()
+        else:
+            self.schedule_prefetch(ctx.player)
 
     @discord.ext.commands.command(name="position", aliases=["pos"])
     async def position(self, ctx: DJDiscordContext, position: TrackPositionConverter) -> None:
@@ -194,8 +324,11 @@ class Music(discord.ext.commands.Cog):
 
         return await ctx.send("Changed position on track")
 
-    @discord.ext.commands.command(name="equalizer", aliases=["eq"])
+    @discord.ext.commands.group(name="equalizer",
+                                aliases=["eq"],
+                                invoke_without_command=True)
     async def equalizer(self, ctx: DJDiscordContext, band: int, gain: float):
+        """Sets one band of the equalizer, use a preset to shape the whole curve at once"""
         if band > 14 or band < 0:
             return await ctx.send("You have sent a band that is out of range")
         if gain > 1 or gain < -0.25:
@@ -205,6 +338,65 @@ class Music(discord.ext.commands.Cog):
 
         return await ctx.send("Equalizer: Set {} to {}".format(band, gain))
 
+    @equalizer.command(name="preset", aliases=["use"])
+    @discord.ext.commands.guild_only()
+    async def equalizer_preset(self, ctx: DJDiscordContext,
+                               name: str) -> discord.Message:
+        """Switches the equalizer to a built-in or saved preset in one update"""
+        gains = await ctx.bot.presets.get(ctx.guild.id, name)
+        if gains is None:
+            return await ctx.send(
+                "There's no preset called `%s`, see `%sequalizer presets`" %
+                (name, ctx.prefix))
+
+        await apply_gains(ctx.player, gains)
+        return await ctx.send("Equalizer: Switched to `%s`" % name.casefold())
+
+    @equalizer.command(name="presets", aliases=["list"])
+    @discord.ext.commands.guild_only()
+    async def equalizer_presets(self, ctx: DJDiscordContext) -> discord.Message:
+        """Lists the built-in presets and the ones saved in this server"""
+        saved = await ctx.bot.presets.of(ctx.guild.id)
+        return await ctx.send(embed=discord.Embed(
+            title="Equalizer Presets", color=0xDC333C
+        ).add_field(
+            name="Built-in", value=", ".join("`%s`" % name for name in BUILTIN_PRESETS)
+        ).add_field(
+            name="This server", value=", ".join("`%s`" % name for name in sorted(saved)) or "None yet"
+        ))
+
+    @equalizer.command(name="save")
+    @discord.ext.commands.guild_only()
+    async def equalizer_save(self, ctx: DJDiscordContext,
+                             name: str) -> discord.Message:
+        """Saves the current equalizer curve as a preset for this server"""
+        if name.casefold() in BUILTIN_PRESETS:
+            return await ctx.send("`%s` is a built-in preset" % name)
+        if len(name) > MAX_PRESET_NAME:
+            return await ctx.send("Preset names can be up to %d characters" %
+                                  MAX_PRESET_NAME)
+
+        await ctx.bot.presets.save(ctx.guild.id, name, ctx.player.equalizer)
+        return await ctx.send("Equalizer: Saved the current curve as `%s`" %
+                              name.casefold())
+
+    @equalizer.command(name="delete", aliases=["remove"])
+    @discord.ext.commands.guild_only()
+    async def equalizer_delete(self, ctx: DJDiscordContext,
+                               name: str) -> discord.Message:
+        """Deletes a preset saved in this server"""
+        if not await ctx.bot.presets.delete(ctx.guild.id, name):
+            return await ctx.send("There's no saved preset called `%s`" %
+                                  name)
+        return await ctx.send("Equalizer: Deleted `%s`" % name.casefold())
+
+    @equalizer.command(name="reset", aliases=["flat"])
+    @discord.ext.commands.guild_only()
+    async def equalizer_reset(self, ctx: DJDiscordContext) -> discord.Message:
+        """Flattens every band"""
+        await apply_gains(ctx.player, BUILTIN_PRESETS["flat"])
+        return await ctx.send("Equalizer: Reset")
+
     @discord.ext.commands.command(name="rawplay", alias=["rawstart", "rawrun"])
     async def rawplay(self, ctx: DJDiscordContext, *,
                       query: SongConverter) -> None:
@@ -214,21 +406,27 @@ class Music(discord.ext.commands.Cog):
                 "You need to be connected to a channel in order to start playing music"
             )
 
-        ws = ctx.bot._connection._get_websocket(ctx.guild.id)
-        await ws.voice_state(str(ctx.guild.id),
-                             str(ctx.author.voice.channel.id))
+        if query is None:
+            return await ctx.send("I couldn't find that song")
 
-        results = await ctx.player.node.get_tracks(query.url)
+        await ctx.update_voice_state(ctx.author.voice.channel.id)
+        ctx.player.store("channel", ctx.channel.id)
 
-        track = lavalink.AudioTrack(results["tracks"][0],
-                                    requester=ctx.author.id,
-                                    context=ctx,
-                                    raw_info=query.json)
+        results = await ctx.get_tracks(query.url)
+
+        track = lavalink.AudioTrack(
+            results["tracks"][0],
+            requester=ctx.author.id,
+            meta=TrackMeta.from_song(query,
+                                     results["tracks"][0]["info"]["length"]))
 
         ctx.player.add(requester=ctx.author.id, track=track)
 
         if not ctx.player.is_playing:
-            await ctx.player.play()
+            with tracing.span("lavalink.play"):
+                await ctx.player.play()
+        else:
+            self.schedule_prefetch(ctx.player)
 
     @discord.ext.commands.command(name="now")
     async def now(self, ctx: DJDiscordContext) -> None:
@@ -241,68 +439,58 @@ class Music(discord.ext.commands.Cog):
         if not ctx.player.is_playing:
             return await ctx.send("The bot isn't playing any music")
 
-        if "created" in ctx.player.current.extra.get("raw_info"):
-            with io.BytesIO() as buffer:
-                im = PIL.Image.open("./assets/progress.png").convert("RGB")
-                draw = PIL.ImageDraw.Draw(im)
-                per = (ctx.player.position / ctx.player.current.duration) * 600
-                draw.ellipse([per, 8, per + 34, 42], fill=(255, 127, 81))
-                PIL.ImageDraw.floodfill(im,
-                                        xy=(14, 24),
-                                        value=(255, 127, 81),
-                                        thresh=40)
-                im.save(buffer, format="png")
-                _file = discord.File(io.BytesIO(buffer.getvalue()),
-                                     filename="progress.png")
-
-            await ctx.send(
-                embed=discord.Embed(title="Current song in queue",
-                                    color=0xDC333C,
-                                    timestamp=datetime.datetime.now()).
-                add_field(
-                    name="Song Name",
-                    value=ctx.player.current.extra.get("raw_info")["title"],
-                    inline=False).add_field(name="Song Length",
-                                            value=milliseconds_to_str(
-                                                ctx.player.current.duration),
-                                            inline=False).
-                add_field(name="Song Uploader",
-                          value=ctx.player.current.extra.get("raw_info")
-                          ["uploader"],
-                          inline=False).
-                add_field(
-                    name="Original Link",
-                    value=
-                    "[Click Me!]({} \"this link will redirect you to the original youtube url\")"
-                    .format(ctx.player.current.extra.get("raw_info")["url"]),
-                    inline=False).set_thumbnail(
-                        url=ctx.player.current.extra.get(
-                            "raw_info")["thumbnails"][-1]["url"]).set_image(
-                                url="attachment://progress.png"),
-                file=_file)
+        meta: TrackMeta = ctx.player.current.extra["meta"]
+        if meta.kind == TrackMeta.SONG:
+            _file = discord.File(io.BytesIO(
+                render_progress(self.progress_image, ctx.player.position,
+                                ctx.player.current.duration)),
+                                 filename="progress.png")
+
+            embed = discord.Embed(title="Current song in queue",
+                                  color=0xDC333C,
+                                  timestamp=datetime.datetime.now())
+            embed.add_field(name="Song Name", value=meta.title, inline=False)
+            embed.add_field(name="Song Length",
+                            value=milliseconds_to_str(
+                                ctx.player.current.duration),
+                            inline=False)
+            embed.add_field(name="Song Uploader",
+                            value=meta.uploader,
+                            inline=False)
+            embed.add_field(
+                name="Original Link",
+                value=
+                "[Click Me!]({} \"this link will redirect you to the original youtube url\")"
+                .format(meta.url),
+                inline=False)
+            embed.set_image(url="attachment://progress.png")
+            if meta.thumbnail:
+                embed.set_thumbnail(url=meta.thumbnail)
+
+            await ctx.send(embed=embed, file=_file)
         else:
-            await ctx.send(embed=discord.Embed(
+            embed = discord.Embed(
                 title="Current radio station",
                 color=0xDC333C,
                 timestamp=datetime.datetime.now()
             ).add_field(
                 name="Radio Station Call Sign",
-                value=ctx.player.current.extra.get("raw_info")["call_sign"],
+                value=meta.title,
                 inline=False
             ).add_field(
                 name="Radio station Frequency",
-                value=ctx.
-                player.current
-                .extra.get("raw_info")
-                ["frequency"],
+                value=meta.uploader,
                 inline=False
             ).add_field(
                 name="Original Link",
                 value=
-                "[Click Me!]{} \"this link will redirect you to the original youtube url\")"
-                .format(ctx.player.current.extra.get("raw_info")["url"]),
-                inline=False).set_thumbnail(
-                    url=ctx.player.current.extra.get("raw_info")["thumbnail"]))
+                "[Click Me!]({} \"this link will redirect you to the original youtube url\")"
+                .format(meta.url),
+                inline=False)
+            if meta.thumbnail:
+                embed.set_thumbnail(url=meta.thumbnail)
+
+            await ctx.send(embed=embed)
 
     @discord.ext.commands.command(name="radiostart")
     async def radiostart(
@@ -319,21 +507,24 @@ class Music(discord.ext.commands.Cog):
                 "You have not specified a valid radio station to start playing"
             )
 
-        ws = ctx.bot._connection._get_websocket(ctx.guild.id)
-        await ws.voice_state(str(ctx.guild.id),
-                             str(ctx.author.voice.channel.id))
+        await ctx.update_voice_state(ctx.author.voice.channel.id)
+        ctx.player.store("channel", ctx.channel.id)
 
-        results = await ctx.player.node.get_tracks(station.source)
+        results = await ctx.get_tracks(station.source)
 
-        track = lavalink.AudioTrack(results["tracks"][0],
-                                    requester=ctx.author.id,
-                                    context=ctx,
-                                    raw_info=station.json)
+        track = lavalink.AudioTrack(
+            results["tracks"][0],
+            requester=ctx.author.id,
+            meta=TrackMeta.from_station(
+                station, results["tracks"][0]["info"]["length"]))
 
         ctx.player.add(track=track, requester=ctx.author.id)
 
         if not ctx.player.is_playing:
-            await ctx.player.play()
+            with tracing.span("lavalink.play"):
+                await ctx.player.play()
+        else:
+            self.schedule_prefetch(ctx.player)
 
     @discord.ext.commands.command(name="volume")
     async def volume(self, ctx: DJDiscordContext,
@@ -416,10 +607,8 @@ class Music(discord.ext.commands.Cog):
                 and ctx.author.voice.channel.id != int(ctx.player.channel_id)):
             return await ctx.send('You\'re not in my voicechannel!')
 
-        ctx.player.queue.clear()
         await ctx.player.stop()
-        ws = ctx.bot._connection._get_websocket(ctx.guild.id)
-        await ws.voice_state(str(ctx.guild.id), None)
+        await ctx.bot.reaper.destroy(ctx.guild.id)
         return await ctx.send(embed=discord.Embed(
             title="Destroyed the queue and released voice channel pointer",
             color=0xDC333C,
@@ -436,7 +625,7 @@ class Music(discord.ext.commands.Cog):
             return await ctx.send("No such song exists at index %d" % indx)
 
         await ctx.send("Removed **`%s`** from your playlist" %
-                       playlist.songs[indx - 1]["title"])
+                       playlist.songs[indx - 1].title)
         return await playlist.delete_at(ctx, indx)
 
     @discord.ext.commands.command(name="show", aliases=["list", "queue"])
@@ -450,8 +639,7 @@ class Music(discord.ext.commands.Cog):
             if not slot:
                 return await ctx.send("You haven't created a playlist yet!")
             query = slot[0]
-            playlist = Playlist(query["id"], query["songs"], query["author"],
-                                query["cover"])
+            playlist = Playlist.from_json(query)
         paginator = discord.ext.menus.MenuPages(
             source=PlaylistPaginator(playlist.songs,
                                      ctx=ctx,
@@ -464,12 +652,144 @@ class Music(discord.ext.commands.Cog):
     async def add(self, ctx: DJDiscordContext, *,
                   song: SongConverter) -> typing.Optional[discord.Message]:
         """Adds a song to the user's playlist"""
+        if song is None:
+            return await ctx.send("I couldn't find that song")
         playlist = await PlaylistConverter().convert(ctx, str(ctx.author.id))
         message = ctx.bot.templates.playlistChange.copy()
         await playlist.add_song(ctx, song)
         return await ctx.send(embed=message.add_field(
             name="New Song!", value="%s {}".format(song.title) % song.emoji))
 
+    @discord.ext.commands.command(name="spotify", aliases=["spotifyimport"])
+    async def spotify(self, ctx: DJDiscordContext,
+                      url: str) -> typing.Optional[discord.Message]:
+        """Imports every song of a Spotify playlist or album into the user's playlist"""
+        parsed = parse_url(url)
+        if parsed is None or parsed[0] == "track":
+            return await ctx.send(
+                "You need to give me a Spotify playlist or album link")
+
+        playlist = await PlaylistConverter().convert(ctx, str(ctx.author.id))
+        if playlist is None:
+            return await ctx.send("You haven't created a playlist yet!")
+
+        message = await ctx.send("Fetching songs from Spotify...")
+        semaphore = asyncio.Semaphore(self.import_concurrency)
+
+        async def _resolve(track: dict) -> typing.Optional[Song]:
+            async with semaphore:
+                try:
+                    return await resolve_song(ctx.bot,
+                                              spotify_search(track), track)
+                except (NoResultsError, youtube_dl.utils.DownloadError):
+                    return None
+
+        seen = set()
+        tasks = []
+        async for _, tracks in ctx.spotify.pages(*parsed):
+            for track in tracks:
+                key = track.get("id") or track["name"]
+                if key in seen:
+                    continue
+                seen.add(key)
+                tasks.append(ctx.bot.loop.create_task(_resolve(track)))
+
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=2.5,
+                    return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    # An open breaker or an outage fails every song left, give up on the import
+                    if task.exception() is not None:
+                        raise task.exception()
+                await message.edit(content="Resolved **%d/%d** songs" %
+                                   (len(tasks) - len(pending), len(tasks)))
+        finally:
+            for task in pending:
+                task.cancel()
+
+        known = {song.url for song in playlist.songs}
+        songs = []
+        missing = duplicates = 0
+        for task in tasks:
+            song = task.result()
+            if song is None:
+                missing += 1
+            elif song.url in known:
+                duplicates += 1
+            else:
+                known.add(song.url)
+                songs.append(song)
+
+        if songs:
+            await playlist.add_songs(ctx, songs)
+
+        return await message.edit(
+            content=None,
+            embed=ctx.bot.templates.playlistChange.copy().add_field(
+                name="Imported from Spotify!",
+                value="%d added, %d already in your playlist, %d not found" %
+                (len(songs), duplicates, missing)))
+
+    @discord.ext.commands.command(name="export")
+    async def export(
+            self, ctx: DJDiscordContext) -> typing.Optional[discord.Message]:
+        """Sends the user's playlist as a file that `import` can load back, without resolving anything again"""
+        playlist = await PlaylistConverter().convert(ctx, str(ctx.author.id))
+        if playlist is None:
+            return await ctx.send("You haven't created a playlist yet!")
+
+        data = transfer.dump(playlist)
+        if len(data) > transfer.MAX_IMPORT_SIZE:
+            return await ctx.send("Your playlist is too big to export")
+        return await ctx.send(
+            "Exported **%d** songs, use `%simport` with this file attached to load them"
+            % (len(playlist.songs), ctx.prefix),
+            file=discord.File(io.BytesIO(data),
+                              filename="playlist-%s.djp" % playlist.id))
+
+    @discord.ext.commands.command(name="import")
+    async def import_(
+            self, ctx: DJDiscordContext) -> typing.Optional[discord.Message]:
+        """Adds every song of an exported playlist file to the user's playlist"""
+        if not ctx.message.attachments:
+            return await ctx.send(
+                "Attach a file made by `%sexport` to import it" % ctx.prefix)
+
+        playlist = await PlaylistConverter().convert(ctx, str(ctx.author.id))
+        if playlist is None:
+            return await ctx.send("You haven't created a playlist yet!")
+
+        attachment = ctx.message.attachments[0]
+        if attachment.size > transfer.MAX_IMPORT_SIZE:
+            return await ctx.send("That file is too big to import")
+        try:
+            documents = await transfer.load_url(attachment.url)
+        except PlaylistFormatError as error:
+            return await ctx.send(str(error))
+        except aiohttp.ClientError:
+            return await ctx.send(
+                "I couldn't download that file, try again in a bit")
+
+        known = {song.url for song in playlist.songs}
+        songs = []
+        for document in documents:
+            if document["url"] not in known:
+                known.add(document["url"])
+                songs.append(Song.from_json(document))
+
+        if songs:
+            await playlist.add_songs(ctx, songs)
+
+        return await ctx.send(
+            embed=ctx.bot.templates.playlistChange.copy().add_field(
+                name="Imported!",
+                value="%d added, %d already in your playlist" %
+                (len(songs), len(documents) - len(songs))))
+
     @discord.ext.commands.command(name="create", aliases=["new"])
     async def create(
             self, ctx: DJDiscordContext) -> typing.Optional[discord.Message]:
@@ -515,6 +835,7 @@ class Music(discord.ext.commands.Cog):
                 "id": playlist_id,
                 "author": ctx.author.id
             }).update({"cover": response.attachments[0].url}))
+        ctx.bot.playlists.invalidate(playlist_id)
 
         return await msg.edit(
             embed=discord.Embed(
@@ -0,0 +1,198 @@
+import asyncio
+import copy
+import io
+
+import discord
+import discord.ext.commands
+
+from utils.extensions import DJDiscordContext
+from utils.profiler import SamplingProfiler
+
+# Longest a profile may run for through `profile`
+MAX_PROFILE_SECONDS = 120
+
+
+class Owner(discord.ext.commands.Cog):
+    """Runtime statistics for the bot owner"""
+    def __init__(self, bot: discord.ext.commands.Bot):
+        self.bot = bot
+        self.profiler = None
+
+    async def cog_check(self, ctx: DJDiscordContext) -> bool:
+        return await ctx.bot.is_owner(ctx.author)
+
+    @discord.ext.commands.command(name="players")
+    async def players(self, ctx: DJDiscordContext) -> discord.Message:
+        """Shows how many players are alive and how many the reaper has cleaned up"""
+        players = ctx.bot.lavalink.player_manager.players.values()
+        return await ctx.send(embed=discord.Embed(
+            title="Players", color=0xDC333C
+        ).add_field(
+            name="Live", value="%d" % len(players)
+        ).add_field(
+            name="Playing", value="%d" % sum(player.is_playing for player in players)
+        ).add_field(
+            name="Queued Tracks", value="%d" % sum(len(player.queue) for player in players)
+        ).add_field(
+            name="Reaped", value="%d" % ctx.bot.reaper.reaped
+        ).add_field(
+            name="Freed Tracks", value="%d" % ctx.bot.reaper.freed_tracks
+        ))
+
+    @discord.ext.commands.command(name="caches")
+    async def caches(self, ctx: DJDiscordContext) -> discord.Message:
+        """Shows how much duplicate work the resolution caches have saved"""
+        resolutions = ctx.bot.resolutions
+        embed = discord.Embed(title="Caches", color=0xDC333C)
+        for namespace, calls in sorted(resolutions.calls.items()):
+            embed.add_field(name="Single-flight `%s`" % namespace,
+                            value="%d calls, %d deduplicated" %
+                            (calls, resolutions.deduplicated[namespace]),
+                            inline=False)
+        embed.add_field(name="Spotify tracks",
+                        value="%d cached, %.1f%% hit rate" %
+                        (len(ctx.spotify.tracks),
+                         ctx.spotify.tracks.hit_rate * 100),
+                        inline=False)
+        embed.add_field(name="Playlists",
+                        value="%d cached (%d songs), %.1f%% hit rate%s" %
+                        (len(ctx.bot.playlists.cache),
+                         ctx.bot.playlists.cache.weight,
+                         ctx.bot.playlists.cache.hit_rate * 100,
+                         "" if ctx.bot.playlists.live else ", changefeed down"),
+                        inline=False)
+        embed.add_field(name="Playlist authors",
+                        value="%d resolved, %.1f%% hit rate" %
+                        (len(ctx.bot.playlists.authors),
+                         ctx.bot.playlists.authors.hit_rate * 100),
+                        inline=False)
+        embed.add_field(name="Negative results",
+                        value="%d cached, %.1f%% hit rate" %
+                        (len(ctx.bot.negative),
+                         ctx.bot.negative.hit_rate * 100),
+                        inline=False)
+        return await ctx.send(embed=embed)
+
+    @discord.ext.commands.command(name="breakers")
+    async def breakers(self, ctx: DJDiscordContext) -> discord.Message:
+        """Shows the state of every source's circuit breaker"""
+        embed = discord.Embed(title="Circuit Breakers", color=0xDC333C)
+        for breaker in ctx.bot.breakers.values():
+            embed.add_field(
+                name=breaker.name,
+                value="`%s`, %d failures, opened %d times, %d rejected" %
+                (breaker.state, breaker.failures, breaker.opened,
+                 breaker.rejected),
+                inline=False)
+        return await ctx.send(embed=embed)
+
+    @discord.ext.commands.command(name="stalls")
+    async def stalls(self, ctx: DJDiscordContext,
+                     index: int = None) -> discord.Message:
+        """Lists recent event loop stalls, or shows the stack of one of them"""
+        stalls = list(ctx.bot.watchdog.stalls)
+        if index is not None:
+            if not 0 < index <= len(stalls):
+                return await ctx.send("There's no stall #%d" % index)
+            stall = stalls[-index]
+            return await ctx.send("```py\n%s```" %
+                                  "".join(stall.stack)[-1900:])
+
+        embed = discord.Embed(
+            title="Event Loop Stalls",
+            description="No callback has blocked the loop" if not stalls else
+            "Use `%sstalls <number>` for the full stack" % ctx.prefix,
+            color=0xDC333C)
+        for number, stall in enumerate(reversed(stalls[-10:]), start=1):
+            embed.add_field(
+                name="#%d: %.3fs%s" %
+                (number, stall.duration or 0,
+                 " in %s" % stall.command if stall.command else ""),
+                value="`%s` at %s" %
+                (stall.culprit[:200], stall.detected_at.strftime("%H:%M:%S")),
+                inline=False)
+        return await ctx.send(embed=embed)
+
+    @discord.ext.commands.command(name="case")
+    async def case(self, ctx: DJDiscordContext,
+                   case_id: str) -> discord.Message:
+        """Shows the error a case ID was filed under and how often it has happened"""
+        error = await ctx.database.case(case_id)
+        if error is None:
+            return await ctx.send("There's no error filed under `%s`" %
+                                  case_id)
+
+        return await ctx.send(
+            "**%s** `%s`, seen %d times from %s to %s\n```py\n%s```" %
+            (error["type"], error["id"][:12], error["count"],
+             error["first_seen"].strftime("%Y-%m-%d %H:%M:%S"),
+             error["last_seen"].strftime("%Y-%m-%d %H:%M:%S"),
+             error["traceback"][-1700:]))
+
+    async def _send_profile(self, ctx: DJDiscordContext,
+                            profiler: SamplingProfiler,
+                            title: str) -> discord.Message:
+        embed = discord.Embed(
+            title=title,
+            description="%d samples over %.1fs" %
+            (profiler.samples, profiler.duration),
+            color=0xDC333C)
+        for thread, function, own, total in profiler.top(10):
+            embed.add_field(name=function[:256],
+                            value="%.1f%% self, %.1f%% total of %s" %
+                            (own * 100, total * 100, thread),
+                            inline=False)
+
+        return await ctx.send(embed=embed,
+                              file=discord.File(
+                                  io.BytesIO(profiler.collapsed().encode()),
+                                  filename="profile.folded"))
+
+    @discord.ext.commands.group(name="profile", invoke_without_command=True)
+    async def profile(self,
+                      ctx: DJDiscordContext,
+                      seconds: float = 10.0,
+                      all_threads: bool = False) -> discord.Message:
+        """Samples the event loop, or every thread, for a few seconds and uploads a flamegraph-ready profile"""
+        if self.profiler is not None:
+            return await ctx.send("A profile is already running")
+        if not 0 < seconds <= MAX_PROFILE_SECONDS:
+            return await ctx.send("Profiles can run for up to %d seconds" %
+                                  MAX_PROFILE_SECONDS)
+
+        self.profiler = SamplingProfiler(ctx.bot.loop,
+                                         all_threads=all_threads).start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler, self.profiler = self.profiler.stop(), None
+
+        return await self._send_profile(ctx, profiler, "Profile")
+
+    @profile.command(name="command")
+    async def profile_command(self, ctx: DJDiscordContext, *,
+                              command: str) -> discord.Message:
+        """Runs a command as you and profiles only that invocation"""
+        if self.profiler is not None:
+            return await ctx.send("A profile is already running")
+
+        message = copy.copy(ctx.message)
+        message.content = ctx.prefix + command
+        target = await ctx.bot.get_context(message, cls=DJDiscordContext)
+        if target.command is None:
+            return await ctx.send("There's no command called `%s`" %
+                                  command.split()[0])
+
+        task = ctx.bot.loop.create_task(ctx.bot.invoke(target))
+        self.profiler = SamplingProfiler(ctx.bot.loop, task=task).start()
+        try:
+            await task
+        finally:
+            profiler, self.profiler = self.profiler.stop(), None
+
+        return await self._send_profile(
+            ctx, profiler, "Profile of `%s`" % target.command.qualified_name)
+
+
+def setup(bot: discord.ext.commands.Bot) -> None:
+    bot.add_cog(Owner(bot))
@@ -0,0 +1,421 @@
+"""End-to-end load test of DJDiscord against a simulated gateway and local service stand-ins
+
+    python test/loadtest.py --guilds 300 --rate 100 --duration 30 --mix play=1,add=3,show=3,skip=1,now=2
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import collections
+import dataclasses
+import glob
+import inspect
+import os
+import random
+import sys
+import time
+import typing
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+import discord.ext.test as dpytest
+import discord.ext.test.backend as backend
+import discord.ext.test.factories as factories
+import lavalink
+import psutil
+
+import utils.convert
+from utils.database import DJDiscordDatabaseManager
+from utils.extensions import DJDiscord, DJDiscordContext
+
+from standins import (ExtractorStandIn, LavalinkStandIn, PostgresStandIn,
+                      RethinkDBStandIn, make_info)
+
+DEFAULT_MIX = {"play": 1, "add": 3, "show": 3, "skip": 1, "now": 2}
+
+# Songs every simulated member starts out with in their playlist
+SEEDED_SONGS = 20
+
+# Queries `add` picks from, small enough that some of them overlap and get deduplicated
+QUERIES = ["stand-in song %d" % number for number in range(500)]
+
+
+@dataclasses.dataclass
+class StandIns:
+    lavalink: LavalinkStandIn
+    rethinkdb: RethinkDBStandIn
+    postgres: PostgresStandIn
+    extractor: ExtractorStandIn
+
+
+class GatewayStandIn:
+    """GatewayStandIn -> Answers voice state updates the way Discord would, straight into Lavalink"""
+    def __init__(self, bot: discord.ext.commands.Bot) -> None:
+        self.bot = bot
+
+    async def voice_state(self,
+                          guild_id: str,
+                          channel_id: typing.Optional[str],
+                          self_mute: bool = False,
+                          self_deaf: bool = False) -> None:
+        self.bot.dispatch(
+            "socket_response", {
+                "t": "VOICE_STATE_UPDATE",
+                "d": {
+                    "guild_id": guild_id,
+                    "user_id": str(self.bot.user.id),
+                    "channel_id": channel_id,
+                    "session_id": "standin-%s" % guild_id,
+                }
+            })
+        if channel_id is not None:
+            self.bot.dispatch(
+                "socket_response", {
+                    "t": "VOICE_SERVER_UPDATE",
+                    "d": {
+                        "guild_id": guild_id,
+                        "token": "standin",
+                        "endpoint": "standin.invalid:443",
+                    }
+                })
+
+    async def change_presence(self, **_) -> None:
+        pass
+
+
+def _compatible(bot: DJDiscord, method: typing.Callable) -> typing.Callable:
+    accepted = inspect.signature(method).parameters
+
+    async def wrapper(channel_id, *args, **kwargs):
+        # dpytest reads `channel` out of its caller's locals
+        channel = bot.get_channel(channel_id)  # noqa: F841
+        return await method(
+            channel_id, *args,
+            **{key: value
+               for key, value in kwargs.items() if key in accepted})
+
+    return wrapper
+
+
+class LoadTestBot(DJDiscord):
+    """LoadTestBot [DJDiscord] -> DJDiscord wired to stand-ins instead of real services"""
+    def __init__(self, standins: StandIns, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.standins = standins
+        self.injected: typing.Dict[int, float] = {}
+        self.latencies: typing.Dict[str, typing.List[float]] = collections.defaultdict(list)
+        self.failures: typing.Counter[str] = collections.Counter()
+
+    async def on_connect(self) -> None:
+        self.ws = GatewayStandIn(self)
+        self.prefixes.bind(self.user.id)
+        self.lavalink = lavalink.Client(self.user.id)
+        self.lavalink.add_node("127.0.0.1", self.standins.lavalink.port,
+                               self.standins.lavalink.password, "us",
+                               "standin")
+        self.add_listener(self.lavalink.voice_update_handler,
+                          "on_socket_response")
+        self.spotify = None
+        self.rdbconn = self.standins.rethinkdb
+        self.psqlconn = self.standins.postgres
+        self.database = DJDiscordDatabaseManager(self.rdbconn, self.psqlconn)
+
+    async def invoke(self, ctx: DJDiscordContext) -> None:
+        await super().invoke(ctx)
+
+        started = self.injected.pop(ctx.message.id, None)
+        if started is None or ctx.command is None:
+            return
+        self.latencies[ctx.command.name].append(time.perf_counter() - started)
+        if ctx.command_failed:
+            self.failures[ctx.command.name] += 1
+
+    async def shutdown(self) -> None:
+        """**`[coroutine]`** shutdown -> Stop background work without the gateway handshake `close` expects"""
+        self.snapshots.stop()
+        self.reaper.stop()
+        self.watchdog.stop()
+        if getattr(self, "lavalink", None) is None:
+            return
+        for node in self.lavalink.node_manager.nodes:
+            # Don't let the websocket reconnect to a stand-in that is about to stop
+            node._ws._max_reconnect_attempts = 0
+        await self.lavalink._session.close()
+
+
+@dataclasses.dataclass
+class Report:
+    guilds: int
+    duration: float
+    sent: int
+    latencies: typing.Dict[str, typing.List[float]]
+    failures: typing.Dict[str, int]
+    rss: int
+    lavalink_requests: int
+    database_queries: int
+    extractions: int
+
+    @property
+    def completed(self) -> int:
+        return sum(len(samples) for samples in self.latencies.values())
+
+    @property
+    def throughput(self) -> float:
+        return self.completed / self.duration if self.duration else 0.0
+
+    @property
+    def rss_per_guild(self) -> float:
+        return self.rss / self.guilds
+
+    def __str__(self) -> str:
+        lines = [
+            "%d guilds, %d commands sent, %d completed in %.1fs (%.1f commands/s)"
+            % (self.guilds, self.sent, self.completed, self.duration,
+               self.throughput),
+            "%.1f KiB RSS per guild, %d Lavalink requests, %d database queries, %d extractions"
+            % (self.rss_per_guild / 1024, self.lavalink_requests,
+               self.database_queries, self.extractions),
+            "%-8s %8s %8s %10s %10s" %
+            ("command", "count", "failed", "p50 ms", "p99 ms"),
+        ]
+        everything = []
+        for command, samples in sorted(self.latencies.items()):
+            everything.extend(samples)
+            lines.append("%-8s %8d %8d %10.2f %10.2f" %
+                         (command, len(samples), self.failures.get(command, 0),
+                          percentile(samples, 50) * 1000,
+                          percentile(samples, 99) * 1000))
+        lines.append("%-8s %8d %8d %10.2f %10.2f" %
+                     ("all", len(everything), sum(self.failures.values()),
+                      percentile(everything, 50) * 1000,
+                      percentile(everything, 99) * 1000))
+        return "\n".join(lines)
+
+
+def percentile(samples: typing.Sequence[float], percent: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1,
+                       max(0, round(percent / 100 * len(ordered)) - 1))]
+
+
+class LoadTest:
+    """LoadTest -> Fires a weighted command mix at `rate` commands per second across `guilds` fake guilds
+
+    Arrivals are Poisson distributed and don't wait for earlier commands, so a slow bot falls
+    behind instead of quietly lowering the offered load"""
+    def __init__(self,
+                 guilds: int = 100,
+                 members: int = 3,
+                 rate: float = 50.0,
+                 duration: float = 10.0,
+                 mix: typing.Optional[typing.Dict[str, float]] = None,
+                 latency: float = 0.002,
+                 extraction_latency: float = 0.05,
+                 seed: int = 0) -> None:
+        self.guilds = guilds
+        self.members = members
+        self.rate = rate
+        self.duration = duration
+        self.mix = mix or DEFAULT_MIX
+        self.random = random.Random(seed)
+        self.standins = StandIns(LavalinkStandIn(latency=latency),
+                                 RethinkDBStandIn(latency=latency),
+                                 PostgresStandIn(latency=latency),
+                                 ExtractorStandIn(latency=extraction_latency))
+        self.bot: typing.Optional[LoadTestBot] = None
+        self.guild_members: typing.Dict[
+            int, typing.List[discord.Member]] = collections.defaultdict(list)
+        self._extract_info = utils.convert._extract_info
+
+    async def setup(self) -> None:
+        await self.standins.lavalink.start()
+        utils.convert._extract_info = self.standins.extractor
+
+        self.rss_before = psutil.Process().memory_info().rss
+        self.bot = LoadTestBot(self.standins,
+                               command_prefix="dj;",
+                               intents=discord.Intents.default())
+        dpytest.configure(self.bot,
+                          num_guilds=self.guilds,
+                          num_channels=1,
+                          num_members=0)
+        await self.bot.on_connect()
+
+        # dpytest 0.0.22 predates replies and rejects discord.py 1.6's newer keyword arguments
+        for name in ("send_message", "send_files"):
+            setattr(self.bot.http, name,
+                    _compatible(self.bot, getattr(self.bot.http, name)))
+
+        # dpytest's state ignores the bot's intents and wouldn't cache the members we make
+        self.bot._connection.member_cache_flags = discord.MemberCacheFlags.all()
+        config = dpytest.get_config()
+        for guild in config.guilds:
+            backend.make_member(self.bot.user, guild)
+            for number in range(self.members):
+                user = backend.make_user("LoadUser%d" % number,
+                                         "%04d" % (number + 1))
+                self.guild_members[guild.id].append(
+                    backend.make_member(user, guild))
+
+            guild.default_role._permissions = discord.Permissions.all().value
+            channel = discord.VoiceChannel(state=self.bot._connection,
+                                           guild=guild,
+                                           data={
+                                               "id": factories.make_id(),
+                                               "name": "Music",
+                                               "type": 2,
+                                               "position": 1,
+                                               "bitrate": 64000,
+                                               "user_limit": 0,
+                                               "permission_overwrites": [],
+                                           })
+            guild._add_channel(channel)
+            for member in self.guild_members[guild.id]:
+                guild._voice_states[member.id] = discord.VoiceState(
+                    data={
+                        "session_id": "standin-%d" % member.id,
+                        "channel_id": channel.id,
+                        "mute": False,
+                        "deaf": False,
+                        "self_mute": False,
+                        "self_deaf": False,
+                        "self_video": False,
+                        "suppress": False,
+                    },
+                    channel=channel)
+                self.standins.rethinkdb.table("playlists")[
+                    "standin-%d" % member.id] = {
+                        "id": "standin-%d" % member.id,
+                        "author": member.id,
+                        "cover": None,
+                        "songs": [
+                            self._song(query) for query in self.random.sample(
+                                QUERIES, SEEDED_SONGS)
+                        ],
+                    }
+
+        node = self.bot.lavalink.node_manager.nodes[0]
+        for _ in range(100):
+            if node.available:
+                break
+            await asyncio.sleep(0.05)
+
+    def _song(self, query: str) -> dict:
+        info = make_info(query)
+        return {
+            "source": info["formats"][0]["url"],
+            "url": info["webpage_url"],
+            "uploader": info["uploader"],
+            "title": info["title"],
+            "thumbnails": info["thumbnails"],
+            "created": "2021-01-01",
+            "length": info["duration"],
+        }
+
+    def _command(self) -> str:
+        command = self.random.choices(list(self.mix),
+                                      weights=list(self.mix.values()))[0]
+        if command == "add":
+            return "dj;add %s" % self.random.choice(QUERIES)
+        return "dj;%s" % command
+
+    def inject(self, content: str) -> None:
+        config = dpytest.get_config()
+        guild = self.random.choice(config.guilds)
+        channel = self.random.choice(guild.text_channels)
+        member = self.random.choice(self.guild_members[guild.id])
+
+        started = time.perf_counter()
+        message = backend.make_message(content, member, channel)
+        self.bot.injected[message.id] = started
+
+    async def run(self) -> Report:
+        if self.bot is None:
+            await self.setup()
+
+        sent = 0
+        started = time.perf_counter()
+        deadline = started + self.duration
+        while time.perf_counter() < deadline:
+            self.inject(self._command())
+            sent += 1
+            # Nothing reads what the bot sends, don't let it pile up
+            while not dpytest.sent_queue.empty():
+                dpytest.sent_queue.get_nowait()
+            await asyncio.sleep(self.random.expovariate(self.rate))
+
+        # Give whatever is still in flight a moment to finish
+        for _ in range(100):
+            if not self.bot.injected:
+                break
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+
+        return Report(
+            guilds=self.guilds,
+            duration=elapsed,
+            sent=sent,
+            latencies=dict(self.bot.latencies),
+            failures=dict(self.bot.failures),
+            rss=psutil.Process().memory_info().rss - self.rss_before,
+            lavalink_requests=self.standins.lavalink.requests,
+            database_queries=self.standins.rethinkdb.queries +
+            self.standins.postgres.queries,
+            extractions=self.standins.extractor.calls,
+        )
+
+    async def teardown(self) -> None:
+        utils.convert._extract_info = self._extract_info
+        if self.bot is not None:
+            await self.bot.shutdown()
+        await self.standins.lavalink.stop()
+
+        # dpytest writes every attachment it is sent into the working directory
+        for path in glob.glob("dpytest_*.dat"):
+            os.remove(path)
+
+
+def _mix(value: str) -> typing.Dict[str, float]:
+    return {
+        command: float(weight)
+        for command, weight in (pair.split("=")
+                                for pair in value.split(","))
+    }
+
+
+async def main(arguments: argparse.Namespace) -> None:
+    test = LoadTest(guilds=arguments.guilds,
+                    members=arguments.members,
+                    rate=arguments.rate,
+                    duration=arguments.duration,
+                    mix=arguments.mix,
+                    latency=arguments.latency,
+                    extraction_latency=arguments.extraction_latency,
+                    seed=arguments.seed)
+    try:
+        print(await test.run())
+    finally:
+        await test.teardown()
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int, default=100)
+    parser.add_argument("--members", type=int, default=3)
+    parser.add_argument("--rate", type=float, default=50.0,
+                        help="commands per second")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="seconds of traffic")
+    parser.add_argument("--mix", type=_mix, default=DEFAULT_MIX,
+                        help="command=weight pairs, comma separated")
+    parser.add_argument("--latency", type=float, default=0.002,
+                        help="seconds every stand-in round trip takes")
+    parser.add_argument("--extraction-latency", type=float, default=0.05,
+                        help="seconds every youtube_dl stand-in extraction takes")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.get_event_loop().run_until_complete(main(parser.parse_args()))
@@ -0,0 +1,429 @@
+"""Replays a capture recorded with RECORD_FILE through DJDiscord, offline and without any real services
+
+    python test/replay.py capture.msgpack --save before.json
+    python test/replay.py capture.msgpack --max-speed --baseline before.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import collections
+import dataclasses
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+import typing
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+import discord.ext.test as dpytest
+
+import utils.convert
+from utils import recorder
+from utils.benchmark import mann_whitney_u
+from utils.spotify import SpotifyMetadata
+
+from loadtest import LoadTestBot, StandIns, _compatible, percentile
+from standins import LavalinkStandIn
+
+# What a write that was never recorded reports back, so the bot carries on as if it went through
+EMPTY_WRITE = {
+    "inserted": 0,
+    "replaced": 0,
+    "unchanged": 0,
+    "skipped": 0,
+    "deleted": 0,
+    "errors": 0,
+}
+
+# Allocation sites kept in a report
+TOP_ALLOCATIONS = 15
+
+
+class Responses:
+    """Responses -> Recorded backend responses, handed out per key in the order they were recorded
+
+    Once a key runs out its last response keeps being served, a build that asks more often than
+    the recorded one still gets answers. Keys that were never recorded are counted as misses"""
+    def __init__(self, speed: float) -> None:
+        self.speed = speed
+        self.queues: typing.Dict[typing.Tuple[str, str], typing.Deque[
+            recorder.Record]] = collections.defaultdict(collections.deque)
+        self.misses: typing.Counter[str] = collections.Counter()
+        self.served = 0
+
+    def add(self, record: recorder.Record) -> None:
+        self.queues[record.kind, record.key].append(record)
+
+    def take(self, kind: str, key: str) -> typing.Optional[recorder.Record]:
+        queue = self.queues.get((kind, key))
+        if not queue:
+            self.misses[kind] += 1
+            return None
+        self.served += 1
+        return queue.popleft() if len(queue) > 1 else queue[0]
+
+    async def answer(self, kind: str, key: str, default: typing.Any = None) -> typing.Any:
+        """**`[coroutine]`** answer -> The next recorded response, taking as long as it did when recorded"""
+        record = self.take(kind, key)
+        if record is None:
+            await asyncio.sleep(0)
+            return default
+        await asyncio.sleep(record.duration / self.speed if self.speed else 0)
+        return recorder.unwrap(record.data)
+
+    def answer_sync(self, kind: str, key: str, default: typing.Any = None) -> typing.Any:
+        record = self.take(kind, key)
+        if record is None:
+            return default
+        if self.speed:
+            time.sleep(record.duration / self.speed)
+        return recorder.unwrap(record.data)
+
+
+class ReplayRethinkDB:
+    """ReplayRethinkDB -> Connection answering ReQL queries from a capture"""
+    def __init__(self, responses: Responses) -> None:
+        self.responses = responses
+        self.queries = 0
+
+    async def _start(self, term, **_) -> typing.Any:
+        self.queries += 1
+        key = recorder.query_key(term)
+        result = await self.responses.answer(
+            "rethinkdb", key,
+            dict(EMPTY_WRITE) if key.endswith("(...)") else None)
+        if isinstance(result, list):
+            return recorder.RecordedCursor(result)
+        return result
+
+
+class ReplayPostgres:
+    """ReplayPostgres -> Connection answering SQL statements from a capture"""
+    def __init__(self, responses: Responses) -> None:
+        self.responses = responses
+        self.queries = 0
+
+    async def execute(self, query: str, *args, **_) -> str:
+        self.queries += 1
+        return await self.responses.answer("postgresql",
+                                           "%s %r" % (query, args), "")
+
+    async def fetch(self, query: str, *args, **_) -> list:
+        self.queries += 1
+        return await self.responses.answer("postgresql",
+                                           "%s %r" % (query, args), [])
+
+    async def fetchrow(self, query: str, *args, **_) -> typing.Optional[dict]:
+        self.queries += 1
+        return await self.responses.answer("postgresql",
+                                           "%s %r" % (query, args))
+
+
+class _ReplayEndpoint:
+    def __init__(self, responses: Responses, name: str) -> None:
+        self.responses = responses
+        self.__name__ = name
+
+    def __getattr__(self, name: str) -> _ReplayEndpoint:
+        return _ReplayEndpoint(self.responses, name)
+
+    async def __call__(self, *args, **kwargs) -> typing.Any:
+        return await self.responses.answer(
+            "spotify", "%s %r %r" % (self.__name__, args, kwargs))
+
+
+class ReplaySpotify(_ReplayEndpoint):
+    """ReplaySpotify -> Spotify API client answering from a capture, any endpoint the bot calls exists"""
+    def __init__(self, responses: Responses) -> None:
+        super().__init__(responses, "spotify")
+
+    async def get_auth_token_with_client_credentials(self) -> None:
+        pass
+
+
+class ReplayExtractor:
+    """ReplayExtractor -> Drop-in for `utils.convert._extract_info` answering from a capture"""
+    def __init__(self, responses: Responses) -> None:
+        self.responses = responses
+        self.calls = 0
+
+    def __call__(self, target: str) -> typing.Optional[dict]:
+        self.calls += 1
+        return self.responses.answer_sync("extract", target)
+
+
+class ReplayBot(LoadTestBot):
+    """ReplayBot [LoadTestBot] -> DJDiscord answered by a capture, Lavalink playback still goes to the stand-in"""
+    def __init__(self, responses: Responses, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.responses = responses
+
+    async def on_connect(self) -> None:
+        await super().on_connect()
+        self.spotify = SpotifyMetadata(ReplaySpotify(self.responses),
+                                       resolutions=self.resolutions,
+                                       breaker=self.breakers["spotify"])
+
+    async def _load_tracks(self, node, query: str) -> dict:
+        return await self.responses.answer("lavalink", query, {
+            "loadType": "NO_MATCHES",
+            "tracks": []
+        })
+
+
+@dataclasses.dataclass
+class ReplayReport:
+    events: int
+    duration: float
+    latencies: typing.Dict[str, typing.List[float]]
+    failures: typing.Dict[str, int]
+    misses: typing.Dict[str, int]
+    dropped: typing.Dict[str, int]
+    peak: int = 0
+    allocations: typing.List[typing.Tuple[str, int, int]] = dataclasses.field(
+        default_factory=list)
+
+    def __str__(self) -> str:
+        lines = [
+            "%d gateway events replayed in %.1fs, peak %.1f KiB traced" %
+            (self.events, self.duration, self.peak / 1024),
+        ]
+        if self.misses:
+            lines.append("Responses missing from the capture: %s" % ", ".join(
+                "%s=%d" % item for item in sorted(self.misses.items())))
+        if self.dropped:
+            lines.append("Events that failed to replay: %s" % ", ".join(
+                "%s=%d" % item for item in sorted(self.dropped.items())))
+        lines.append("%-10s %8s %8s %10s %10s" %
+                     ("command", "count", "failed", "p50 ms", "p99 ms"))
+        for command, samples in sorted(self.latencies.items()):
+            lines.append("%-10s %8d %8d %10.2f %10.2f" %
+                         (command, len(samples), self.failures.get(command, 0),
+                          percentile(samples, 50) * 1000,
+                          percentile(samples, 99) * 1000))
+        if self.allocations:
+            lines.append("%-60s %10s %8s" % ("allocated at", "KiB", "blocks"))
+            for site, size, count in self.allocations:
+                lines.append("%-60s %10.1f %8d" % (site[-60:], size / 1024, count))
+        return "\n".join(lines)
+
+    def json(self) -> dict:
+        return dataclasses.asdict(self)
+
+    @classmethod
+    def from_json(cls, data: dict) -> ReplayReport:
+        data = dict(data)
+        data["allocations"] = [tuple(site) for site in data["allocations"]]
+        return cls(**data)
+
+    def regressions(self,
+                    baseline: ReplayReport,
+                    tolerance: float = 0.1,
+                    alpha: float = 0.01) -> typing.List[str]:
+        """regressions -> What got slower or hungrier than `baseline`, judged like utils.benchmark.Baselines"""
+        found = []
+        for command, samples in sorted(self.latencies.items()):
+            before = baseline.latencies.get(command)
+            if not before or len(samples) < 2:
+                continue
+            p_value = mann_whitney_u(before, samples)
+            then, now = percentile(before, 50), percentile(samples, 50)
+            if p_value < alpha and now > then * (1 + tolerance):
+                found.append("%s regressed %.1f%% (%.2fms -> %.2fms, p=%.4f)" %
+                             (command, (now / then - 1) * 100, then * 1000,
+                              now * 1000, p_value))
+        if baseline.peak and self.peak > baseline.peak * (1 + tolerance):
+            found.append("peak traced memory grew %.1f%% (%.1f KiB -> %.1f KiB)" %
+                         ((self.peak / baseline.peak - 1) * 100,
+                          baseline.peak / 1024, self.peak / 1024))
+        return found
+
+
+class Replay:
+    """Replay -> Feeds a capture's gateway dispatches into a fresh bot at `speed` times real time
+
+    A speed of 0 replays as fast as the bot keeps up. Backend calls are answered from the capture,
+    taking as long as they took when recorded (scaled by `speed`)"""
+    def __init__(self,
+                 path: str,
+                 speed: float = 1.0,
+                 allocations: bool = True) -> None:
+        self.path = path
+        self.speed = speed
+        self.allocations = allocations
+        self.responses = Responses(speed)
+        self.gateway: typing.List[recorder.Record] = []
+        self.dropped: typing.Counter[str] = collections.Counter()
+        self.lavalink = LavalinkStandIn()
+        self.bot: typing.Optional[ReplayBot] = None
+        self._extract_info = utils.convert._extract_info
+
+    def load(self) -> None:
+        records = recorder.read(self.path)
+        header = next(records)
+        if header.kind != "header" or header.data[
+                "version"] != recorder.CAPTURE_VERSION:
+            raise ValueError("%s isn't a version %d capture" %
+                             (self.path, recorder.CAPTURE_VERSION))
+
+        for record in records:
+            if record.kind == "gateway":
+                self.gateway.append(record)
+            else:
+                self.responses.add(record)
+
+    async def setup(self) -> None:
+        self.load()
+        await self.lavalink.start()
+        extractor = ReplayExtractor(self.responses)
+        utils.convert._extract_info = extractor
+
+        standins = StandIns(self.lavalink, ReplayRethinkDB(self.responses),
+                            ReplayPostgres(self.responses), extractor)
+        self.bot = ReplayBot(self.responses,
+                             standins,
+                             command_prefix="dj;",
+                             intents=discord.Intents.default())
+        dpytest.configure(self.bot, num_guilds=0)
+        for name in ("send_message", "send_files"):
+            setattr(self.bot.http, name,
+                    _compatible(self.bot, getattr(self.bot.http, name)))
+
+        state = self.bot._connection
+        state.member_cache_flags = discord.MemberCacheFlags.all()
+        # Nothing on the other end would answer member chunk requests
+        state._chunk_guilds = False
+
+    async def _ready(self, data: dict) -> None:
+        state = self.bot._connection
+        state.user = discord.ClientUser(state=state, data=data["user"])
+        state._users[state.user.id] = state.user
+        await self.bot.on_connect()
+
+        node = self.bot.lavalink.node_manager.nodes[0]
+        for _ in range(100):
+            if node.available:
+                break
+            await asyncio.sleep(0.05)
+
+    async def dispatch(self, record: recorder.Record) -> None:
+        self.bot.dispatch("socket_response", {
+            "op": 0,
+            "t": record.key,
+            "d": record.data
+        })
+        if record.key == "READY":
+            return await self._ready(record.data)
+
+        parser = self.bot._connection.parsers.get(record.key)
+        if parser is None:
+            self.dropped[record.key] += 1
+            return
+        if record.key == "MESSAGE_CREATE":
+            self.bot.injected[int(record.data["id"])] = time.perf_counter()
+        try:
+            parser(record.data)
+        except Exception as error:
+            print("Failed to replay %s: %r" % (record.key, error))
+            self.dropped[record.key] += 1
+
+    async def run(self) -> ReplayReport:
+        if self.bot is None:
+            await self.setup()
+
+        if self.allocations:
+            tracemalloc.start()
+        started = time.perf_counter()
+        for record in self.gateway:
+            if self.speed and (delay := started + record.at / self.speed -
+                               time.perf_counter()) > 0:
+                await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(0)
+            await self.dispatch(record)
+            while not dpytest.sent_queue.empty():
+                dpytest.sent_queue.get_nowait()
+
+        for _ in range(100):
+            if not self.bot.injected:
+                break
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+
+        report = ReplayReport(
+            events=len(self.gateway),
+            duration=elapsed,
+            latencies=dict(self.bot.latencies),
+            failures=dict(self.bot.failures),
+            misses=dict(self.responses.misses),
+            dropped=dict(self.dropped),
+        )
+        if self.allocations:
+            snapshot = tracemalloc.take_snapshot()
+            report.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            report.allocations = [
+                (str(statistic.traceback), statistic.size, statistic.count)
+                for statistic in snapshot.filter_traces([
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                ]).statistics("lineno")[:TOP_ALLOCATIONS]
+            ]
+        return report
+
+    async def teardown(self) -> None:
+        utils.convert._extract_info = self._extract_info
+        if self.bot is not None:
+            await self.bot.shutdown()
+        await self.lavalink.stop()
+
+        for path in glob.glob("dpytest_*.dat"):
+            os.remove(path)
+
+
+async def main(arguments: argparse.Namespace) -> int:
+    replay = Replay(arguments.capture,
+                    speed=0 if arguments.max_speed else arguments.speed,
+                    allocations=not arguments.no_allocations)
+    try:
+        report = await replay.run()
+    finally:
+        await replay.teardown()
+    print(report)
+
+    if arguments.save:
+        with open(arguments.save, "w") as file:
+            json.dump(report.json(), file)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            baseline = ReplayReport.from_json(json.load(file))
+        regressions = report.regressions(baseline)
+        for regression in regressions:
+            print(regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", type=os.path.abspath)
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="multiple of real time to replay at")
+    parser.add_argument("--max-speed", action="store_true",
+                        help="replay as fast as the bot keeps up")
+    parser.add_argument("--no-allocations", action="store_true",
+                        help="skip tracemalloc, it slows everything down")
+    parser.add_argument("--save", type=os.path.abspath,
+                        help="write the report here as JSON")
+    parser.add_argument("--baseline", type=os.path.abspath,
+                        help="report from another build to compare against")
+    arguments = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.exit(asyncio.get_event_loop().run_until_complete(main(arguments)))
@@ -0,0 +1,505 @@
+"""In-process stand-ins for the services DJDiscord talks to, for load tests and replays"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import copy
+import datetime
+import json
+import re
+import time
+import typing
+import uuid
+
+import aiohttp.web
+import rethinkdb.ast
+from rethinkdb import ql2_pb2
+
+Term = ql2_pb2.Term.TermType
+
+
+class Cursor(list):
+    """Cursor -> A fully fetched result sequence that can also be iterated with `async for`"""
+    async def __aiter__(self):
+        for document in self:
+            yield document
+
+
+class RethinkDBStandIn:
+    """RethinkDBStandIn -> In-memory connection that evaluates the subset of ReQL the bot uses
+
+    Pass it anywhere a `rethinkdb.net.Connection` is expected, `query.run(standin)` ends up in `_start`"""
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.tables: typing.Dict[str, typing.Dict[typing.Any, dict]] = {}
+        self.queries = 0
+
+    def table(self, name: str) -> typing.Dict[typing.Any, dict]:
+        return self.tables.setdefault(name, {})
+
+    async def _start(self, term: rethinkdb.ast.RqlQuery, **_) -> typing.Any:
+        self.queries += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        result = _unwrap(self._evaluate(term, {}))
+        if isinstance(result, list):
+            return Cursor(copy.deepcopy(result))
+        return copy.deepcopy(result)
+
+    def _evaluate(self, term, scope: dict) -> typing.Any:
+        if not isinstance(term, rethinkdb.ast.RqlQuery):
+            return term
+        if isinstance(term, rethinkdb.ast.Datum):
+            return term.data
+
+        kind = term.term_type
+        args = term._args
+        if kind == Term.MAKE_ARRAY:
+            return [self._evaluate(arg, scope) for arg in args]
+        if kind == Term.MAKE_OBJ:
+            return {
+                key: self._evaluate(value, scope)
+                for key, value in term.optargs.items()
+            }
+        if kind == Term.VAR:
+            return scope[self._evaluate(args[0], scope)]
+        if kind == Term.IMPLICIT_VAR:
+            return scope["row"]
+        if kind == Term.FUNC:
+            return _Function(self, [self._evaluate(arg, scope)
+                                    for arg in args[0]._args], args[1])
+        if kind == Term.NOW:
+            return datetime.datetime.now(datetime.timezone.utc)
+        if kind == Term.DB:
+            return self._evaluate(args[0], scope)
+        if kind == Term.TABLE:
+            return _Table(self._evaluate(args[-1], scope),
+                          self.table(self._evaluate(args[-1], scope)))
+        if kind == Term.GET:
+            table = self._evaluate(args[0], scope)
+            return _Selection(table, [self._evaluate(args[1], scope)])
+        if kind == Term.GET_ALL:
+            table = self._evaluate(args[0], scope)
+            keys = [self._evaluate(arg, scope) for arg in args[1:]]
+            return _Selection(table, [key for key in keys if key in table.rows],
+                              single=False)
+        if kind == Term.FILTER:
+            sequence = self._evaluate(args[0], scope)
+            predicate = self._evaluate(args[1], scope)
+            table = sequence.table if isinstance(sequence,
+                                                 _Selection) else sequence
+            keys = [
+                document["id"] for document in self._documents(sequence)
+                if self._matches(document, predicate)
+            ]
+            return _Selection(table, keys, single=False)
+        if kind in (Term.BRACKET, Term.GET_FIELD):
+            return _unwrap(self._evaluate(args[0], scope))[self._evaluate(
+                args[1], scope)]
+        if kind == Term.APPEND:
+            return self._evaluate(args[0], scope) + [
+                self._evaluate(args[1], scope)
+            ]
+        if kind == Term.ADD:
+            values = [_unwrap(self._evaluate(arg, scope)) for arg in args]
+            total = values[0]
+            for value in values[1:]:
+                total = total + value
+            return total
+        if kind == Term.DELETE_AT:
+            values = list(self._evaluate(args[0], scope))
+            del values[self._evaluate(args[1], scope)]
+            return values
+        if kind == Term.EQ:
+            values = [_unwrap(self._evaluate(arg, scope)) for arg in args]
+            return all(value == values[0] for value in values[1:])
+        if kind == Term.COUNT:
+            return len(self._documents(self._evaluate(args[0], scope)))
+        if kind == Term.INSERT:
+            return self._insert(
+                self._evaluate(args[0], scope), self._evaluate(args[1], scope),
+                self._evaluate(term.optargs.get("conflict", "error"), scope))
+        if kind == Term.UPDATE:
+            return self._update(self._evaluate(args[0], scope), args[1],
+                                scope)
+        if kind == Term.DELETE:
+            return self._delete(self._evaluate(args[0], scope))
+
+        raise NotImplementedError("The RethinkDB stand-in can't evaluate %s" %
+                                  type(term).__name__)
+
+    def _documents(self, value) -> typing.List[dict]:
+        if isinstance(value, _Table):
+            return list(value.rows.values())
+        if isinstance(value, _Selection):
+            return value.documents()
+        return value
+
+    def _matches(self, document: dict, predicate) -> bool:
+        if isinstance(predicate, _Function):
+            return bool(predicate(document))
+        return all(document.get(key) == value
+                   for key, value in predicate.items())
+
+    def _insert(self, table: _Table, documents, conflict: str) -> dict:
+        result = _write_result()
+        for document in documents if isinstance(documents, list) else [documents]:
+            document = copy.deepcopy(document)
+            if "id" not in document:
+                document["id"] = str(uuid.uuid4())
+                result.setdefault("generated_keys", []).append(document["id"])
+
+            if document["id"] in table.rows:
+                if conflict == "replace":
+                    result["replaced"] += 1
+                elif conflict == "update":
+                    table.rows[document["id"]].update(document)
+                    result["replaced"] += 1
+                    continue
+                else:
+                    result["errors"] += 1
+                    result["first_error"] = "Duplicate primary key `id`"
+                    continue
+            else:
+                result["inserted"] += 1
+            table.rows[document["id"]] = document
+        return result
+
+    def _update(self, selection: _Selection, change, scope: dict) -> dict:
+        result = _write_result()
+        for document in selection.documents():
+            if isinstance(change, rethinkdb.ast.RqlQuery):
+                value = self._evaluate(change, dict(scope, row=document))
+                if isinstance(value, _Function):
+                    value = value(document)
+            else:
+                value = change
+
+            if all(document.get(key) == item for key, item in value.items()):
+                result["unchanged"] += 1
+                continue
+            document.update(copy.deepcopy(value))
+            result["replaced"] += 1
+
+        if selection.single and not selection.documents():
+            result["skipped"] += 1
+        return result
+
+    def _delete(self, selection) -> dict:
+        result = _write_result()
+        if isinstance(selection, _Table):
+            selection = _Selection(selection, list(selection.rows),
+                                   single=False)
+        for key in list(selection.keys):
+            if selection.table.rows.pop(key, None) is not None:
+                result["deleted"] += 1
+        return result
+
+
+def _write_result() -> dict:
+    return {
+        "inserted": 0,
+        "replaced": 0,
+        "unchanged": 0,
+        "skipped": 0,
+        "deleted": 0,
+        "errors": 0,
+    }
+
+
+class _Table:
+    __slots__ = ("name", "rows")
+
+    def __init__(self, name: str, rows: dict) -> None:
+        self.name = name
+        self.rows = rows
+
+
+class _Selection:
+    __slots__ = ("table", "keys", "single")
+
+    def __init__(self, table: _Table, keys: list, single: bool = True) -> None:
+        self.table = table
+        self.keys = keys
+        self.single = single
+
+    def documents(self) -> typing.List[dict]:
+        return [
+            self.table.rows[key] for key in self.keys if key in self.table.rows
+        ]
+
+
+class _Function:
+    __slots__ = ("standin", "parameters", "body")
+
+    def __init__(self, standin: RethinkDBStandIn, parameters: list,
+                 body) -> None:
+        self.standin = standin
+        self.parameters = parameters
+        self.body = body
+
+    def __call__(self, *values):
+        scope = dict(zip(self.parameters, values))
+        scope["row"] = values[0]
+        return self.standin._evaluate(self.body, scope)
+
+
+def _unwrap(value):
+    if isinstance(value, _Selection):
+        documents = value.documents()
+        if value.single:
+            return documents[0] if documents else None
+        return documents
+    if isinstance(value, _Table):
+        return list(value.rows.values())
+    return value
+
+
+class PostgresStandIn:
+    """PostgresStandIn -> Enough of an asyncpg connection for the `configuration` table"""
+    select = re.compile(r"SELECT \(?(?P<columns>[\w, ]+)\)? FROM configuration WHERE id=\$1", re.I)
+    insert = re.compile(r"INSERT INTO configuration \((?P<columns>[\w, ]+)\) VALUES", re.I)
+    update = re.compile(r"UPDATE configuration SET (?P<column>\w+)=\$1 WHERE id=\$2", re.I)
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.configuration: typing.Dict[int, dict] = {}
+        self.queries = 0
+
+    async def _roundtrip(self) -> None:
+        self.queries += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def execute(self, query: str, *args) -> str:
+        await self._roundtrip()
+        if match := self.insert.match(query.strip()):
+            columns = [column.strip() for column in match.group("columns").split(",")]
+            self.configuration[args[0]] = dict(zip(columns, args))
+            return "INSERT 0 1"
+        if match := self.update.match(query.strip()):
+            if (row := self.configuration.get(args[1])) is None:
+                return "UPDATE 0"
+            row[match.group("column")] = args[0]
+            return "UPDATE 1"
+        return "SELECT 0"
+
+    async def fetch(self, query: str, *args) -> typing.List[dict]:
+        await self._roundtrip()
+        match = self.select.match(query.strip())
+        if match is None or (row := self.configuration.get(args[0])) is None:
+            return []
+        columns = [column.strip() for column in match.group("columns").split(",")]
+        return [{column: row.get(column) for column in columns}]
+
+    async def fetchrow(self, query: str, *args) -> typing.Optional[dict]:
+        rows = await self.fetch(query, *args)
+        return rows[0] if rows else None
+
+
+def make_track(identifier: str, length: int = 212000) -> dict:
+    """make_track -> A Lavalink track object for `identifier`, deterministic so it can be cached"""
+    info = {
+        "identifier": identifier,
+        "isSeekable": True,
+        "author": "Stand-in Artist",
+        "length": length,
+        "isStream": False,
+        "position": 0,
+        "title": "Stand-in track %s" % identifier,
+        "uri": "https://www.youtube.com/watch?v=%s" % identifier,
+        "sourceName": "youtube",
+    }
+    return {
+        "track": base64.b64encode(json.dumps(info).encode()).decode(),
+        "info": info,
+    }
+
+
+class LavalinkStandIn:
+    """LavalinkStandIn -> Local server speaking enough of Lavalink's REST and WebSocket protocol
+
+    `/loadtracks` answers every identifier with one deterministic track, unless it contains
+    "missing". Play ops are acknowledged with a TrackStartEvent and a player update"""
+    def __init__(self,
+                 password: str = "youshallnotpass",
+                 latency: float = 0.0,
+                 host: str = "127.0.0.1",
+                 port: int = 0) -> None:
+        self.password = password
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.ops: typing.Dict[str, int] = {}
+        self.players: typing.Dict[str, dict] = {}
+        self._sockets: typing.List[aiohttp.web.WebSocketResponse] = []
+        self._runner: typing.Optional[aiohttp.web.AppRunner] = None
+
+    async def start(self) -> LavalinkStandIn:
+        app = aiohttp.web.Application()
+        app.router.add_get("/", self._websocket)
+        app.router.add_get("/loadtracks", self._load_tracks)
+        self._runner = aiohttp.web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = aiohttp.web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        for socket in self._sockets:
+            await socket.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _authorized(self, request: aiohttp.web.Request) -> bool:
+        return request.headers.get("Authorization") == self.password
+
+    async def _load_tracks(self,
+                           request: aiohttp.web.Request) -> aiohttp.web.Response:
+        if not self._authorized(request):
+            return aiohttp.web.Response(status=401)
+
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        identifier = request.query.get("identifier", "")
+        if "missing" in identifier:
+            return aiohttp.web.json_response({
+                "loadType": "NO_MATCHES",
+                "playlistInfo": {},
+                "tracks": []
+            })
+
+        identifier = identifier.rsplit("=", 1)[-1].rsplit(":", 1)[-1]
+        return aiohttp.web.json_response({
+            "loadType": "TRACK_LOADED",
+            "playlistInfo": {},
+            "tracks": [make_track(identifier[:64])]
+        })
+
+    async def _websocket(
+            self, request: aiohttp.web.Request) -> aiohttp.web.WebSocketResponse:
+        if not self._authorized(request):
+            return aiohttp.web.Response(status=401)
+
+        socket = aiohttp.web.WebSocketResponse(heartbeat=60)
+        await socket.prepare(request)
+        self._sockets.append(socket)
+        await socket.send_json(self._stats())
+
+        async for message in socket:
+            if message.type != aiohttp.WSMsgType.TEXT:
+                continue
+            await self._handle(socket, json.loads(message.data))
+
+        self._sockets.remove(socket)
+        return socket
+
+    async def _handle(self, socket: aiohttp.web.WebSocketResponse,
+                      payload: dict) -> None:
+        op = payload.get("op")
+        self.ops[op] = self.ops.get(op, 0) + 1
+        guild_id = payload.get("guildId")
+
+        if op == "play":
+            previous = self.players.get(guild_id, {}).get("track")
+            self.players[guild_id] = {"track": payload["track"], "paused": False}
+            if previous is not None:
+                await socket.send_json({
+                    "op": "event",
+                    "type": "TrackEndEvent",
+                    "guildId": guild_id,
+                    "track": previous,
+                    "reason": "REPLACED",
+                })
+            await socket.send_json({
+                "op": "event",
+                "type": "TrackStartEvent",
+                "guildId": guild_id,
+                "track": payload["track"],
+            })
+            await socket.send_json({
+                "op": "playerUpdate",
+                "guildId": guild_id,
+                "state": {
+                    "time": int(time.time() * 1000),
+                    "position": int(payload.get("startTime", 0)),
+                    "connected": True,
+                },
+            })
+        elif op == "stop":
+            if (player := self.players.pop(guild_id, None)) is not None:
+                await socket.send_json({
+                    "op": "event",
+                    "type": "TrackEndEvent",
+                    "guildId": guild_id,
+                    "track": player["track"],
+                    "reason": "STOPPED",
+                })
+        elif op == "destroy":
+            self.players.pop(guild_id, None)
+        elif op == "pause" and guild_id in self.players:
+            self.players[guild_id]["paused"] = payload.get("pause", True)
+
+    def _stats(self) -> dict:
+        return {
+            "op": "stats",
+            "players": len(self.players),
+            "playingPlayers": len(self.players),
+            "uptime": 0,
+            "memory": {
+                "free": 0,
+                "used": 0,
+                "allocated": 0,
+                "reservable": 0
+            },
+            "cpu": {
+                "cores": 1,
+                "systemLoad": 0.0,
+                "lavalinkLoad": 0.0
+            },
+            "frameStats": {
+                "sent": 0,
+                "nulled": 0,
+                "deficit": 0
+            },
+        }
+
+
+def make_info(query: str, duration: int = 212) -> dict:
+    """make_info -> A youtube_dl info dict for `query`, shaped like a single search result"""
+    identifier = uuid.uuid5(uuid.NAMESPACE_URL, query).hex[:11]
+    return {
+        "formats": [{
+            "url": "https://standin.invalid/videoplayback?id=%s" % identifier
+        }],
+        "webpage_url": "https://www.youtube.com/watch?v=%s" % identifier,
+        "uploader": "Stand-in Uploader",
+        "title": query.split(":", 1)[-1].strip() or identifier,
+        "thumbnails": [{
+            "url": "https://i.ytimg.com/vi/%s/hqdefault.jpg" % identifier
+        }],
+        "upload_date": "20210101",
+        "duration": duration,
+    }
+
+
+class ExtractorStandIn:
+    """ExtractorStandIn -> Replaces `utils.convert._extract_info` so youtube_dl never touches the network
+
+    Runs in the executor like the real extraction and blocks it for `latency` seconds"""
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.calls = 0
+
+    def __call__(self, target: str) -> typing.Optional[dict]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if "missing" in target:
+            return None
+        return make_info(target)
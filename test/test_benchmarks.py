@@ -0,0 +1,261 @@
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import types
+import unittest
+
+import PIL.Image
+
+from commands.music import milliseconds_to_str, render_progress
+from utils.benchmark import (Baselines, Result, mann_whitney_u, measure,
+                             measure_async)
+from utils.convert import (IndexConverter, PlaylistPaginator,
+                           TrackPositionConverter, VolumeConverter)
+from utils.embeds import InsuffArgs
+from utils.extensions import DJDiscord
+from utils.loop import available
+from utils.objects import DocumentEvaluation, Playlist, Song, Templates
+from utils.prefix import PrefixMatcher
+
+document = {
+    "source": "https://r4---sn-vgqsknes.googlevideo.com/videoplayback",
+    "uploader": "RickAstleyVEVO",
+    "title": "Rick Astley - Never Gonna Give You Up",
+    "thumbnails": [{"url": "https://i.ytimg.com/vi/dQw4w9WgXcQ/hqdefault.jpg"}],
+    "created": "2009-10-25",
+    "length": 212,
+    "url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+}
+
+playlist = {
+    "id": "0d3a2c1e-6c39-4c0e-9a4e-2b7d2a4f8f1b",
+    "songs": [document] * 200,
+    "author": 788392608254787595,
+    "cover": None,
+}
+
+author = types.SimpleNamespace(name="saihnii4")
+ctx = types.SimpleNamespace(author=author,
+                            bot=types.SimpleNamespace(templates=Templates))
+
+
+class RoundTrip:
+    """Query and response over a localhost socket, framed like RethinkDB's wire protocol"""
+    query = json.dumps([1, [15, [[14, ["djdiscord"]], "playlists"]], {}]).encode()
+    response = json.dumps({"t": 1, "r": [playlist]}).encode()
+
+    def __init__(self):
+        self.server = None
+        self.reader = None
+        self.writer = None
+        self.token = 0
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(12)
+                await reader.readexactly(int.from_bytes(header[8:], "little"))
+                writer.write(header[:8] +
+                             len(self.response).to_bytes(4, "little") +
+                             self.response)
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    async def __call__(self):
+        if self.writer is None:
+            self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+            self.reader, self.writer = await asyncio.open_connection(
+                *self.server.sockets[0].getsockname()[:2])
+
+        self.token += 1
+        self.writer.write(
+            self.token.to_bytes(8, "little") +
+            len(self.query).to_bytes(4, "little") + self.query)
+        header = await self.reader.readexactly(12)
+        return json.loads(await self.reader.readexactly(
+            int.from_bytes(header[8:], "little")))
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.server.close()
+            await self.server.wait_closed()
+
+
+def _busy_guild():
+    async def process_commands(message):
+        await asyncio.sleep(0)
+
+    prefixes = PrefixMatcher("dj;")
+    prefixes.bind(788392608254787595)
+    bot = types.SimpleNamespace(prefixes=prefixes,
+                                process_commands=process_commands)
+    guild = types.SimpleNamespace(id=790000000000000001)
+    author = types.SimpleNamespace(bot=False)
+    contents = ["dj;play never gonna give you up"] + [
+        "has anyone seen the <@!790000000000000003> stream last night"
+        if number % 4 == 0 else "lol that's exactly what I said earlier"
+        for number in range(19)
+    ]
+    return bot, [
+        types.SimpleNamespace(content=content, guild=guild, author=author)
+        for content in contents
+    ]
+
+
+class StatisticsTests(unittest.TestCase):
+    def test_mann_whitney_u(self):
+        baseline = [1.0 + index * 0.01 for index in range(30)]
+
+        assert mann_whitney_u(baseline, [value * 1.5 for value in baseline]) < 0.01
+        assert mann_whitney_u(baseline, baseline) > 0.4
+        assert mann_whitney_u(baseline, [value * 0.5 for value in baseline]) > 0.99
+
+    def test_baselines(self):
+        samples = [1.0 + index * 0.01 for index in range(30)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "benchmarks.json")
+            Baselines(None).check(Result("noop", samples))
+            Baselines(path).check(Result("noop", samples))
+            assert not os.path.exists(path)
+
+            Baselines(path, update=True).check(Result("noop", samples))
+            baselines = Baselines(path, tolerance=0.25, update=False)
+
+            # Slower for sure, but within the tolerance
+            assert baselines.check(
+                Result("noop", [value * 1.2 for value in samples])) is None
+            assert baselines.check(
+                Result("noop", [value * 1.5 for value in samples])) is not None
+            assert baselines.check(Result("unrecorded", samples)) is None
+
+
+@unittest.skipUnless(
+    os.environ.get("BENCHMARK") == "1",
+    "benchmarks are opt-in, set BENCHMARK=1 to run them")
+class BenchmarkTests(unittest.TestCase):
+    """Offline benchmarks of the hot paths, only run with BENCHMARK=1
+
+    Runs are gated against the baseline file at BENCHMARK_BASELINES when there is one, record it
+    with BENCHMARK_UPDATE=1 on the same kind of machine first. BENCHMARK_TOLERANCE is how much
+    slower (0.25 = 25%) a median may get before it fails"""
+    @classmethod
+    def setUpClass(cls):
+        cls.baselines = Baselines(
+            os.environ.get("BENCHMARK_BASELINES"),
+            tolerance=float(os.environ.get("BENCHMARK_TOLERANCE", 0.25)))
+
+    def check(self, result):
+        print(result)
+        regression = self.baselines.check(result)
+        assert regression is None, str(regression)
+
+    def test_track_position_converter(self):
+        self.check(
+            measure_async("TrackPositionConverter",
+                          TrackPositionConverter().convert, ctx, "1h30m15s"))
+
+    def test_index_converter(self):
+        self.check(
+            measure_async("IndexConverter", IndexConverter().convert, ctx,
+                          "12"))
+
+    def test_volume_converter(self):
+        self.check(
+            measure_async("VolumeConverter", VolumeConverter().convert, ctx,
+                          "150"))
+
+    def test_milliseconds_to_str(self):
+        self.check(measure("milliseconds_to_str", milliseconds_to_str,
+                           7384000))
+
+    def test_playlist_paginator(self):
+        songs = Playlist.from_json(playlist).songs
+        paginator = PlaylistPaginator(songs,
+                                      playlist=Playlist.from_json(playlist),
+                                      ctx=ctx)
+        menu = types.SimpleNamespace(current_page=3)
+
+        self.check(
+            measure_async("PlaylistPaginator.format_page",
+                          paginator.format_page, menu, list(songs[12:16])))
+
+    def test_song_round_trip(self):
+        self.check(
+            measure("Song round trip",
+                    lambda: Song.from_json(dict(document)).json))
+
+    def test_playlist_round_trip(self):
+        def round_trip():
+            songs = Playlist.from_json(dict(playlist)).songs
+            return [song.title for song in songs], songs.json
+
+        self.check(measure("Playlist round trip", round_trip))
+
+    def test_document_evaluation(self):
+        self.check(
+            measure("DocumentEvaluation.from_dict",
+                    DocumentEvaluation.from_dict, {
+                        "replaced": 0,
+                        "inserted": 1,
+                        "skipped": 0,
+                        "unchanged": 0,
+                        "deleted": 0,
+                        "errors": 0,
+                        "generated_keys": ["0d3a2c1e"],
+                    }))
+
+    def test_embed_template(self):
+        self.check(measure("InsuffArgs", InsuffArgs, ctx))
+
+    def test_progress_image(self):
+        image = PIL.Image.open("./assets/progress.png").convert("RGB")
+
+        self.check(
+            measure("render_progress",
+                    lambda: render_progress(image.copy(), 95000, 212000),
+                    rounds=10))
+
+    def test_message_filter(self):
+        """Messages/sec through `on_message` on a busy guild where 1 in 20 messages is a command"""
+        bot, messages = _busy_guild()
+        messages = itertools.cycle(messages)
+
+        result = measure_async("on_message filter",
+                               lambda: DJDiscord.on_message(bot, next(messages)))
+        print("%.0f messages/sec" % (1 / result.median))
+        self.check(result)
+
+    def test_event_loops(self):
+        """Message dispatch and database round trip throughput under every available event loop"""
+        bot, messages = _busy_guild()
+
+        async def dispatch():
+            # Like Client.dispatch, every event handler runs as its own task
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*[
+                loop.create_task(DJDiscord.on_message(bot, message))
+                for message in messages
+            ])
+
+        loops = available()
+        for name, factory in loops.items():
+            with self.subTest(loop=name):
+                result = measure_async("dispatch [%s]" % name, dispatch,
+                                       loop_factory=factory)
+                print("%.0f messages/sec" % (len(messages) / result.median))
+                self.check(result)
+
+                round_trip = RoundTrip()
+                result = measure_async("database round trip [%s]" % name,
+                                       round_trip,
+                                       loop_factory=factory,
+                                       teardown=round_trip.close)
+                print("%.0f round trips/sec" % (1 / result.median))
+                self.check(result)
+
+        if "uvloop" not in loops:
+            print("uvloop isn't installed, only the asyncio loop was measured")
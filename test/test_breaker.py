@@ -0,0 +1,118 @@
+import asyncio
+import unittest
+import urllib.error
+
+import aiohttp
+import youtube_dl.utils
+
+from utils.breaker import CircuitBreaker, default_breakers, transport_failure
+from utils.exceptions import CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def test_open_and_recover(self):
+        async def _fail() -> None:
+            raise ConnectionError("youtube is down")
+
+        async def _succeed() -> str:
+            return "ok"
+
+        async def _test_open_and_recover() -> None:
+            clock = FakeClock()
+            breaker = CircuitBreaker("YouTube", failure_threshold=2, reset_timeout=30, clock=clock)
+
+            for _ in range(2):
+                with self.assertRaises(ConnectionError):
+                    await breaker.call(_fail)
+            assert breaker.state == CircuitBreaker.OPEN
+
+            with self.assertRaises(CircuitOpenError):
+                await breaker.call(_succeed)
+            assert breaker.rejected == 1
+
+            clock.now = 30
+            assert breaker.state == CircuitBreaker.HALF_OPEN
+            with self.assertRaises(ConnectionError):
+                await breaker.call(_fail)
+            assert breaker.state == CircuitBreaker.OPEN
+
+            clock.now = 60
+            assert await breaker.call(_succeed) == "ok"
+            assert breaker.state == CircuitBreaker.CLOSED
+            assert breaker.opened == 2
+
+        asyncio.run(_test_open_and_recover())
+
+    def test_timeout(self):
+        async def _hang() -> None:
+            await asyncio.sleep(1)
+
+        async def _test_timeout() -> None:
+            breaker = CircuitBreaker("Lavalink", failure_threshold=1, timeout=0.01)
+            with self.assertRaises(asyncio.TimeoutError):
+                await breaker.call(_hang)
+            assert breaker.state == CircuitBreaker.OPEN
+
+        asyncio.run(_test_timeout())
+
+    def test_query_errors(self):
+        async def _private() -> None:
+            raise youtube_dl.utils.DownloadError(
+                "ERROR: Private video", (None, youtube_dl.utils.ExtractorError(
+                    "Private video", expected=True), None))
+
+        async def _test_query_errors() -> None:
+            breaker = CircuitBreaker("YouTube", failure_threshold=1,
+                                     is_failure=transport_failure)
+            for _ in range(5):
+                with self.assertRaises(youtube_dl.utils.DownloadError):
+                    await breaker.call(_private)
+            assert breaker.state == CircuitBreaker.CLOSED
+            assert breaker.failures == 0
+
+        asyncio.run(_test_query_errors())
+
+    def test_transport_failure(self):
+        def _wrapped(cause):
+            return youtube_dl.utils.DownloadError(
+                "ERROR: Unable to download webpage",
+                (None, youtube_dl.utils.ExtractorError("Unable to download webpage",
+                                                       cause=cause), None))
+
+        assert transport_failure(_wrapped(urllib.error.URLError("timed out")))
+        assert transport_failure(_wrapped(urllib.error.HTTPError(
+            "https://www.youtube.com", 503, "Unavailable", {}, None)))
+        assert not transport_failure(_wrapped(urllib.error.HTTPError(
+            "https://www.youtube.com", 404, "Not Found", {}, None)))
+        assert transport_failure(asyncio.TimeoutError())
+        assert not transport_failure(KeyError("upload_date"))
+
+    def test_client_errors(self):
+        class SpotifyAPIError(Exception):
+            def get_json(self):
+                return {"error": {"status": 400, "message": "invalid id"}}
+
+        async def _invalid() -> None:
+            raise SpotifyAPIError()
+
+        async def _test_client_errors() -> None:
+            for name, breaker in default_breakers(failure_threshold=1).items():
+                with self.assertRaises(SpotifyAPIError):
+                    await breaker.call(_invalid)
+                assert breaker.state == CircuitBreaker.CLOSED, name
+
+        asyncio.run(_test_client_errors())
+
+        assert transport_failure(aiohttp.ServerDisconnectedError())
+        assert transport_failure(aiohttp.ClientResponseError(
+            None, (), status=502))
+        assert not transport_failure(aiohttp.ClientResponseError(
+            None, (), status=404))
@@ -0,0 +1,87 @@
+import asyncio
+import unittest
+
+from utils.cache import LRUCache, SingleFlight, TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TTLCacheTests(unittest.TestCase):
+    def test_expiry(self):
+        clock = FakeClock()
+        cache = TTLCache(10, clock=clock)
+        cache.set("4uLU6hMCjMI75M1A2tKUQC", {"name": "Never Gonna Give You Up"})
+
+        assert "4uLU6hMCjMI75M1A2tKUQC" in cache
+        clock.now = 10
+        assert cache.get("4uLU6hMCjMI75M1A2tKUQC") is None
+        assert cache.hits == 1 and cache.misses == 1
+
+    def test_maxsize(self):
+        cache = TTLCache(10, maxsize=2)
+        for key in range(3):
+            cache.set(key, key)
+
+        assert len(cache) == 2
+        assert 0 not in cache
+        assert cache.get(2) == 2
+
+
+class LRUCacheTests(unittest.TestCase):
+    def test_recency(self):
+        evicted = []
+        cache = LRUCache(2, on_evict=lambda key, value: evicted.append(key))
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert evicted == ["b"]
+        assert "a" in cache and "c" in cache
+
+    def test_weight(self):
+        cache = LRUCache(10, weigher=len)
+        cache.set("a", [0] * 4)
+        cache.set("b", [0] * 4)
+        cache.set("c", [0] * 4)
+
+        assert "a" not in cache
+        assert cache.weight == 8
+        cache.pop("b")
+        assert cache.weight == 4
+
+        # Heavier than the whole cache, kept anyway until something else comes along
+        cache.set("d", [0] * 20)
+        assert list(cache._data) == ["d"] and cache.weight == 20
+
+
+class SingleFlightTests(unittest.TestCase):
+    def test_deduplication(self):
+        async def _test_deduplication() -> None:
+            flights = SingleFlight()
+            started = []
+
+            async def _extract(target: str) -> str:
+                started.append(target)
+                await asyncio.sleep(0.01)
+                return target.upper()
+
+            results = await asyncio.gather(*(flights.do("youtube_dl", "never gonna", _extract,
+                                                        "never gonna") for _ in range(10)))
+
+            assert results == ["NEVER GONNA"] * 10
+            assert started == ["never gonna"]
+            assert flights.calls["youtube_dl"] == 10
+            assert flights.deduplicated["youtube_dl"] == 9
+            assert not len(flights)
+
+            await flights.do("youtube_dl", "never gonna", _extract, "never gonna")
+            assert len(started) == 2
+
+        asyncio.run(_test_deduplication())
@@ -0,0 +1,67 @@
+import asyncio
+import types
+import unittest
+import unittest.mock
+
+from utils.breaker import CircuitBreaker, default_breakers
+from utils.cache import SingleFlight, TTLCache
+from utils.convert import normalize_query, resolve_song
+
+
+class NormalizeQueryTests(unittest.TestCase):
+    def test_searches(self):
+        assert normalize_query("ytsearch:Never  Gonna ") == \
+            normalize_query("ytsearch:never gonna") == "ytsearch:never gonna"
+        assert normalize_query("ytsearch:Never  Gonna") != \
+            normalize_query("scsearch:Never  Gonna")
+        assert normalize_query("ytsearch5:a") != normalize_query("ytsearch:a")
+
+    def test_youtube_links(self):
+        assert normalize_query(
+            "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42") == \
+            normalize_query("https://youtu.be/dQw4w9WgXcQ") == \
+            "youtube:dQw4w9WgXcQ"
+        assert normalize_query(
+            "https://www.youtube.com/playlist?list=PL1") != normalize_query(
+                "https://www.youtube.com/playlist?list=PL2")
+
+    def test_other_links(self):
+        assert normalize_query(
+            "https://soundcloud.com/rick/never-gonna/?si=abc") == \
+            "soundcloud.com/rick/never-gonna"
+
+
+class ResolveSongTests(unittest.TestCase):
+    def setUp(self):
+        self.bot = types.SimpleNamespace(
+            negative=TTLCache(60),
+            resolutions=SingleFlight(),
+            breakers=default_breakers(failure_threshold=2),
+            loop=None)
+
+    def resolve(self, target, error):
+        async def _resolve_song(loop, target, track):
+            raise error
+
+        with unittest.mock.patch("utils.convert._resolve_song", _resolve_song):
+            return asyncio.run(resolve_song(self.bot, target))
+
+    def test_bad_queries_leave_the_breaker_closed(self):
+        for number in range(5):
+            assert self.resolve("ytsearch:%d" % number,
+                                KeyError("upload_date")) is None
+            assert ("youtube_dl", "ytsearch:%d" % number) in self.bot.negative
+
+        assert self.bot.breakers["youtube"].state == CircuitBreaker.CLOSED
+
+    def test_outages_open_the_breaker(self):
+        for number in range(2):
+            with self.assertRaises(ConnectionError):
+                self.resolve("ytsearch:%d" % number, ConnectionError())
+
+        assert self.bot.breakers["youtube"].state == CircuitBreaker.OPEN
+        assert not self.bot.negative
+
+
+if __name__ == "__main__":
+    unittest.main()
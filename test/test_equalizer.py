@@ -0,0 +1,126 @@
+import asyncio
+import types
+import unittest
+
+from utils import equalizer
+from utils.cache import SingleFlight
+from utils.equalizer import EqualizerPresets
+
+
+class FakePlayer:
+    def __init__(self):
+        self.equalizer = [0.0] * equalizer.BANDS
+        self.updates = []
+
+    async def set_gains(self, *gain_list):
+        self.updates.append(gain_list)
+        for band, gain in gain_list:
+            self.equalizer[band] = gain
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.rows = {}
+        self.fetches = 0
+        self.psqlconn = self
+
+    async def fetch(self, query, guild_id):
+        self.fetches += 1
+        return [{
+            "name": name,
+            "gains": gains
+        } for (guild, name), gains in self.rows.items() if guild == guild_id]
+
+    async def run(self, query, *args):
+        if query.startswith("INSERT"):
+            guild_id, name, gains = args
+            self.rows[guild_id, name] = gains
+        elif query.startswith("DELETE"):
+            del self.rows[args]
+
+
+class EqualizerTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_round_trip(self):
+        for gains in equalizer.BUILTIN_PRESETS.values():
+            data = equalizer.encode(gains)
+            assert len(data) == equalizer.BANDS
+            assert equalizer.decode(data) == gains
+
+        assert equalizer.decode(equalizer.encode([2.0] * 15)) == (1.0, ) * 15
+        assert equalizer.decode(equalizer.encode([-1] * 15)) == (-0.25, ) * 15
+
+    def test_changes(self):
+        bass = equalizer.BUILTIN_PRESETS["bass"]
+
+        assert equalizer.changes(bass, bass) == []
+        assert equalizer.changes([0.0] * 15, bass) == [
+            (band, gain) for band, gain in enumerate(bass) if gain
+        ]
+
+    def test_apply_batches(self):
+        player = FakePlayer()
+
+        moved = self.loop.run_until_complete(
+            equalizer.apply_gains(player, equalizer.BUILTIN_PRESETS["rock"]))
+
+        assert moved == 14
+        assert len(player.updates) == 1
+        assert tuple(player.equalizer) == equalizer.BUILTIN_PRESETS["rock"]
+
+        self.loop.run_until_complete(
+            equalizer.apply_gains(player, equalizer.BUILTIN_PRESETS["rock"]))
+        assert len(player.updates) == 1
+
+
+class EqualizerPresetsTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.database = FakeDatabase()
+        self.presets = EqualizerPresets(
+            types.SimpleNamespace(database=self.database,
+                                  resolutions=SingleFlight()))
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_builtin_needs_no_lookup(self):
+        assert self.run_(self.presets.get(1, "Bass")) == \
+            equalizer.BUILTIN_PRESETS["bass"]
+        assert self.database.fetches == 0
+
+    def test_save_and_delete(self):
+        curve = [0.1234] * 15
+
+        saved = self.run_(self.presets.save(1, "Mine", curve))
+
+        assert saved == (0.125, ) * 15
+        assert self.database.rows[1, "mine"] == equalizer.encode(curve)
+        assert self.run_(self.presets.get(1, "mine")) == saved
+        assert self.run_(self.presets.get(2, "mine")) is None
+        assert self.database.fetches == 2
+
+        assert self.run_(self.presets.delete(1, "MINE"))
+        assert not self.run_(self.presets.delete(1, "mine"))
+        assert self.run_(self.presets.get(1, "mine")) is None
+        assert self.database.rows == {}
+        assert self.database.fetches == 2
+
+    def test_loads_once_per_guild(self):
+        self.database.rows[1, "night"] = equalizer.encode([-0.1] * 15)
+
+        assert self.run_(self.presets.get(1, "night")) == (-0.1, ) * 15
+        assert self.run_(self.presets.get(1, "day")) is None
+        assert self.database.fetches == 1
+
+
+if __name__ == "__main__":
+    unittest.main()
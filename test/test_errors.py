@@ -0,0 +1,75 @@
+import asyncio
+import os
+import unittest
+
+from utils import errors
+from utils.database import DJDiscordDatabaseManager
+
+
+def _raise(message):
+    raise KeyError(message)
+
+
+def _raise_elsewhere(message):
+    raise KeyError(message)
+
+
+def _catch(function, message):
+    try:
+        function(message)
+    except Exception as error:
+        return error
+
+
+class FingerprintTests(unittest.TestCase):
+    def test_same_site(self):
+        assert errors.fingerprint(_catch(_raise, "a")) == errors.fingerprint(
+            _catch(_raise, "b"))
+
+    def test_different_site(self):
+        assert errors.fingerprint(_catch(_raise, "a")) != errors.fingerprint(
+            _catch(_raise_elsewhere, "a"))
+
+    def test_chained(self):
+        try:
+            try:
+                _raise("a")
+            except KeyError as error:
+                raise RuntimeError("wrapped") from error
+        except RuntimeError as error:
+            stack = errors.normalize_stack(error)
+
+        assert stack[0] == "builtins.RuntimeError"
+        assert "builtins.KeyError" in stack
+        assert "  test/test_errors:_raise" in stack
+
+    def test_normalized(self):
+        stack = "\n".join(errors.normalize_stack(_catch(_raise, "secret")))
+
+        assert "secret" not in stack
+        assert os.sep + "root" not in stack
+        assert not any(character.isdigit() for character in stack)
+
+
+class RecordTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.queries = []
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_record_error(self):
+        async def run(query):
+            self.queries.append(query)
+
+        database = DJDiscordDatabaseManager(None, None)
+        database.run = run
+        error = _catch(_raise, "a")
+
+        digest = self.loop.run_until_complete(
+            database.record_error(error, "case"))
+
+        assert digest == errors.fingerprint(error)
+        query, = self.queries
+        assert "r.table('errors').get('%s').replace" % digest in str(query)
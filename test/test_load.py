@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+
+import rethinkdb
+
+from loadtest import LoadTest
+from standins import PostgresStandIn, RethinkDBStandIn
+
+
+class StandInTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.rdbconn = RethinkDBStandIn()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_query(self, query):
+        return self.loop.run_until_complete(query.run(self.rdbconn))
+
+    def test_rethinkdb_playlist_queries(self):
+        r = rethinkdb.r
+        result = self.run_query(
+            r.table("playlists").insert({
+                "id": "a",
+                "author": 1,
+                "songs": [],
+                "cover": None
+            }))
+        assert result["inserted"] == 1
+
+        self.run_query(
+            r.table("playlists").get("a").update(
+                {"songs": r.row["songs"].append({"title": "one"})}))
+        self.run_query(
+            r.table("playlists").get("a").update({
+                "songs":
+                r.row["songs"].add([{"title": "two"}, {"title": "three"}])
+            }))
+        self.run_query(
+            r.table("playlists").get("a").update(
+                {"songs": r.row["songs"].delete_at(0)}))
+
+        playlist = self.run_query(r.table("playlists").get("a"))
+        assert [song["title"] for song in playlist["songs"]] == ["two", "three"]
+
+        async def _filter():
+            return [
+                document async for document in await r.table(
+                    "playlists").filter({"author": 1}).run(self.rdbconn)
+            ]
+
+        assert len(self.loop.run_until_complete(_filter())) == 1
+        assert self.run_query(r.table("playlists").get_all("a").delete())[
+            "deleted"] == 1
+        assert self.run_query(r.table("playlists").get("a")) is None
+
+    def test_postgres_configuration(self):
+        postgres = PostgresStandIn()
+
+        async def _configure():
+            await postgres.execute(
+                "INSERT INTO configuration (id, announcement, dj_role) VALUES ($1, $2, $3)",
+                1, 2, 3)
+            await postgres.execute(
+                "UPDATE configuration SET dj_role=$1 WHERE ID=$2;", 4, 1)
+            return await postgres.fetch(
+                "SELECT (dj_role) FROM configuration WHERE id=$1", 1)
+
+        assert self.loop.run_until_complete(_configure()) == [{"dj_role": 4}]
+
+
+class LoadTests(unittest.TestCase):
+    def test_smoke(self):
+        loop = asyncio.new_event_loop()
+        test = LoadTest(guilds=5, rate=20, duration=2, seed=1)
+        try:
+            report = loop.run_until_complete(test.run())
+        finally:
+            loop.run_until_complete(test.teardown())
+            loop.close()
+
+        print(report)
+        assert report.completed > 0
+        assert report.lavalink_requests > 0
@@ -0,0 +1,34 @@
+import asyncio
+import threading
+import unittest
+
+from utils import loop
+
+
+class LoopTests(unittest.TestCase):
+    def tearDown(self):
+        asyncio.set_event_loop_policy(None)
+
+    def test_install(self):
+        installed = loop.install("uvloop")
+
+        assert installed == ("uvloop" if "uvloop" in loop.available() else
+                             "asyncio")
+        assert loop.install("asyncio") == "asyncio"
+        assert type(asyncio.get_event_loop_policy()) is asyncio.DefaultEventLoopPolicy
+        with self.assertRaises(ValueError):
+            loop.install("trio")
+
+    def test_configure(self):
+        event_loop = asyncio.new_event_loop()
+        try:
+            executor = loop.configure(event_loop, 3)
+            name = event_loop.run_until_complete(
+                event_loop.run_in_executor(None,
+                                           lambda: threading.current_thread().name))
+        finally:
+            event_loop.close()
+
+        assert executor._max_workers == 3
+        assert name.startswith(loop.EXECUTOR_THREAD_PREFIX)
+        assert loop.default_workers() <= 32
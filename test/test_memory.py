@@ -0,0 +1,83 @@
+import gc
+import tracemalloc
+import unittest
+
+import lavalink
+
+from utils.objects import TrackMeta
+
+QUEUE_LENGTH = 10000
+
+
+def _track_data(index: int) -> dict:
+    return {
+        "track": "QAAAjQIAJVJpY2sgQXN0bGV5IC0gTmV2ZXIgR29ubmEgR2l2ZSBZb3UgVXAADlJpY2tBc3RsZXlWRVZPAAAAAAADPCAAC2RRdzR3OVdnWGNRAAEAK2h0dHBzOi8vd3d3LnlvdXR1YmUuY29tL3dhdGNoP3Y9ZFF3NHc5V2dYY1EAB3lvdXR1YmUAAAAAAAAAAA%d" % index,
+        "info": {
+            "identifier": "dQw4w9WgXcQ%d" % index,
+            "isSeekable": True,
+            "author": "RickAstleyVEVO",
+            "length": 212000,
+            "isStream": False,
+            "title": "Rick Astley - Never Gonna Give You Up",
+            "uri": "https://www.youtube.com/watch?v=dQw4w9WgXcQ&i=%d" % index,
+        },
+    }
+
+
+def _song(index: int) -> dict:
+    return {
+        "source": "https://r4---sn-vgqsknes.googlevideo.com/videoplayback?expire=%d" % index,
+        "uploader": "RickAstleyVEVO",
+        "title": "Rick Astley - Never Gonna Give You Up",
+        "thumbnails": [{
+            "url": "https://i.ytimg.com/vi/dQw4w9WgXcQ/hqdefault.jpg?i=%d" % index,
+            "width": 480,
+            "height": 360,
+            "resolution": "480x360",
+            "id": "%d" % thumbnail,
+        } for thumbnail in range(4)],
+        "created": "2009-10-25",
+        "length": 212,
+        "url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ&i=%d" % index,
+    }
+
+
+def _measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        queue = build()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del queue
+    return size
+
+
+class TrackMemoryTests(unittest.TestCase):
+    """Measures what a queue of 10k tracks costs with compact metadata compared to raw song dicts"""
+    def test_queue_memory(self):
+        songs = [_song(index) for index in range(QUEUE_LENGTH)]
+        datas = [_track_data(index) for index in range(QUEUE_LENGTH)]
+
+        raw = _measure(lambda: [
+            lavalink.AudioTrack(data, requester=0, raw_info=dict(song))
+            for data, song in zip(datas, songs)
+        ])
+        compact = _measure(lambda: [
+            lavalink.AudioTrack(data,
+                                requester=0,
+                                meta=TrackMeta.from_song(
+                                    song, data["info"]["length"]))
+            for data, song in zip(datas, songs)
+        ])
+
+        print("raw_info: %d B/track, TrackMeta: %d B/track" %
+              (raw // QUEUE_LENGTH, compact // QUEUE_LENGTH))
+        assert compact < raw
+
+    def test_meta_slots(self):
+        meta = TrackMeta.from_song(_song(0), 212000)
+
+        assert not hasattr(meta, "__dict__")
+        assert TrackMeta.from_json(meta.json).json == meta.json
@@ -0,0 +1,45 @@
+import unittest
+
+from utils import metrics
+
+
+class MetricsTests(unittest.TestCase):
+    def test_histogram_render(self):
+        histogram = metrics.Histogram("test_seconds", "Test latency",
+                                      ["command"], buckets=(0.1, 1.0))
+        histogram.observe(0.05, command="play")
+        histogram.observe(0.5, command="play")
+        histogram.observe(5.0, command="play")
+
+        rendered = histogram.render()
+        assert "# TYPE test_seconds histogram" in rendered
+        assert 'test_seconds_bucket{command="play",le="0.1"} 1' in rendered
+        assert 'test_seconds_bucket{command="play",le="1.0"} 2' in rendered
+        assert 'test_seconds_bucket{command="play",le="+Inf"} 3' in rendered
+        assert 'test_seconds_count{command="play"} 3' in rendered
+        assert histogram.count(command="play") == 3
+
+    def test_timer(self):
+        histogram = metrics.Histogram("timer_seconds", "Timer")
+        with histogram.time():
+            pass
+
+        assert histogram.count() == 1
+
+    def test_registry_callback(self):
+        registry = metrics.Registry()
+        counter = registry.register(
+            metrics.Counter("failures_total", "Failures", ["command"]))
+        counter.inc(command='say "hi"')
+        registry.register(
+            metrics.CallbackMetric("players", "Players", lambda: 3))
+        registry.register(
+            metrics.CallbackMetric("hits_total", "Hits",
+                                   lambda: {"spotify": 2}, ["cache"],
+                                   "counter"))
+
+        rendered = registry.render()
+        assert 'failures_total{command="say \\"hi\\""} 1.0' in rendered
+        assert "players 3.0" in rendered
+        assert "# TYPE hits_total counter" in rendered
+        assert 'hits_total{cache="spotify"} 2.0' in rendered
@@ -0,0 +1,60 @@
+import unittest
+
+from utils.objects import Playlist, Song, SongList, Station
+
+document = {
+    "source": "https://r4---sn-vgqsknes.googlevideo.com/videoplayback",
+    "uploader": "RickAstleyVEVO",
+    "title": "Rick Astley - Never Gonna Give You Up",
+    "thumbnails": [{"url": "https://i.ytimg.com/vi/dQw4w9WgXcQ/hqdefault.jpg"}],
+    "created": "2009-10-25",
+    "length": 212,
+    "url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+}
+
+
+class ObjectTests(unittest.TestCase):
+    def test_song_round_trip(self):
+        song = Song.from_json(document)
+
+        assert song.json is document
+        assert song.host == "www.youtube.com"
+        assert song.emoji == "<:youtube:790189633727627294>"
+        assert song["title"] == document["title"]
+        assert Song(*(document[key] for key in (
+            "source", "url", "uploader", "title", "thumbnails", "created",
+            "length"))).json == document
+
+    def test_song_slots(self):
+        song = Song.from_json(document)
+
+        assert not hasattr(song, "__dict__")
+        with self.assertRaises(AttributeError):
+            song.title = "Sandstorm"
+
+    def test_station_round_trip(self):
+        station = Station.from_json({
+            "source": "https://stream.revma.ihrhls.com/zc181",
+            "call_sign": "WHTZ",
+            "frequency": 100.3,
+            "thumbnail": None,
+            "url": "https://www.iheart.com/live/z100-1469/",
+        })
+
+        assert station.call_sign == "WHTZ"
+        assert station.json["frequency"] == 100.3
+
+    def test_playlist_lazy_songs(self):
+        playlist = Playlist.from_json({
+            "id": "0d3a2c1e-6c39-4c0e-9a4e-2b7d2a4f8f1b",
+            "songs": [document] * 1000,
+            "author": 788392608254787595,
+            "cover": None,
+        })
+
+        assert isinstance(playlist.songs, SongList)
+        assert len(playlist.songs) == 1000
+        assert playlist.songs._songs.count(None) == 1000
+        assert [song.title for song in playlist.songs[4:8]] == [document["title"]] * 4
+        assert playlist.songs._songs.count(None) == 996
+        assert playlist.songs[-1] is playlist.songs[999]
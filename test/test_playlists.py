@@ -0,0 +1,159 @@
+import asyncio
+import types
+import unittest
+
+from utils.cache import SingleFlight
+from utils.convert import PlaylistConverter
+from utils.playlists import PlaylistCache
+
+
+def _playlist(playlist_id, author, songs=0):
+    return {
+        "id": playlist_id,
+        "author": author,
+        "cover": None,
+        "songs": [{"title": "Song %d" % number} for number in range(songs)],
+    }
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.documents = {}
+        self.fetches = 0
+        self.primary_keys = 0
+
+    async def run(self, query):
+        self.fetches += 1
+        self.primary_keys += 1
+        return self.documents.get(query._args[1].data)
+
+    async def get(self, **kwargs):
+        self.fetches += 1
+        return [
+            document for document in self.documents.values()
+            if all(document.get(key) == value for key, value in kwargs.items())
+        ]
+
+
+class PlaylistCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.database = FakeDatabase()
+        self.database.documents["a"] = _playlist("a", 1, songs=3)
+        self.playlists = PlaylistCache(types.SimpleNamespace(
+            database=self.database, resolutions=SingleFlight()),
+                                       max_songs=10)
+        self.playlists.live = True
+
+    def tearDown(self):
+        self.loop.close()
+
+    def by_author(self, author):
+        return self.loop.run_until_complete(self.playlists.by_author(author))
+
+    def test_read_through(self):
+        first = self.by_author(1)
+
+        assert self.by_author(1) is first
+        assert self.loop.run_until_complete(self.playlists.by_id("a")) is first
+        assert self.database.fetches == 1
+        assert self.by_author(2) is None
+
+    def test_not_live(self):
+        self.playlists.live = False
+        self.by_author(1)
+        self.by_author(1)
+
+        assert self.database.fetches == 2
+        assert not self.playlists.cache
+
+    def test_changefeed(self):
+        self.by_author(1)
+        updated = _playlist("a", 1, songs=4)
+        self.playlists.apply({
+            "old_val": self.database.documents["a"],
+            "new_val": updated
+        })
+
+        assert len(self.by_author(1).songs) == 4
+        assert self.database.fetches == 1
+
+        # Changed hands, the old author mustn't find it any more
+        self.database.documents["a"] = _playlist("a", 2)
+        self.playlists.apply({
+            "old_val": updated,
+            "new_val": self.database.documents["a"]
+        })
+        assert self.by_author(1) is None
+
+        self.playlists.apply({
+            "old_val": self.database.documents.pop("a"),
+            "new_val": None
+        })
+        assert not self.playlists.cache and not self.playlists.authors
+
+    def test_race(self):
+        async def _racing_fetch(author):
+            # Edited by another process while the read was in flight
+            self.playlists.apply({"old_val": None, "new_val": _playlist("b", 3)})
+            return self.database.documents["a"]
+
+        self.playlists._fetch_by = _racing_fetch
+        assert self.by_author(1) is not None
+        assert not self.playlists.cache
+
+    def test_eviction(self):
+        self.database.documents["b"] = _playlist("b", 2, songs=8)
+        self.by_author(1)
+        self.by_author(2)
+
+        assert "a" not in self.playlists.cache
+        # The author still resolves, the playlist comes back by primary key
+        self.database.fetches = 0
+        assert self.by_author(1).id == "a"
+        assert self.database.primary_keys == 1 and self.database.fetches == 1
+
+    def test_names(self):
+        self.database.documents["c"] = dict(_playlist("c", 3), name="gym")
+
+        assert self.loop.run_until_complete(
+            self.playlists.by_name("gym")).id == "c"
+        assert self.playlists.names.get("gym") == "c"
+
+        self.playlists.apply({
+            "old_val": self.database.documents["c"],
+            "new_val": dict(self.database.documents["c"], name="study")
+        })
+        assert "gym" not in self.playlists.names
+
+
+class PlaylistConverterTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.database = FakeDatabase()
+        self.database.documents["0d3a2c1e-6c39-4c0e-9a4e-2b7d2a4f8f1b"] = _playlist(
+            "0d3a2c1e-6c39-4c0e-9a4e-2b7d2a4f8f1b", 788392608254787595)
+        bot = types.SimpleNamespace(database=self.database,
+                                    resolutions=SingleFlight())
+        bot.playlists = PlaylistCache(bot)
+        bot.playlists.live = True
+        # No guild or message, a member lookup would blow up
+        self.ctx = types.SimpleNamespace(bot=bot)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def convert(self, argument):
+        return self.loop.run_until_complete(PlaylistConverter().convert(
+            self.ctx, argument))
+
+    def test_fast_paths(self):
+        for argument in ("788392608254787595", "<@788392608254787595>",
+                         "<@!788392608254787595>",
+                         "0d3a2c1e-6c39-4c0e-9a4e-2b7d2a4f8f1b"):
+            assert self.convert(argument).id == (
+                "0d3a2c1e-6c39-4c0e-9a4e-2b7d2a4f8f1b")
+
+        # One scan to resolve the author, everything after came from memory
+        assert self.database.fetches == 1
+
@@ -0,0 +1,44 @@
+import types
+import unittest
+
+from utils.prefix import COMMAND, MENTION, PrefixMatcher
+
+BOT_ID = 788392608254787595
+GUILD_ID = 790000000000000001
+
+
+class PrefixMatcherTests(unittest.TestCase):
+    def setUp(self):
+        self.matcher = PrefixMatcher("dj;")
+        self.matcher.bind(BOT_ID)
+
+    def test_default(self):
+        assert self.matcher.match("dj;play never gonna", GUILD_ID) == COMMAND
+        assert self.matcher.match("dj;play", None) == COMMAND
+        assert self.matcher.match("hello there", GUILD_ID) is None
+        assert self.matcher.match("", GUILD_ID) is None
+
+    def test_mentions(self):
+        assert self.matcher.match("hey <@!%d>" % BOT_ID, GUILD_ID) == MENTION
+        assert self.matcher.match("<@%d>" % BOT_ID, GUILD_ID) == MENTION
+        assert self.matcher.match("hey <@!1234>", GUILD_ID) is None
+
+    def test_guild_prefix(self):
+        self.matcher.set(GUILD_ID, "!")
+
+        assert self.matcher.match("!play", GUILD_ID) == COMMAND
+        assert self.matcher.match("dj;play", GUILD_ID) is None
+        assert self.matcher.match("dj;play", GUILD_ID + 1) == COMMAND
+
+        self.matcher.set(GUILD_ID, None)
+        assert self.matcher.match("dj;play", GUILD_ID) == COMMAND
+        assert not self.matcher.guilds
+
+    def test_command_prefix(self):
+        self.matcher.set(GUILD_ID, "!")
+        message = types.SimpleNamespace(guild=types.SimpleNamespace(
+            id=GUILD_ID))
+
+        assert self.matcher(None, message) == ["!"]
+        assert self.matcher(None, types.SimpleNamespace(guild=None)) == ["dj;"]
+        assert str(self.matcher) == "dj;"
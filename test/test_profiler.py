@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from utils.profiler import SamplingProfiler
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class ProfilerTests(unittest.TestCase):
+    def test_collapsed_and_top(self):
+        profiler = SamplingProfiler(interval=0.001).start()
+        spin(0.2)
+        profiler.stop()
+
+        assert profiler.samples > 0
+        thread, function, own, total = profiler.top(1)[0]
+        assert thread == "event-loop"
+        assert function.startswith("spin (test_profiler.py")
+        assert 0 < own <= total <= 1
+
+        line = profiler.collapsed().splitlines()[0]
+        stack, count = line.rsplit(" ", 1)
+        assert stack.startswith("event-loop;") and int(count) > 0
+
+    def test_parked_threads(self):
+        stopped = threading.Event()
+        parked = threading.Thread(target=stopped.wait, name="parked")
+        parked.start()
+        try:
+            profiler = SamplingProfiler(interval=0.001,
+                                        all_threads=True).start()
+            spin(0.1)
+            profiler.stop()
+        finally:
+            stopped.set()
+            parked.join()
+
+        assert profiler.ticks["parked"] > 0
+        assert not any(stack[0] == "parked" for stack in profiler.stacks)
+        assert all(total <= 1 for _, _, _, total in profiler.top(50))
+
+        profiler = SamplingProfiler(interval=0.001).start()
+        spin(0.05)
+        profiler.stop()
+        assert set(profiler.ticks) == {"event-loop"}
+
+    def test_task_filter(self):
+        loop = asyncio.new_event_loop()
+
+        async def busy():
+            spin(0.1)
+
+        async def main():
+            task = loop.create_task(asyncio.sleep(0.2))
+            profiler = SamplingProfiler(loop, interval=0.001, task=task)
+            profiler.start()
+            await loop.create_task(busy())
+            await task
+            return profiler.stop()
+
+        try:
+            profiler = loop.run_until_complete(main())
+        finally:
+            loop.close()
+
+        assert not any("spin" in ";".join(stack)
+                       for stack in profiler.stacks)
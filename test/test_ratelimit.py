@@ -0,0 +1,146 @@
+import asyncio
+import time
+import types
+import unittest
+import unittest.mock
+
+import discord.ext.commands
+from discord.ext.commands.view import StringView
+
+from commands.music import Music
+from utils.convert import SongConverter
+from utils.exceptions import PlayerNotFoundError, RateLimitedError
+from utils.ratelimit import AdmissionController, CostClass
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class AdmissionControllerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.admission = AdmissionController(
+            classes={"extract": CostClass("extract", 1.0, 2, 2.0, 4)},
+            costs={"play": ("extract", 1)},
+            max_wait=1.5,
+            clock=self.clock)
+
+    def test_free_commands(self):
+        for _ in range(100):
+            assert self.admission.reserve("show", 1, 10) == 0
+        assert not self.admission.buckets
+
+    def test_queue_then_reject(self):
+        assert self.admission.reserve("play", 1, 10) == 0
+        assert self.admission.reserve("play", 1, 10) == 0
+        # Out of burst, the next one waits for the refill and borrows against it
+        assert self.admission.reserve("play", 1, 10) == 1.0
+        with self.assertRaises(RateLimitedError) as raised:
+            self.admission.reserve("play", 1, 10)
+
+        assert raised.exception.scope == "user"
+        assert raised.exception.retry_after == 2.0
+        assert (self.admission.queued, self.admission.rejected) == (1, 1)
+
+        self.clock.now = 3
+        assert self.admission.reserve("play", 1, 10) == 0
+
+    def test_guild_bucket(self):
+        for user in range(4):
+            assert self.admission.reserve("play", user, 10) == 0
+        assert self.admission.reserve("play", 4, 10) == 0.5
+        assert self.admission.reserve("play", 5, 11) == 0
+
+        with self.assertRaises(RateLimitedError) as raised:
+            for user in range(6, 10):
+                self.admission.reserve("play", user, 10)
+        assert raised.exception.scope == "guild"
+
+    def test_sweep(self):
+        self.admission.max_buckets = 4
+        for user in range(4):
+            self.admission.reserve("play", user, None)
+
+        self.clock.now = 10
+        self.admission.reserve("play", 4, None)
+        assert list(self.admission.buckets) == [("user", 4, "extract")]
+
+    def test_admit(self):
+        self.admission.clock = time.monotonic
+        ctx = types.SimpleNamespace(
+            command=types.SimpleNamespace(qualified_name="play"),
+            author=types.SimpleNamespace(id=1),
+            guild=None)
+
+        async def _admit():
+            started = asyncio.get_running_loop().time()
+            for _ in range(3):
+                await self.admission.admit(ctx)
+            return asyncio.get_running_loop().time() - started
+
+        loop = asyncio.new_event_loop()
+        try:
+            self.admission.classes["extract"] = CostClass(
+                "extract", 20.0, 2, 20.0, 2)
+            assert loop.run_until_complete(_admit()) >= 0.04
+        finally:
+            loop.close()
+        assert self.admission.waiting == 0
+
+
+class MusicAdmissionTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.bot = discord.ext.commands.Bot(command_prefix="dj;",
+                                            loop=self.loop)
+        self.bot.admission = AdmissionController(
+            classes={"extract": CostClass("extract", 0.1, 1, 1.0, 10)},
+            costs={"add": ("extract", 1), "now": ("extract", 1)},
+            max_wait=0)
+        self.bot.add_cog(Music(self.bot))
+
+    def tearDown(self):
+        self.loop.close()
+
+    def invoke(self, content, guild=None):
+        message = types.SimpleNamespace(author=types.SimpleNamespace(id=1),
+                                        guild=guild,
+                                        channel=None,
+                                        content=content,
+                                        _state=None)
+        ctx = discord.ext.commands.Context(prefix="dj;",
+                                           view=StringView(content),
+                                           bot=self.bot,
+                                           message=message)
+        ctx.view.skip_string("dj;")
+        ctx.invoked_with = ctx.view.get_word()
+        ctx.command = self.bot.get_command(ctx.invoked_with)
+        ctx.send = unittest.mock.AsyncMock()
+        ctx.database = types.SimpleNamespace(log=unittest.mock.AsyncMock())
+        ctx.player = None
+        self.loop.run_until_complete(self.bot.invoke(ctx))
+        return ctx
+
+    def test_rejected_before_conversion(self):
+        convert = unittest.mock.AsyncMock(return_value=None)
+        with unittest.mock.patch.object(SongConverter, "convert", convert):
+            self.invoke("dj;add never gonna give you up")
+            ctx = self.invoke("dj;add never gonna give you up")
+
+        assert convert.await_count == 1
+        assert self.bot.admission.rejected == 1
+        assert "too often" in ctx.send.await_args.args[0]
+
+    def test_failed_checks_are_free(self):
+        guild = types.SimpleNamespace(id=2)
+        for _ in range(3):
+            ctx = self.invoke("dj;now", guild=guild)
+            assert str(PlayerNotFoundError()) in ctx.send.await_args.args[0]
+
+        assert self.bot.admission.buckets == {}
+        assert self.bot.admission.rejected == 0
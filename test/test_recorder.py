@@ -0,0 +1,321 @@
+import asyncio
+import os
+import tempfile
+import types
+import unittest
+
+import rethinkdb
+
+from replay import Replay
+from standins import RethinkDBStandIn
+from utils import recorder
+from utils.cache import SingleFlight
+from utils.playlists import PlaylistCache
+from utils.prefix import PrefixMatcher
+
+BOT_ID = "788392608254787595"
+GUILD_ID = "790000000000000001"
+CHANNEL_ID = "790000000000000002"
+AUTHOR_ID = "790000000000000003"
+
+
+def _user(user_id, username):
+    return {
+        "id": user_id,
+        "username": username,
+        "discriminator": "0001",
+        "avatar": None
+    }
+
+
+class ChangefeedStandIn(RethinkDBStandIn):
+    def __init__(self):
+        super().__init__()
+        self.changes = asyncio.Queue()
+
+    async def _start(self, term, **global_optargs):
+        if isinstance(term, rethinkdb.ast.Changes):
+            return self.feed()
+        return await super()._start(term, **global_optargs)
+
+    async def feed(self):
+        while True:
+            yield await self.changes.get()
+
+
+def _member(user_id, username):
+    return {
+        "user": _user(user_id, username),
+        "roles": [],
+        "joined_at": "2021-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+    }
+
+
+class RecorderTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        handle, self.path = tempfile.mkstemp(suffix=".msgpack")
+        os.close(handle)
+
+    def tearDown(self):
+        recorder.stop()
+        self.loop.close()
+        os.remove(self.path)
+
+    def test_anonymizer(self):
+        anonymizer = recorder.Anonymizer()
+        first = anonymizer({
+            "author": {
+                "id": AUTHOR_ID,
+                "username": "saihnii4"
+            },
+            "content": "dj;show <@!%s>" % AUTHOR_ID,
+            "token": "secret",
+        })
+
+        fake = str(anonymizer.snowflake(int(AUTHOR_ID)))
+        assert first["author"]["id"] == fake
+        assert first["author"]["username"] == "anonymous-0"
+        assert first["content"] == "dj;show <@!%s>" % fake
+        assert first["token"] == "redacted"
+        assert anonymizer(int(AUTHOR_ID)) == int(fake)
+        assert anonymizer(212000) == 212000
+
+    def test_round_trip(self):
+        active = recorder.start(self.path)
+        self.loop.run_until_complete(
+            active.gateway({
+                "op": 0,
+                "t": "READY",
+                "d": {
+                    "user": _user(BOT_ID, "DJDiscord")
+                }
+            }))
+        for content in ("dj;show", "hello there", "<@!%s>" % BOT_ID):
+            self.loop.run_until_complete(
+                active.gateway({
+                    "op": 0,
+                    "t": "MESSAGE_CREATE",
+                    "d": {
+                        "id": "1",
+                        "content": content
+                    }
+                }))
+        self.loop.run_until_complete(
+            active.gateway({
+                "op": 0,
+                "t": "PRESENCE_UPDATE",
+                "d": {}
+            }))
+        self.loop.run_until_complete(
+            recorder.capture("lavalink", "ytsearch:never gonna",
+                             asyncio.sleep(0, {"tracks": []})))
+        recorder.stop()
+
+        header, ready, *messages, lavalink = recorder.read(self.path)
+        assert header.data["version"] == recorder.CAPTURE_VERSION
+        assert ready.key == "READY"
+        assert [message.data["content"] for message in messages] == [
+            "dj;show", "x" * len("hello there"),
+            "<@!%d>" % recorder.FAKE_SNOWFLAKE_BASE
+        ]
+        assert (lavalink.kind, lavalink.key,
+                lavalink.data) == ("lavalink", "ytsearch:never gonna", {
+                    "tracks": []
+                })
+
+    def test_guild_prefixes(self):
+        prefixes = PrefixMatcher("dj;")
+        prefixes.set(790000000000000001, "!")
+        active = recorder.start(self.path, prefixes)
+        for guild_id, content in (("790000000000000001", "!play never gonna"),
+                                  ("790000000000000001", "dj;play"),
+                                  ("790000000000000002", "dj;play"),
+                                  (None, "dj;help")):
+            self.loop.run_until_complete(
+                active.gateway({
+                    "op": 0,
+                    "t": "MESSAGE_CREATE",
+                    "d": {
+                        "id": "1",
+                        "guild_id": guild_id,
+                        "content": content
+                    }
+                }))
+        recorder.stop()
+
+        _, *messages = recorder.read(self.path)
+        assert [message.data["content"] for message in messages] == [
+            "!play never gonna", "x" * len("dj;play"), "dj;play", "dj;help"
+        ]
+
+    def test_recording_rethinkdb(self):
+        standin = RethinkDBStandIn()
+        standin.table("playlists")["a"] = {"id": "a", "author": 1}
+        recorder.start(self.path)
+        connection = recorder.RecordingRethinkDB(standin)
+
+        async def _read():
+            cursor = await rethinkdb.r.table("playlists").filter({
+                "author": 1
+            }).run(connection)
+            return [document async for document in cursor]
+
+        assert self.loop.run_until_complete(_read()) == [{
+            "id": "a",
+            "author": 1
+        }]
+        self.loop.run_until_complete(
+            rethinkdb.r.table("logs").insert({
+                "op": 1
+            }).run(connection))
+        recorder.stop()
+
+        _, read, write = recorder.read(self.path)
+        assert read.key == str(rethinkdb.r.table("playlists").filter(
+            {"author": 1}))
+        assert write.key == "r.table('logs').insert(...)"
+
+    def test_recording_changefeed(self):
+        standin = ChangefeedStandIn()
+        recorder.start(self.path)
+        connection = recorder.RecordingRethinkDB(standin)
+
+        async def _run(query):
+            return await query.run(connection)
+
+        async def _ready():
+            pass
+
+        playlists = PlaylistCache(types.SimpleNamespace(
+            database=types.SimpleNamespace(run=_run),
+            resolutions=SingleFlight(),
+            wait_until_ready=_ready,
+            is_closed=lambda: False,
+            loop=self.loop))
+
+        async def _follow():
+            playlists.start()
+            while not playlists.live:
+                await asyncio.sleep(0)
+            generation = playlists.generation
+            standin.changes.put_nowait({
+                "old_val": None,
+                "new_val": {"id": "a", "author": 1, "cover": None, "songs": []}
+            })
+            while playlists.generation == generation:
+                await asyncio.sleep(0)
+            playlists.stop()
+
+        self.loop.run_until_complete(asyncio.wait_for(_follow(), 1))
+        recorder.stop()
+
+        _, *recorded = recorder.read(self.path)
+        assert recorded == []
+
+
+class ReplayTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        handle, self.path = tempfile.mkstemp(suffix=".msgpack")
+        os.close(handle)
+
+    def tearDown(self):
+        self.loop.close()
+        os.remove(self.path)
+
+    def record(self):
+        active = recorder.start(self.path)
+        dispatches = [
+            ("READY", {
+                "user": _user(BOT_ID, "DJDiscord"),
+                "guilds": []
+            }),
+            ("GUILD_CREATE", {
+                "id": GUILD_ID,
+                "name": "Guild",
+                "owner_id": AUTHOR_ID,
+                "region": "us-east",
+                "roles": [{
+                    "id": GUILD_ID,
+                    "name": "@everyone",
+                    "permissions": 8,
+                    "permissions_new": "8",
+                    "position": 0,
+                    "color": 0,
+                    "hoist": False,
+                    "managed": False,
+                    "mentionable": False,
+                }],
+                "channels": [{
+                    "id": CHANNEL_ID,
+                    "type": 0,
+                    "name": "music",
+                    "position": 0,
+                    "permission_overwrites": [],
+                }],
+                "members": [
+                    _member(BOT_ID, "DJDiscord"),
+                    _member(AUTHOR_ID, "saihnii4")
+                ],
+                "member_count": 2,
+            }),
+            ("MESSAGE_CREATE", {
+                "id": "790000000000000004",
+                "channel_id": CHANNEL_ID,
+                "guild_id": GUILD_ID,
+                "author": _user(AUTHOR_ID, "saihnii4"),
+                "member": {
+                    "roles": [],
+                    "joined_at": "2021-01-01T00:00:00+00:00",
+                    "deaf": False,
+                    "mute": False,
+                },
+                "content": "dj;show",
+                "timestamp": "2021-01-01T00:00:00+00:00",
+                "edited_timestamp": None,
+                "tts": False,
+                "mention_everyone": False,
+                "mentions": [],
+                "mention_roles": [],
+                "attachments": [],
+                "embeds": [],
+                "pinned": False,
+                "type": 0,
+            }),
+        ]
+        for event, data in dispatches:
+            self.loop.run_until_complete(
+                active.gateway({
+                    "op": 0,
+                    "t": event,
+                    "d": data
+                }))
+        active.backend(
+            "rethinkdb",
+            str(rethinkdb.r.table("playlists").filter(
+                {"author": int(AUTHOR_ID)})), [{
+                    "id": "0d3a2c1e-6c39-4c0e-9a4e-2b7d2a4f8f1b",
+                    "author": int(AUTHOR_ID),
+                    "cover": None,
+                    "songs": [],
+                }], 0.001)
+        recorder.stop()
+
+    def test_replay(self):
+        self.record()
+        replay = Replay(self.path, speed=0)
+        try:
+            report = self.loop.run_until_complete(replay.run())
+        finally:
+            self.loop.run_until_complete(replay.teardown())
+
+        print(report)
+        assert report.events == 3
+        assert not report.dropped
+        assert len(report.latencies["show"]) == 1
+        assert not report.failures
+        assert report.peak > 0
+        assert not report.regressions(report)
@@ -0,0 +1,100 @@
+import asyncio
+import datetime
+import types
+import unittest
+
+import rethinkdb
+
+from utils.objects import DocumentEvaluation, LogOpcodes
+from utils.retention import (LogRetention, floor, fold_logs, fold_rollups)
+
+start = datetime.datetime(2021, 1, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+
+def _log(op, seconds, command=None, cpu=10.0, ram=0.5):
+    return {
+        "op": op,
+        "command": command,
+        "logged_at": start + datetime.timedelta(seconds=seconds),
+        "system_info": {
+            "cpu": cpu,
+            "ram": ram
+        },
+    }
+
+
+class RollupTests(unittest.TestCase):
+    def test_floor(self):
+        moment = start + datetime.timedelta(minutes=5, seconds=42)
+
+        assert floor(moment, 60) == start + datetime.timedelta(minutes=5)
+        assert floor(moment, 3600) == start
+
+    def test_fold_logs(self):
+        minute, = fold_logs([
+            _log(LogOpcodes.before_cog_invoke, 1, "play", cpu=10.0),
+            _log(LogOpcodes.after_cog_invoke, 2, "play", cpu=20.0),
+            _log(LogOpcodes.before_cog_invoke, 3, "skip", cpu=30.0),
+            _log(LogOpcodes.error, 4, cpu=40.0),
+        ])
+
+        assert minute["id"] == "minute-%d" % start.timestamp()
+        assert minute["invocations"] == 2
+        assert minute["errors"] == 1
+        assert minute["commands"] == {"play": 1, "skip": 1}
+        assert minute["samples"] == 4
+        assert minute["cpu"] == 25.0
+
+    def test_fold_rollups(self):
+        minutes = fold_logs(
+            [_log(LogOpcodes.before_cog_invoke, 1, "play", cpu=10.0)] + [
+                _log(LogOpcodes.before_cog_invoke, 61, "add", cpu=40.0)
+                for _ in range(3)
+            ])
+        hour, = fold_rollups(minutes, "hour")
+
+        assert len(minutes) == 2
+        assert hour["bucket"] == start
+        assert hour["invocations"] == 4
+        assert hour["commands"] == {"play": 1, "add": 3}
+        # Weighted by samples, not the mean of the two minute averages
+        assert hour["cpu"] == 32.5
+
+
+class DeleteTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.queries = []
+        self.remaining = 1250
+
+        async def run(query):
+            self.queries.append(query)
+            deleted = min(self.remaining, 500)
+            self.remaining -= deleted
+            return DocumentEvaluation.from_dict({
+                "replaced": 0,
+                "inserted": 0,
+                "skipped": 0,
+                "unchanged": 0,
+                "deleted": deleted,
+            })
+
+        self.bot = types.SimpleNamespace(database=types.SimpleNamespace(
+            run=run))
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_batched_delete(self):
+        retention = LogRetention(self.bot, batch_size=500, batch_delay=0)
+        selection = rethinkdb.r.table("logs").between(rethinkdb.r.minval,
+                                                      start,
+                                                      index="logged_at")
+
+        deleted = self.loop.run_until_complete(
+            retention.delete_expired(selection, "logs"))
+
+        assert deleted == 1250
+        assert len(self.queries) == 3
+        assert "limit(500)" in str(self.queries[0])
+        assert "index='logged_at'" in str(self.queries[0])
@@ -0,0 +1,111 @@
+import asyncio
+import types
+import unittest
+
+import lavalink
+
+from utils.objects import TrackMeta
+from utils.snapshot import (PlayerSnapshot, PlayerSnapshotManager,
+                            decode_track, encode_track)
+
+info = {
+    "identifier": "dQw4w9WgXcQ",
+    "isSeekable": True,
+    "author": "RickAstleyVEVO",
+    "length": 212000,
+    "isStream": False,
+    "title": "Rick Astley - Never Gonna Give You Up",
+    "uri": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+}
+
+
+class FakePlayer:
+    def __init__(self):
+        self.guild_id = 1
+        self.channel_id = "2"
+        self.is_connected = True
+        self.current = lavalink.AudioTrack(
+            {"track": "QAAAjQIAJVJpY2sg", "info": info}, 3,
+            meta=TrackMeta(info["title"], info["author"], info["uri"], None,
+                           info["length"], TrackMeta.SONG))
+        self.queue = []
+        self.volume = 100
+        self.equalizer = [0.0] * 15
+        self.repeat = False
+        self.paused = False
+        self.position = 1000
+
+    def fetch(self, key):
+        return 4
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.queries = []
+
+    async def run(self, query):
+        self.queries.append(str(query))
+
+
+class SnapshotTests(unittest.TestCase):
+    def setUp(self):
+        self.player = FakePlayer()
+        self.database = FakeDatabase()
+        self.snapshots = PlayerSnapshotManager(
+            types.SimpleNamespace(
+                database=self.database,
+                lavalink=types.SimpleNamespace(
+                    player_manager=types.SimpleNamespace(
+                        players={1: self.player}))))
+
+    def flush(self):
+        return asyncio.run(self.snapshots.flush())
+
+    def test_position_only_updates(self):
+        assert self.flush() == 1
+        assert "conflict='replace'" in self.database.queries[-1]
+
+        self.player.position = 31000
+        assert self.flush() == 0
+        assert self.database.queries[-1] == (
+            "r.table('player_snapshots').insert([r.expr({'id': 1, "
+            "'position': 31000})], conflict='update')")
+
+        self.player.paused = True
+        self.flush()
+        self.flush()
+        assert len(self.database.queries) == 3
+
+    def test_round_trip(self):
+        snapshot = PlayerSnapshot.from_json(
+            PlayerSnapshot.from_player(self.player).json)
+        track = decode_track(snapshot.queue[0], snapshot.version)
+
+        assert track.track == self.player.current.track
+        assert track.extra["meta"].json == self.player.current.extra[
+            "meta"].json
+
+    def test_version_one(self):
+        document = PlayerSnapshot.from_player(self.player).json
+        del document["version"]
+        for track in document["queue"]:
+            del track["meta"]
+            track["raw_info"] = {
+                "title": info["title"],
+                "uploader": info["author"],
+                "url": info["uri"],
+                "thumbnails": [{"url": "https://i.ytimg.com/vi/dQw4w9WgXcQ/hqdefault.jpg"}],
+            }
+        snapshot = PlayerSnapshot.from_json(document)
+
+        assert snapshot.version == 1
+        meta = decode_track(snapshot.queue[0], snapshot.version).extra["meta"]
+        assert (meta.title, meta.duration) == (info["title"], info["length"])
+        assert meta.thumbnail.endswith("hqdefault.jpg")
+
+        assert encode_track(decode_track(snapshot.queue[0],
+                                         snapshot.version))["meta"] == meta.json
+
+
+if __name__ == "__main__":
+    unittest.main()
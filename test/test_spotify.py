@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+
+from utils.cache import TTLCache
+from utils.spotify import SpotifyMetadata, parse_url
+
+
+MISSING = "m" * 22
+# Well-formed, but Spotify refuses it and every batch it's part of
+REFUSED = "r" * 22
+
+
+def _id(number):
+    return "%022d" % number
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status):
+        self.status = status
+
+    def get_json(self):
+        return {"error": {"status": self.status, "message": "invalid id"}}
+
+
+class FakeTrackEndpoint:
+    def __init__(self) -> None:
+        self.calls = []
+
+    async def get_several(self, track_ids):
+        self.calls.append(track_ids)
+        if REFUSED in track_ids:
+            raise FakeAPIError(400)
+        return {"tracks": [{"id": track_id, "name": track_id} if track_id != MISSING else None
+                           for track_id in track_ids]}
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.track = FakeTrackEndpoint()
+        self.authentications = 0
+
+    async def get_auth_token_with_client_credentials(self) -> None:
+        self.authentications += 1
+
+
+class SpotifyTests(unittest.TestCase):
+    def test_parse_url(self):
+        assert parse_url("https://open.spotify.com/playlist/37i9dQZF1DXcBWIGoYBM5M?si=1") == (
+            "playlist", "37i9dQZF1DXcBWIGoYBM5M")
+        assert parse_url("https://www.youtube.com/watch?v=dQw4w9WgXcQ") is None
+
+    def test_batched_lookups(self):
+        async def _test_batched_lookups() -> None:
+            client = FakeClient()
+            negative = TTLCache(60)
+            spotify = SpotifyMetadata(client, batch_size=50, negative=negative)
+
+            tracks = await asyncio.gather(*(spotify.track(_id(i)) for i in range(60)),
+                                          spotify.track(_id(0)))
+            assert [track["id"] for track in tracks] == [_id(i) for i in range(60)] + [_id(0)]
+            assert [len(call) for call in client.track.calls] == [50, 10]
+
+            await spotify.track(_id(3))
+            assert len(client.track.calls) == 2
+            assert client.authentications == 1
+
+            with self.assertRaises(LookupError):
+                await spotify.track(MISSING)
+            assert ("spotify", MISSING) in negative
+            with self.assertRaises(LookupError):
+                await spotify.track(MISSING)
+            assert len(client.track.calls) == 3
+
+        asyncio.run(_test_batched_lookups())
+
+    def test_bad_ids_fail_alone(self):
+        async def _test_bad_ids_fail_alone() -> None:
+            client = FakeClient()
+            spotify = SpotifyMetadata(client, batch_size=50)
+
+            with self.assertRaises(LookupError):
+                await spotify.track("not-an-id")
+            assert client.track.calls == []
+
+            results = await asyncio.gather(spotify.track(_id(1)),
+                                           spotify.track(REFUSED),
+                                           spotify.track(_id(2)),
+                                           return_exceptions=True)
+            assert [result["id"] for result in (results[0], results[2])] == [_id(1), _id(2)]
+            assert isinstance(results[1], LookupError)
+            # The refused batch, then each of its IDs on its own
+            assert [len(call) for call in client.track.calls] == [3, 1, 1, 1]
+
+        asyncio.run(_test_bad_ids_fail_alone())
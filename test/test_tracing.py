@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+
+from utils.tracing import Tracer, current_trace, detach, span
+
+
+class TracingTests(unittest.TestCase):
+    def setUp(self):
+        self.exported = []
+        self.tracer = Tracer(sample_rate=1.0, exporter=self.exported.append)
+
+    def test_nested_spans(self):
+        async def convert():
+            with span("convert", converter="SongConverter"):
+                await asyncio.sleep(0)
+
+        async def command():
+            with self.tracer.trace("command", command="play"):
+                await convert()
+                with span("rethinkdb.run"):
+                    pass
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(command())
+        finally:
+            loop.close()
+
+        trace, = self.exported
+        root, convert_span, run = trace["spans"]
+        assert root["parent"] is None
+        assert convert_span["parent"] == root["id"]
+        assert convert_span["attributes"] == {"converter": "SongConverter"}
+        assert run["parent"] == root["id"]
+
+    def test_span_outside_trace(self):
+        with span("discord.send") as current:
+            assert current is None
+
+    def test_slow_traces_always_exported(self):
+        self.tracer.sample_rate = 0.0
+        self.tracer.slow_threshold = 0.0
+
+        with self.tracer.trace("command"):
+            pass
+        assert len(self.exported) == 1 and not self.exported[0]["sampled"]
+
+        self.tracer.slow_threshold = 60.0
+        with self.tracer.trace("command"):
+            pass
+        assert len(self.exported) == 1
+        assert self.tracer.traces == 2 and self.tracer.slow == 1
+
+    def test_errors_recorded(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.trace("command"):
+                with span("lavalink.loadtracks"):
+                    raise ValueError("boom")
+
+        assert self.exported[0]["spans"][1]["error"] == "ValueError: boom"
+
+    def test_detached_tasks(self):
+        async def background():
+            await asyncio.sleep(0.01)
+            with span("prefetch"):
+                return current_trace()
+
+        async def command():
+            with self.tracer.trace("command"):
+                task = detach(asyncio.get_running_loop(), background())
+                assert current_trace() is not None
+            return await task
+
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(command()) is None
+        finally:
+            loop.close()
+
+        trace, = self.exported
+        assert len(trace["spans"]) == 1
@@ -0,0 +1,89 @@
+import datetime
+import time
+import unittest
+
+import msgpack
+
+from utils import transfer
+from utils.exceptions import PlaylistFormatError
+from utils.objects import Playlist
+
+
+def _song(number):
+    return {
+        "source": "https://r4---sn-vgqsknes.googlevideo.com/videoplayback?id=%d" % number,
+        "url": "https://www.youtube.com/watch?v=%011d" % number,
+        "uploader": "RickAstleyVEVO",
+        "title": "Song %d" % number,
+        "thumbnails": [{"url": "https://i.ytimg.com/vi/%d/hqdefault.jpg" % number}],
+        "created": datetime.datetime(2009, 10, 25, tzinfo=datetime.timezone.utc),
+        "length": 212,
+    }
+
+
+playlist = Playlist.from_json({
+    "id": "0d3a2c1e-6c39-4c0e-9a4e-2b7d2a4f8f1b",
+    "songs": [_song(number) for number in range(1000)],
+    "author": 788392608254787595,
+    "cover": None,
+})
+
+
+class TransferTests(unittest.TestCase):
+    def test_round_trip(self):
+        started = time.perf_counter()
+        data = transfer.dump(playlist)
+
+        decoder = transfer.PlaylistDecoder()
+        # Chunks that split songs in the middle, like a download would
+        for offset in range(0, len(data), 1000):
+            decoder.feed(data[offset:offset + 1000])
+        songs = decoder.close()
+        print("1000 songs in %d bytes, %.1fms" %
+              (len(data), (time.perf_counter() - started) * 1000))
+
+        assert songs == playlist.songs.json
+        assert decoder.header["songs"] == 1000
+        assert len(data) < len(msgpack.packb(playlist.songs.json, datetime=True))
+
+    def test_incomplete(self):
+        data = transfer.dump(playlist)
+        decoder = transfer.PlaylistDecoder()
+        decoder.feed(data[:len(data) // 2])
+
+        with self.assertRaises(PlaylistFormatError):
+            decoder.close()
+
+    def test_rejects(self):
+        for data in (msgpack.packb({"format": "something else"}),
+                     msgpack.packb({"format": transfer.EXPORT_FORMAT,
+                                    "version": 99}),
+                     b"\xc1" * 16):
+            with self.assertRaises(PlaylistFormatError):
+                transfer.PlaylistDecoder().feed(data)
+
+        with self.assertRaises(PlaylistFormatError):
+            transfer.PlaylistDecoder(max_size=100).feed(transfer.dump(playlist))
+
+    def test_rejects_bad_headers(self):
+        for songs in (None, "1", -1, True, 1.5):
+            header = {"format": transfer.EXPORT_FORMAT,
+                      "version": transfer.EXPORT_VERSION,
+                      "songs": songs}
+            if songs is None:
+                del header["songs"]
+            with self.assertRaises(PlaylistFormatError):
+                transfer.PlaylistDecoder().feed(msgpack.packb(header))
+
+    def test_rejects_bad_fields(self):
+        header = msgpack.packb({"format": transfer.EXPORT_FORMAT,
+                                "version": transfer.EXPORT_VERSION,
+                                "songs": 1})
+        for field, value in (("url", ["https://www.youtube.com"]),
+                             ("title", 42), ("length", "212"),
+                             ("length", True)):
+            song = dict(_song(1), **{field: value})
+            data = header + msgpack.packb(
+                [song[name] for name in transfer.SONG_FIELDS], datetime=True)
+            with self.assertRaises(PlaylistFormatError):
+                transfer.PlaylistDecoder().feed(data)
@@ -0,0 +1,40 @@
+import asyncio
+import time
+import unittest
+
+from utils.watchdog import LoopWatchdog
+
+
+def render_progress_bar():
+    time.sleep(0.3)
+
+
+class WatchdogTests(unittest.TestCase):
+    def test_captures_blocking_stack(self):
+        loop = asyncio.new_event_loop()
+        watchdog = LoopWatchdog(loop, threshold=0.1, interval=0.02)
+
+        async def command():
+            watchdog.track("now")
+            try:
+                render_progress_bar()
+            finally:
+                watchdog.untrack()
+            await asyncio.sleep(0.1)
+
+        async def main():
+            watchdog.start()
+            await asyncio.sleep(0.05)
+            await command()
+            watchdog.stop()
+
+        try:
+            loop.run_until_complete(main())
+        finally:
+            loop.close()
+
+        stall, = watchdog.stalls
+        assert stall.command == "now"
+        assert stall.duration >= 0.1
+        assert "render_progress_bar" in "".join(stall.stack)
+        assert not watchdog.commands
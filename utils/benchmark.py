@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import json
+import math
+import os
+import platform
+import statistics
+import time
+import typing
+
+# Rounds are sized so each one takes at least this long, like timeit's autorange
+MIN_ROUND_TIME = 0.002
+
+
+@dataclasses.dataclass
+class Result:
+    """Result -> Per-call timings, in seconds, of one benchmark round after another"""
+    name: str
+    samples: typing.List[float]
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.samples)
+
+    @property
+    def mean(self) -> float:
+        return statistics.mean(self.samples)
+
+    @property
+    def stdev(self) -> float:
+        return statistics.stdev(self.samples) if len(self.samples) > 1 else 0.0
+
+    def __str__(self) -> str:
+        return "%s: %.3fus median, %.3fus mean +- %.3fus (%d rounds)" % (
+            self.name, self.median * 1e6, self.mean * 1e6, self.stdev * 1e6,
+            len(self.samples))
+
+
+@dataclasses.dataclass
+class Regression:
+    name: str
+    baseline: float
+    current: float
+    p_value: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline
+
+    def __str__(self) -> str:
+        return "%s regressed %.1f%% (%.3fus -> %.3fus, p=%.4f)" % (
+            self.name, (self.ratio - 1) * 100, self.baseline * 1e6,
+            self.current * 1e6, self.p_value)
+
+
+def _calibrate(batch: typing.Callable[[int], float]) -> int:
+    number = 1
+    while True:
+        if batch(number) >= MIN_ROUND_TIME or number >= 1 << 20:
+            return number
+        number *= 2
+
+
+def measure(name: str,
+            function: typing.Callable,
+            *args,
+            rounds: int = 30,
+            warmup: int = 3,
+            **kwargs) -> Result:
+    """measure -> Time `function(*args, **kwargs)` over `rounds` rounds of many calls each"""
+    def batch(number: int) -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            function(*args, **kwargs)
+        return time.perf_counter() - start
+
+    number = _calibrate(batch)
+    for _ in range(warmup):
+        batch(number)
+    return Result(name, [batch(number) / number for _ in range(rounds)])
+
+
+def measure_async(name: str,
+                  function: typing.Callable[..., typing.Awaitable],
+                  *args,
+                  rounds: int = 30,
+                  warmup: int = 3,
+                  loop_factory: typing.Callable[
+                      [], asyncio.AbstractEventLoop] = asyncio.new_event_loop,
+                  teardown: typing.Optional[typing.Callable[
+                      [], typing.Awaitable]] = None,
+                  **kwargs) -> Result:
+    """measure_async -> Like `measure`, awaiting `function` on a private event loop made by `loop_factory`
+
+    Every call is awaited inside one coroutine per round so loop start-up isn't counted,
+    `teardown` is awaited on the same loop before it's closed"""
+    loop = loop_factory()
+
+    async def _batch(number: int) -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            await function(*args, **kwargs)
+        return time.perf_counter() - start
+
+    def batch(number: int) -> float:
+        return loop.run_until_complete(_batch(number))
+
+    try:
+        number = _calibrate(batch)
+        for _ in range(warmup):
+            batch(number)
+        return Result(name, [batch(number) / number for _ in range(rounds)])
+    finally:
+        if teardown is not None:
+            loop.run_until_complete(teardown())
+        loop.close()
+
+
+def mann_whitney_u(baseline: typing.Sequence[float],
+                   current: typing.Sequence[float]) -> float:
+    """mann_whitney_u -> One-sided p-value that `current` tends to be larger than `baseline`
+
+    Uses the normal approximation with a tie correction, fine for the 20+ rounds we take"""
+    ranked = sorted([(value, 0) for value in baseline] +
+                    [(value, 1) for value in current])
+    ranks = [0.0] * len(ranked)
+    ties = 0.0
+    index = 0
+    while index < len(ranked):
+        end = index
+        while end + 1 < len(ranked) and ranked[end + 1][0] == ranked[index][0]:
+            end += 1
+        for tied in range(index, end + 1):
+            ranks[tied] = (index + end) / 2 + 1
+        count = end - index + 1
+        ties += count**3 - count
+        index = end + 1
+
+    n1, n2 = len(baseline), len(current)
+    n = n1 + n2
+    u = sum(rank for rank, (_, group) in zip(ranks, ranked)
+            if group == 1) - n2 * (n2 + 1) / 2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def machine() -> str:
+    """machine -> Key baselines are stored under, timings from another kind of machine mean nothing
+
+    The host name is left out so a baseline recorded on one CI runner applies to the next"""
+    return "%s-%s-py%s" % (platform.system(), platform.machine(), ".".join(
+        platform.python_version_tuple()[:2]))
+
+
+class Baselines:
+    """Baselines -> Stored benchmark samples, per kind of machine, to compare new runs against
+
+    A benchmark is a regression when it is both statistically slower (one-sided Mann-Whitney U
+    below `alpha`) and slower by more than `tolerance` at the median. Nothing is compared without
+    a baseline file, and samples are only ever written to it when `update` is set"""
+    def __init__(self,
+                 path: typing.Optional[str],
+                 tolerance: float = 0.25,
+                 alpha: float = 0.01,
+                 update: typing.Optional[bool] = None) -> None:
+        self.path = path
+        self.tolerance = tolerance
+        self.alpha = alpha
+        self.update = (os.environ.get("BENCHMARK_UPDATE") == "1"
+                       if update is None else update)
+        self.machine = machine()
+        self.data: typing.Dict[str, typing.Dict[str, typing.List[float]]] = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as file:
+                self.data = json.load(file)
+
+    def check(self, result: Result) -> typing.Optional[Regression]:
+        """check -> Compare against the stored baseline, or record `result` as the baseline when updating"""
+        stored = self.data.setdefault(self.machine, {})
+        if self.update:
+            stored[result.name] = result.samples
+            self.save()
+            return None
+
+        baseline = stored.get(result.name)
+        if baseline is None:
+            return None
+
+        p_value = mann_whitney_u(baseline, result.samples)
+        median = statistics.median(baseline)
+        if p_value < self.alpha and result.median > median * (1 + self.tolerance):
+            return Regression(result.name, median, result.median, p_value)
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with open(self.path, "w") as file:
+            json.dump(self.data, file, indent=2, sort_keys=True)
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import http.client
+import time
+import typing
+import urllib.error
+
+import aiohttp
+
+from utils.exceptions import CircuitOpenError
+
+
+class CircuitBreaker:
+    """CircuitBreaker -> Fails fast once a source keeps failing, then lets probes through to test recovery
+
+    closed: calls go through, `failure_threshold` consecutive failures open the circuit
+    open: calls raise CircuitOpenError until `reset_timeout` seconds have passed
+    half-open: up to `probes` calls go through, a success closes the circuit and a failure reopens it
+
+    Errors `is_failure` rejects are re-raised without counting against the source, it answered after all"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self,
+                 name: str,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 30.0,
+                 timeout: typing.Optional[float] = None,
+                 probes: int = 1,
+                 is_failure: typing.Callable[[Exception], bool] = lambda error: True,
+                 clock: typing.Callable[[], float] = time.monotonic) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timeout = timeout
+        self.probes = probes
+        self.is_failure = is_failure
+        self.clock = clock
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = 0
+        self._state = self.CLOSED
+
+    @property
+    def state(self) -> str:
+        if (self._state == self.OPEN
+                and self.clock() - self._opened_at >= self.reset_timeout):
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def _acquire(self) -> bool:
+        state = self.state
+        if state == self.OPEN or (state == self.HALF_OPEN
+                                  and self._probing >= self.probes):
+            self.rejected += 1
+            raise CircuitOpenError(
+                self.name,
+                max(self.reset_timeout - (self.clock() - self._opened_at),
+                    0))
+
+        if state == self.HALF_OPEN:
+            self._probing += 1
+            return True
+        return False
+
+    def _record(self, success: bool, probe: bool) -> None:
+        if probe:
+            self._probing -= 1
+
+        if success:
+            self._consecutive = 0
+            self._state = self.CLOSED
+            return
+
+        self.failures += 1
+        self._consecutive += 1
+        if probe or self._consecutive >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self.opened += 1
+            self._state = self.OPEN
+            self._opened_at = self.clock()
+
+    async def call(self, function: typing.Callable[..., typing.Awaitable],
+                   *args, **kwargs):
+        """**`[coroutine]`** call -> Await `function(*args, **kwargs)` through the breaker"""
+        probe = self._acquire()
+        try:
+            if self.timeout is None:
+                result = await function(*args, **kwargs)
+            else:
+                result = await asyncio.wait_for(function(*args, **kwargs),
+                                                self.timeout)
+        except asyncio.CancelledError:
+            if probe:
+                self._probing -= 1
+            raise
+        except Exception as error:
+            self._record(not self.is_failure(error), probe)
+            raise
+
+        self._record(True, probe)
+        return result
+
+
+def http_status(error: BaseException) -> typing.Optional[int]:
+    """http_status -> The HTTP status a urllib, aiohttp or Spotify API error was raised for, if any"""
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status
+
+    get_json = getattr(error, "get_json", None)
+    if get_json is not None:
+        status = ((get_json() or {}).get("error") or {}).get("status")
+        if isinstance(status, int):
+            return status
+    # async_spotify's RateLimitExceeded only carries the Retry-After header
+    if getattr(error, "retry_after", None) is not None:
+        return 429
+    return None
+
+
+def transport_failure(error: BaseException) -> bool:
+    """transport_failure -> Whether an error means the source couldn't be reached, rather than it refusing one query
+
+    youtube_dl wraps the network error it hit in an ExtractorError's `cause`, inside a DownloadError's `exc_info`"""
+    exc_info = getattr(error, "exc_info", None)
+    if exc_info:
+        error = exc_info[1]
+    error = getattr(error, "cause", None) or error
+
+    status = http_status(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (asyncio.TimeoutError, OSError,
+                              http.client.HTTPException,
+                              aiohttp.ClientConnectionError))
+
+
+def default_breakers(**kwargs) -> typing.Dict[str, CircuitBreaker]:
+    return {
+        "youtube": CircuitBreaker("YouTube",
+                                  timeout=30.0,
+                                  is_failure=transport_failure,
+                                  **kwargs),
+        "soundcloud": CircuitBreaker("SoundCloud",
+                                     timeout=30.0,
+                                     is_failure=transport_failure,
+                                     **kwargs),
+        "spotify": CircuitBreaker("Spotify",
+                                  timeout=15.0,
+                                  is_failure=transport_failure,
+                                  **kwargs),
+        "lavalink": CircuitBreaker("Lavalink",
+                                   timeout=10.0,
+                                   is_failure=transport_failure,
+                                   **kwargs),
+    }
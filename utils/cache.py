@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import time
+import typing
+
+_missing = object()
+
+
+class TTLCache:
+    """TTLCache -> Bounded mapping whose entries expire after `ttl` seconds"""
+    def __init__(self,
+                 ttl: float,
+                 maxsize: int = 1024,
+                 clock: typing.Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._data: collections.OrderedDict = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _missing) is not _missing
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires, value = entry
+        if expires <= self.clock():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: typing.Optional[float] = None) -> None:
+        self._data.pop(key, None)
+        self._data[key] = (self.clock() + (self.ttl if ttl is None else ttl),
+                           value)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LRUCache:
+    """LRUCache -> Mapping that evicts its least recently used entries once their total weight passes `maxweight`
+
+    `weigher` gives an entry's weight, one per entry by default. `on_evict` is called with the key
+    and value of every entry evicted to make room, not with entries that are popped"""
+    def __init__(self,
+                 maxweight: int = 1024,
+                 weigher: typing.Callable[[typing.Any], int] = lambda _: 1,
+                 on_evict: typing.Optional[typing.Callable[
+                     [typing.Any, typing.Any], None]] = None) -> None:
+        self.maxweight = maxweight
+        self.weigher = weigher
+        self.on_evict = on_evict
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: collections.OrderedDict = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value) -> None:
+        self.pop(key)
+        weight = self.weigher(value)
+        self._data[key] = (weight, value)
+        self.weight += weight
+        # The newest entry stays even when it's heavier than the whole cache
+        while self.weight > self.maxweight and len(self._data) > 1:
+            evicted, (weight, value) = self._data.popitem(last=False)
+            self.weight -= weight
+            if self.on_evict is not None:
+                self.on_evict(evicted, value)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return default
+        self.weight -= entry[0]
+        return entry[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.weight = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class SingleFlight:
+    """SingleFlight -> Shares one in-flight call between concurrent callers asking for the same key
+
+    Keys are `(namespace, key)` tuples, call and dedup counts are kept per namespace"""
+    def __init__(self) -> None:
+        self.calls: typing.Dict[str, int] = collections.Counter()
+        self.deduplicated: typing.Dict[str, int] = collections.Counter()
+        self._flights: typing.Dict[typing.Tuple[str, typing.Hashable],
+                                   asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, namespace: str, key: typing.Hashable,
+                 function: typing.Callable[..., typing.Awaitable], *args,
+                 **kwargs):
+        """**`[coroutine]`** do -> Await `function(*args, **kwargs)`, or the identical call that is already running"""
+        self.calls[namespace] += 1
+
+        flight = self._flights.get((namespace, key))
+        if flight is not None:
+            self.deduplicated[namespace] += 1
+        else:
+            flight = asyncio.ensure_future(function(*args, **kwargs))
+            self._flights[namespace, key] = flight
+            flight.add_done_callback(
+                lambda _: self._flights.pop((namespace, key), None))
+
+        # Shielded so one caller giving up doesn't cancel everybody else's result
+        return await asyncio.shield(flight)
@@ -1,8 +1,10 @@
+import asyncio
 import datetime
+import functools
 import re
 import textwrap
 import typing
-from urllib.parse import urlparse
+from urllib.parse import parse_qs, urlparse
 from utils.exceptions import OutOfBoundVolumeError, VolumeTypeError, PlaylistGivenError
 
 import dateutil.relativedelta
@@ -10,13 +12,16 @@ import discord
 import discord.ext.commands
 import discord.ext.menus
 import discord_argparse
-import rethinkdb
 import youtube_dl
 
+from utils import metrics
+from utils import recorder
+from utils import tracing
+from utils.breaker import transport_failure
+from utils.exceptions import CircuitOpenError
 from utils.objects import Playlist
 from utils.objects import Song
 from utils.objects import Station
-from utils.objects import song_emoji_conversion
 from utils.objects import ydl_opts
 from utils.extensions import DJDiscordContext
 
@@ -28,10 +33,30 @@ ArgumentConverter = discord_argparse.ArgumentConverter(
     announcement=discord_argparse.OptionalArgument(
         discord.TextChannel,
         doc="Announcement channel ID for DJ Discord announcments",
-        default=None))
+        default=None),
+    prefix=discord_argparse.OptionalArgument(
+        str, doc="Command prefix for this server", default=None))
+
+
+class InstrumentedConverter(discord.ext.commands.Converter):
+    """InstrumentedConverter [discord.ext.commands.Converter] -> Converter that records how long `convert` takes"""
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        convert = cls.__dict__.get("convert")
+        if convert is None:
+            return
 
+        @functools.wraps(convert)
+        async def _convert(self, ctx: DJDiscordContext, argument: str):
+            with metrics.converter_duration.time(
+                    converter=cls.__name__), tracing.span("convert",
+                                                          converter=cls.__name__):
+                return await convert(self, ctx, argument)
 
-class IndexConverter(discord.ext.commands.Converter):
+        cls.convert = _convert
+
+
+class IndexConverter(InstrumentedConverter):
     async def convert(self, ctx: DJDiscordContext, argument: str):
         try:
             argument = int(argument)
@@ -44,7 +69,7 @@ class IndexConverter(discord.ext.commands.Converter):
         return argument
 
 
-class VolumeConverter(discord.ext.commands.Converter):
+class VolumeConverter(InstrumentedConverter):
     async def convert(self, ctx: DJDiscordContext, argument: str):
         if not argument.isdigit() and not isinstance(argument, int):
             raise VolumeTypeError(int, type(argument))
@@ -57,7 +82,7 @@ class VolumeConverter(discord.ext.commands.Converter):
         return int(argument)
 
 
-class StationConverter(discord.ext.commands.Converter):
+class StationConverter(InstrumentedConverter):
     async def convert(self, ctx: DJDiscordContext,
                       argument: str) -> typing.Optional[Station]:
         if len(argument) == 4 and re.compile(
@@ -73,33 +98,133 @@ class StationConverter(discord.ext.commands.Converter):
                 return Station.from_json(raw[0])
 
 
-class PlaylistConverter(discord.ext.commands.Converter):
-    async def convert(self, ctx: DJDiscordContext, argument: str) -> Playlist:
+PLAYLIST_ID = re.compile(
+    "^[0-9a-f]{8}-[0-9a-f]{4}-[0-5][0-9a-f]{3}-[089ab][0-9a-f]{3}-[0-9a-f]{12}$")
+USER_ID = re.compile(r"^(?:<@!?)?([0-9]{15,20})>?$")
+
+
+class PlaylistConverter(InstrumentedConverter):
+    async def convert(self, ctx: DJDiscordContext,
+                      argument: str) -> typing.Optional[Playlist]:
+        # Raw IDs and mentions, the caller's own ID included, never need a member lookup
+        if (match := USER_ID.match(argument)) is not None:
+            return await ctx.bot.playlists.by_author(int(match.group(1)))
+
+        if PLAYLIST_ID.match(argument) is not None:
+            return await ctx.bot.playlists.by_id(argument)
+
         try:
             author = await discord.ext.commands.MemberConverter().convert(
                 ctx, argument)
-            playlist = (await ctx.database.get(author=author.id))[0]
-            return Playlist.from_json(playlist)
-        except Exception as exc:
-            if isinstance(exc,
-                          discord.ext.commands.MemberNotFound) or isinstance(
-                              exc, IndexError):
-                return
-
-        if (re.compile(
-                "^[0-9a-f]{8}-[0-9a-f]{4}-[0-5][0-9a-f]{3}-[089ab][0-9a-f]{3}-[0-9a-f]{12}$"
-        ).match(argument) is not None):
-            playlist = (await ctx.database.run(
-                rethinkdb.r.table("playlists").get(argument)))
-            return Playlist(playlist["id"], playlist["songs"],
-                            playlist["author"], playlist["cover"])
-
-        slot = (await ctx.database.get(name=argument))[0]
-        return Playlist(slot["id"], slot["songs"], slot["author"],
-                        slot["cover"])
-
-
-class SongConverter(discord.ext.commands.Converter):
+        except discord.ext.commands.MemberNotFound:
+            return await ctx.bot.playlists.by_name(argument)
+        return await ctx.bot.playlists.by_author(author.id)
+
+
+def _song_from_info(data: dict,
+                    track: typing.Optional[dict] = None) -> Song:
+    if "entries" in data:
+        data = data["entries"][0]
+
+    created = datetime.datetime.strptime(
+        data["upload_date"], "%Y%m%d").astimezone().strftime("%Y-%m-%d")
+
+    if track is not None:
+        return Song(data["formats"][0]["url"], data["webpage_url"],
+                    ", ".join(artist["name"] for artist in track["artists"]),
+                    track["name"], data["thumbnails"], created,
+                    track["duration_ms"] // 1000)
+
+    return Song(data["formats"][0]["url"], data["webpage_url"],
+                data["uploader"], data["title"], data["thumbnails"], created,
+                data["duration"])
+
+
+def _extract_info(target: str) -> typing.Optional[dict]:
+    with youtube_dl.YoutubeDL(ydl_opts) as ytdl:
+        data = ytdl.extract_info(target, download=False)
+
+    if not data or ("entries" in data and not data.get("entries")):
+        return None
+    return data
+
+
+# youtube_dl search targets, `ytsearch:`, `scsearch5:`, `ytsearchall:` and so on
+SEARCH_PREFIX = re.compile(r"^(\w*search(?:\d+|all|date)?):(.*)$", re.I | re.S)
+
+
+def normalize_query(target: str) -> str:
+    target = target.strip()
+    search = SEARCH_PREFIX.match(target)
+    if search is not None:
+        # The prefix picks the site, `ytsearch:` and `scsearch:` finding the same words aren't the same query
+        return "%s:%s" % (search.group(1).casefold(), " ".join(
+            search.group(2).casefold().split()))
+
+    url = urlparse(target)
+    if not url.scheme:
+        return " ".join(target.casefold().split())
+
+    query = parse_qs(url.query)
+    if url.netloc in ("www.youtube.com", "youtube.com", "m.youtube.com"):
+        if "v" not in query:
+            # Playlists and channels are told apart by their query, keep all of it
+            return target
+        return "youtube:%s" % query["v"][0]
+    if url.netloc == "youtu.be":
+        return "youtube:%s" % url.path.lstrip("/")
+
+    # Tracking parameters like Spotify's `si` would split otherwise identical links
+    return "%s%s" % (url.netloc.lower(), url.path.rstrip("/"))
+
+
+async def _resolve_song(loop: asyncio.AbstractEventLoop, target: str,
+                        track: typing.Optional[dict]) -> typing.Optional[Song]:
+    data = await recorder.capture(
+        "extract", target, loop.run_in_executor(None, _extract_info, target))
+    if data is None:
+        return None
+
+    return _song_from_info(data, track)
+
+
+async def resolve_song(bot: discord.ext.commands.Bot,
+                       target: str,
+                       track: typing.Optional[dict] = None
+                       ) -> typing.Optional[Song]:
+    """**`[coroutine]`** resolve_song -> Run a youtube_dl extraction off the event loop and build a Song from it
+
+    Identical extractions that are already running are awaited instead of started again,
+    queries that recently found nothing or failed to extract return None straight away.
+    Only errors reaching the source are raised, those also count against its breaker"""
+    key = (track or {}).get("id") or normalize_query(target)
+    if ("youtube_dl", key) in bot.negative:
+        return None
+
+    source = "soundcloud" if urlparse(
+        target).netloc == "soundcloud.com" else "youtube"
+    try:
+        song = await bot.resolutions.do("youtube_dl", key,
+                                        bot.breakers[source].call,
+                                        _resolve_song, bot.loop, target, track)
+    except CircuitOpenError:
+        raise
+    except Exception as error:
+        if transport_failure(error):
+            raise
+        # Private, removed or malformed videos, nothing to do with the source being up
+        song = None
+    if song is None:
+        bot.negative.set(("youtube_dl", key), True)
+    return song
+
+
+def spotify_search(track: dict) -> str:
+    return "ytsearch:%s %s" % (track["name"], " ".join(
+        artist["name"] for artist in track["artists"][:1]))
+
+
+class SongConverter(InstrumentedConverter):
     async def convert(self, ctx: DJDiscordContext, argument: str) -> Song:
         target = "ytsearch:%s" % argument
 
@@ -108,62 +233,24 @@ class SongConverter(discord.ext.commands.Converter):
             target = argument
         elif urlparse(argument).netloc == "open.spotify.com":
             playlist_regex = re.compile(
-                r"^(https:\/\/open.spotify.com\/playlist\/)([a-zA-Z0-9]+)(.*?)"
+                r"^(https:\/\/open.spotify.com\/(playlist|album)\/)([a-zA-Z0-9]+)(.*?)"
             )
             song_regex = re.compile(
                 r"^(https:\/\/open.spotify.com\/track\/)([a-zA-Z0-9]+)(.*?)")
             if playlist_regex.match(argument) is not None:
                 raise PlaylistGivenError
             elif song_regex.match(argument) is not None:
-                track = await ctx.spotify.track.get_one(
-                    argument.split("track/")[-1])
-                with youtube_dl.YoutubeDL(ydl_opts) as ytdl:
-                    if data := ytdl.extract_info("ytsearch:%s" % track["name"],
-                                                 download=False):
-                        print(data)
-                        return Song(
-                            data["entries"][0]["formats"][0]["url"],
-                            data["entries"][0]["webpage_url"],
-                            ", ".join(artist["name"]
-                                      for artist in track["artists"]),
-                            track["name"], data["entries"][0]["thumbnails"],
-                            datetime.datetime.strptime(
-                                data["entries"][0]["upload_date"],
-                                "%Y%m%d").astimezone().strftime("%Y-%m-%d"),
-                            track["duration_ms"])
-
-        with youtube_dl.YoutubeDL(ydl_opts) as ytdl:
-            if data := ytdl.extract_info(target, download=False):
-                if "entries" in data and data.get("entries"):
-                    return Song(
-                        data["entries"][0]["formats"][0]["url"],
-                        data["entries"][0]["webpage_url"],
-                        data["entries"][0]["uploader"],
-                        data["entries"][0]["title"],
-                        data["entries"][0]["thumbnails"],
-                        datetime.datetime.strptime(
-                            data["entries"][0]["upload_date"],
-                            "%Y%m%d").astimezone().strftime("%Y-%m-%d"),
-                        data["entries"][0]["duration"])
-
-                return Song(
-                    data["formats"][0]["url"],
-                    data["webpage_url"],
-                    data["uploader"],
-                    data["title"],
-                    data["thumbnails"],
-                    datetime.datetime.strptime(
-                        data["upload_date"],
-                        "%Y%m%d").astimezone().strftime("%Y-%m-%d"),
-                    data["duration"],
-                )
-
-            return None
+                track = await ctx.spotify.track(
+                    song_regex.match(argument).group(2))
+                return await resolve_song(ctx.bot, spotify_search(track),
+                                          track)
+
+        return await resolve_song(ctx.bot, target)
 
 
 class PlaylistPaginator(discord.ext.menus.ListPageSource):
     def __init__(self,
-                 entries: typing.List[str],
+                 entries: typing.Sequence[Song],
                  *,
                  playlist: Playlist,
                  ctx: DJDiscordContext,
@@ -173,7 +260,7 @@ class PlaylistPaginator(discord.ext.menus.ListPageSource):
         self.playlist = playlist
         self.author = ctx.author
 
-    async def format_page(self, menu, page: typing.List[str]) -> discord.Embed:
+    async def format_page(self, menu, page: typing.List[Song]) -> discord.Embed:
         offset = menu.current_page * self.per_page
 
         template = self.templates.playlistPaginator.copy()
@@ -190,8 +277,7 @@ class PlaylistPaginator(discord.ext.menus.ListPageSource):
 
         for index, song in enumerate(page, start=offset):
             template.add_field(
-                name="%s `{}.` {}".format(index + 1, song["title"]) %
-                song_emoji_conversion[urlparse(song["url"]).netloc],
+                name="%s `{}.` {}".format(index + 1, song.title) % song.emoji,
                 value="Created: `{0[created]}`\n"
                 "Duration: `{0[length]}` seconds, Author: `{0[uploader]}`".
                 format(song),
@@ -200,7 +286,7 @@ class PlaylistPaginator(discord.ext.menus.ListPageSource):
         return template
 
 
-class TrackPositionConverter(discord.ext.commands.Converter):
+class TrackPositionConverter(InstrumentedConverter):
     async def convert(self, ctx: discord.ext.commands.Context,
                       argument: str) -> float:
         regex = re.compile(r"(?:(?P<years>\d)y)?"
@@ -228,7 +314,7 @@ class TrackPositionConverter(discord.ext.commands.Converter):
             return
 
 
-class NameValidator(discord.ext.commands.Converter):
+class NameValidator(InstrumentedConverter):
     async def convert(
         self: discord.ext.commands.Converter,
         _: DJDiscordContext,
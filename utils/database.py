@@ -1,4 +1,3 @@
-import traceback
 import typing
 import uuid
 
@@ -8,6 +7,9 @@ import rethinkdb
 import rethinkdb.ast
 import rethinkdb.net
 
+from utils import errors
+from utils import metrics
+from utils import tracing
 from utils.objects import AfterCogInvokeOp
 from utils.objects import AfterCommandInvoke
 from utils.objects import BeforeCogInvokeOp
@@ -28,7 +30,10 @@ class DJDiscordDatabaseManager:
         self, query
     ) -> typing.Union[TableEvaluation, DatabaseEvaluation, DocumentEvaluation,
                       dict, list]:
-        result = await query.run(self.rdbconn)
+        with metrics.database_duration.time(
+                backend="rethinkdb"), tracing.span("rethinkdb.run",
+                                                   query=type(query).__name__):
+            result = await query.run(self.rdbconn)
 
         if isinstance(query,
                       (rethinkdb.ast.TableCreate, rethinkdb.ast.TableDrop)):
@@ -44,7 +49,10 @@ class DJDiscordDatabaseManager:
         return result
 
     async def _psql_execute(self, query, *args, **kwargs) -> str:
-        return await self.psqlconn.execute(query, *args, **kwargs)
+        with metrics.database_duration.time(
+                backend="postgresql"), tracing.span("postgresql.execute",
+                                                    query=query):
+            return await self.psqlconn.execute(query, *args, **kwargs)
 
     async def run(self, query, *args, **kwargs):
         if isinstance(query, str):
@@ -63,6 +71,7 @@ class DJDiscordDatabaseManager:
         memory_sample = psutil.virtual_memory()
         payload = {
             "op": int(op),
+            "command": getattr(getattr(op, "command", None), "name", None),
             "info": info,
             "logged_at": rethinkdb.r.now(),
             "system_info": {
@@ -72,28 +81,47 @@ class DJDiscordDatabaseManager:
             }
         }
 
+        if case_id is not None:
+            payload.update({"case_id": case_id.hex})
+
         if error := getattr(error, "original", error):
             if isinstance(error, str):
                 payload.update({"error": error})
-
-            payload.update({
-                "error":
-                "".join(
-                    traceback.TracebackException.from_exception(
-                        error).format()).strip()
-            })
-
-        if case_id is not None:
-            payload.update({"case_id": case_id.hex})
+            else:
+                # The traceback itself is stored once per fingerprint, not per case
+                payload.update({
+                    "fingerprint":
+                    await self.record_error(
+                        error, case_id.hex if case_id is not None else None)
+                })
 
         return await self.run(
             rethinkdb.r.db("djdiscord").table("logs").insert(payload))
 
+    async def record_error(self,
+                           error: BaseException,
+                           case_id: typing.Optional[str] = None) -> str:
+        """**`[coroutine]`** record_error -> Count an occurrence of `error` under its fingerprint, returning the fingerprint"""
+        digest = errors.fingerprint(error)
+        await self.run(errors.upsert(digest, error, case_id))
+        return digest
+
+    async def case(self, case_id: str) -> typing.Optional[dict]:
+        """**`[coroutine]`** case -> The deduplicated error a case ID was filed under"""
+        found = [
+            error async for error in await self.run(errors.case(case_id))
+        ]
+        return found[0] if found else None
+
     async def get(self, **kwargs) -> list:
         """**`[coroutine]`** get -> Fetch accounts that fit a keyword argument"""
 
-        return [
-            obj async for obj in await rethinkdb.r.table(
-                kwargs.pop("table", "playlists")).filter(kwargs).run(
-                    self.rdbconn)
-        ]
+        with metrics.database_duration.time(
+                backend="rethinkdb"), tracing.span("rethinkdb.get",
+                                                   table=kwargs.get(
+                                                       "table", "playlists")):
+            return [
+                obj async for obj in await rethinkdb.r.table(
+                    kwargs.pop("table", "playlists")).filter(kwargs).run(
+                        self.rdbconn)
+            ]
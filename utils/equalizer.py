@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import typing
+
+import discord.ext.commands
+import lavalink
+
+from utils.cache import LRUCache
+
+BANDS = 15
+MIN_GAIN = -0.25
+MAX_GAIN = 1.0
+
+# Gains are stored as one byte per band, in steps of 1/200 from MIN_GAIN
+GAIN_STEP = 0.005
+
+MAX_PRESET_NAME = 32
+
+Gains = typing.Tuple[float, ...]
+
+BUILTIN_PRESETS: typing.Dict[str, Gains] = {
+    "flat": (0.0, ) * BANDS,
+    "bass": (0.3, 0.25, 0.2, 0.15, 0.1, 0.05, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0,
+             0.0, 0.0, 0.0),
+    "vocal": (-0.1, -0.1, -0.05, 0.0, 0.1, 0.15, 0.2, 0.2, 0.15, 0.1, 0.05,
+              0.0, 0.0, -0.05, -0.05),
+    "treble": (0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.05, 0.1, 0.15, 0.2, 0.25,
+               0.25, 0.3, 0.3),
+    "pop": (-0.05, 0.0, 0.05, 0.1, 0.15, 0.15, 0.1, 0.05, 0.0, 0.0, 0.0,
+            -0.05, -0.05, -0.05, -0.05),
+    "rock": (0.2, 0.15, 0.1, 0.05, -0.05, -0.05, 0.0, 0.05, 0.1, 0.15, 0.2,
+             0.2, 0.2, 0.2, 0.2),
+}
+
+
+def clamp(gain: float) -> float:
+    return max(min(float(gain), MAX_GAIN), MIN_GAIN)
+
+
+def encode(gains: typing.Sequence[float]) -> bytes:
+    """encode -> A curve as 15 bytes, one quantized gain per band"""
+    return bytes(
+        round((clamp(gain) - MIN_GAIN) / GAIN_STEP) for gain in gains)
+
+
+def decode(data: bytes) -> Gains:
+    """decode -> The curve `encode` packed, rounded to the step it was stored at"""
+    return tuple(round(MIN_GAIN + step * GAIN_STEP, 3) for step in data)
+
+
+def changes(current: typing.Sequence[float],
+            target: Gains) -> typing.List[typing.Tuple[int, float]]:
+    """changes -> `(band, gain)` pairs for only the bands that differ between two curves"""
+    return [(band, gain)
+            for band, (old, gain) in enumerate(zip(current, target))
+            if abs(old - gain) > GAIN_STEP / 2]
+
+
+async def apply_gains(player: lavalink.DefaultPlayer, gains: Gains) -> int:
+    """**`[coroutine]`** apply_gains -> Switch a player to a curve in one equalizer op, returning how many bands moved
+
+    Bands already at their gain are left out, switching to the curve a player already has sends nothing"""
+    update = changes(player.equalizer, gains)
+    if update:
+        await player.set_gains(*update)
+    return len(update)
+
+
+class EqualizerPresets:
+    """EqualizerPresets -> Built-in presets plus every guild's own, cached per guild after the first lookup
+
+    Guild presets are rows of 15-byte curves in the `equalizer_presets` table"""
+    def __init__(self,
+                 bot: discord.ext.commands.Bot,
+                 max_guilds: int = 10000) -> None:
+        self.bot = bot
+        self.guilds = LRUCache(max_guilds)
+
+    async def ensure_table(self) -> None:
+        """**`[coroutine]`** ensure_table -> Create the presets table"""
+        await self.bot.database.run(
+            """CREATE TABLE IF NOT EXISTS equalizer_presets (guild_id BIGINT NOT NULL, name TEXT NOT NULL, gains BYTEA NOT NULL, PRIMARY KEY (guild_id, name))"""
+        )
+
+    async def _load(self, guild_id: int) -> typing.Dict[str, Gains]:
+        rows = await self.bot.database.psqlconn.fetch(
+            """SELECT name, gains FROM equalizer_presets WHERE guild_id=$1""",
+            guild_id)
+        presets = {row["name"]: decode(row["gains"]) for row in rows}
+        self.guilds.set(guild_id, presets)
+        return presets
+
+    async def of(self, guild_id: int) -> typing.Dict[str, Gains]:
+        """**`[coroutine]`** of -> A guild's own presets"""
+        presets = self.guilds.get(guild_id)
+        if presets is None:
+            presets = await self.bot.resolutions.do("presets", guild_id,
+                                                    self._load, guild_id)
+        return presets
+
+    async def get(self, guild_id: int, name: str) -> typing.Optional[Gains]:
+        """**`[coroutine]`** get -> A built-in preset, or one of the guild's"""
+        name = name.casefold()
+        if name in BUILTIN_PRESETS:
+            return BUILTIN_PRESETS[name]
+        return (await self.of(guild_id)).get(name)
+
+    async def save(self, guild_id: int, name: str,
+                   gains: typing.Sequence[float]) -> Gains:
+        """**`[coroutine]`** save -> Store a curve as a guild preset, replacing one of the same name"""
+        name = name.casefold()
+        data = encode(gains)
+        await self.bot.database.run(
+            """INSERT INTO equalizer_presets (guild_id, name, gains) VALUES ($1, $2, $3) ON CONFLICT (guild_id, name) DO UPDATE SET gains=$3""",
+            guild_id, name, data)
+        # Cached as stored, so the preset sounds the same after a restart
+        gains = decode(data)
+        presets = dict(await self.of(guild_id))
+        presets[name] = gains
+        self.guilds.set(guild_id, presets)
+        return gains
+
+    async def delete(self, guild_id: int, name: str) -> bool:
+        """**`[coroutine]`** delete -> Remove a guild preset, returning whether there was one"""
+        name = name.casefold()
+        presets = await self.of(guild_id)
+        if name not in presets:
+            return False
+
+        await self.bot.database.run(
+            """DELETE FROM equalizer_presets WHERE guild_id=$1 AND name=$2""",
+            guild_id, name)
+        presets = dict(presets)
+        del presets[name]
+        self.guilds.set(guild_id, presets)
+        return True
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import traceback
+import typing
+
+import rethinkdb
+import rethinkdb.ast
+
+ERRORS_TABLE = "errors"
+LOGS_TABLE = "logs"
+
+# Index on logs mapping a case ID to the log row, and through it the fingerprint
+CASE_ID_INDEX = "case_id"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+r = rethinkdb.r
+
+
+def _location(filename: str) -> str:
+    """_location -> Where a frame lives, without anything that changes between machines or installs"""
+    filename = filename.replace("\\", "/")
+    if "site-packages/" in filename:
+        filename = filename.rsplit("site-packages/", 1)[1]
+    elif filename.startswith(ROOT.replace("\\", "/") + "/"):
+        filename = filename[len(ROOT) + 1:]
+    else:
+        filename = os.path.basename(filename)
+    return os.path.splitext(filename)[0]
+
+
+def _chain(error: BaseException) -> typing.Iterator[BaseException]:
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or (None if error.__suppress_context__ else
+                                    error.__context__)
+
+
+def normalize_stack(error: BaseException) -> typing.List[str]:
+    """normalize_stack -> The exception chain as `Type` and `module:function` lines
+
+    Messages and line numbers are left out, they differ between occurrences of the same bug"""
+    lines = []
+    for link in _chain(error):
+        lines.append("%s.%s" % (type(link).__module__, type(link).__qualname__))
+        lines.extend("  %s:%s" % (_location(frame.filename), frame.name)
+                     for frame in traceback.extract_tb(link.__traceback__))
+    return lines
+
+
+def fingerprint(error: BaseException) -> str:
+    """fingerprint -> Stable digest of an exception's type and normalized stack"""
+    return hashlib.sha1("\n".join(
+        normalize_stack(error)).encode()).hexdigest()
+
+
+def upsert(digest: str,
+           error: BaseException,
+           case_id: typing.Optional[str] = None) -> rethinkdb.ast.RqlQuery:
+    """upsert -> Query storing the traceback the first time a fingerprint is seen and counting it after
+
+    Runs as one atomic replace on the fingerprint's document, so concurrent failures don't lose counts"""
+    message = str(error)[:1000]
+    return r.table(ERRORS_TABLE).get(digest).replace(lambda document: r.branch(
+        document.eq(None), {
+            "id": digest,
+            "type": type(error).__qualname__,
+            "stack": normalize_stack(error),
+            "traceback": "".join(
+                traceback.TracebackException.from_exception(
+                    error).format()).strip(),
+            "message": message,
+            "last_message": message,
+            "count": 1,
+            "first_seen": r.now(),
+            "last_seen": r.now(),
+            "last_case_id": case_id,
+        },
+        document.merge({
+            "count": document["count"] + 1,
+            "last_seen": r.now(),
+            "last_message": message,
+            "last_case_id": case_id,
+        })))
+
+
+def case(case_id: str) -> rethinkdb.ast.RqlQuery:
+    """case -> Query for the error a case ID was filed under, by index rather than a table scan"""
+    return r.table(LOGS_TABLE).get_all(
+        case_id, index=CASE_ID_INDEX).has_fields("fingerprint").limit(
+            1).eq_join("fingerprint", r.table(ERRORS_TABLE))["right"]
+
+
+async def ensure_indexes(database) -> None:
+    """**`[coroutine]`** ensure_indexes -> Create the errors table and the case ID index on logs"""
+    if ERRORS_TABLE not in await database.run(r.table_list()):
+        await database.run(r.table_create(ERRORS_TABLE))
+    if CASE_ID_INDEX not in await database.run(
+            r.table(LOGS_TABLE).index_list()):
+        await database.run(r.table(LOGS_TABLE).index_create(CASE_ID_INDEX))
+        await database.run(r.table(LOGS_TABLE).index_wait(CASE_ID_INDEX))
@@ -1,3 +1,6 @@
+import discord.ext.commands
+
+
 class OutOfBoundVolumeError(Exception):
     def __init__(self, reason: str) -> None:
         super().__init__(reason)
@@ -23,4 +26,45 @@ class PlaylistGivenError(TypeError):
         return "Expected a song, but I was given a playlist instead"
     
     def __repr__(self) -> str:
-        return "Expected a song, but I was given a playlist instead"
\ No newline at end of file
+        return "Expected a song, but I was given a playlist instead"
+
+
+class PlayerNotFoundError(discord.ext.commands.CheckFailure):
+    def __str__(self) -> str:
+        return "The bot isn't playing any music"
+
+    def __repr__(self) -> str:
+        return "The bot isn't playing any music"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, source: str, retry_after: float) -> None:
+        self.source = source
+        self.retry_after = retry_after
+
+        super().__init__(source, retry_after)
+
+    def __str__(self) -> str:
+        return "{0} is unavailable right now, try again in {1:.0f} seconds".format(self.source, self.retry_after)
+
+    def __repr__(self) -> str:
+        return "{0} is unavailable right now, try again in {1:.0f} seconds".format(self.source, self.retry_after)
+
+
+class RateLimitedError(discord.ext.commands.CommandError):
+    def __init__(self, scope: str, retry_after: float) -> None:
+        self.scope = scope
+        self.retry_after = retry_after
+
+        super().__init__(scope, retry_after)
+
+    def __str__(self) -> str:
+        return "{0} running that too often, try again in {1:.1f} seconds".format("This server is" if self.scope == "guild" else "You're", self.retry_after)
+
+    def __repr__(self) -> str:
+        return "{0} running that too often, try again in {1:.1f} seconds".format("This server is" if self.scope == "guild" else "You're", self.retry_after)
+
+
+class PlaylistFormatError(ValueError):
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
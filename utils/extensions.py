@@ -2,6 +2,8 @@ from __future__ import annotations
 import asyncio
 
 import os
+import time
+import typing
 
 import asyncpg
 import lavalink
@@ -12,8 +14,24 @@ import discord.ext.commands
 import async_spotify.authentification.authorization_flows
 
 from pretty_help import PrettyHelp
+from utils import errors
+from utils import metrics
+from utils import recorder
+from utils import tracing
+from utils.breaker import default_breakers
+from utils.cache import SingleFlight, TTLCache
 from utils.objects import Templates
+from utils.playlists import PlaylistCache
+from utils.prefix import MENTION, PrefixMatcher
+from utils.ratelimit import AdmissionController
+from utils.retention import LogRetention
 from utils.database import DJDiscordDatabaseManager
+from utils.equalizer import EqualizerPresets
+from utils.exceptions import NoResultsError
+from utils.snapshot import PlayerSnapshotManager
+from utils.spotify import SpotifyMetadata
+from utils.voice import PlayerReaper
+from utils.watchdog import LoopWatchdog
 
 rethinkdb.r.set_loop_type("asyncio")
 
@@ -21,19 +39,38 @@ rethinkdb.r.set_loop_type("asyncio")
 class DJDiscordContext(discord.ext.commands.Context):
     def __init__(self: DJDiscordContext, **kwargs: dict) -> None:
         super().__init__(**kwargs)
+        self.created_at = time.perf_counter()
 
     @property
-    def spotify(self: DJDiscordContext) -> async_spotify.SpotifyApiClient:
-        return self.bot.spotify_api_client
+    def spotify(self: DJDiscordContext) -> SpotifyMetadata:
+        return self.bot.spotify
 
     @property
-    def player(self: DJDiscordContext) -> None:
-        if not self.bot.lavalink.player_manager.get(self.guild.id):
-            player = self.bot.lavalink.player_manager.create(
-                self.guild.id, endpoint=str(self.guild.region))
-            return player
+    def player(self: DJDiscordContext) -> typing.Optional[lavalink.DefaultPlayer]:
         return self.bot.lavalink.player_manager.get(self.guild.id)
 
+    def create_player(self: DJDiscordContext) -> lavalink.DefaultPlayer:
+        return self.bot.lavalink.player_manager.create(
+            self.guild.id, endpoint=str(self.guild.region))
+
+    async def get_tracks(self: DJDiscordContext, query: str) -> dict:
+        """**`[coroutine]`** get_tracks -> Load tracks from Lavalink on this guild's node"""
+        return await self.bot.get_tracks(self.player.node, query)
+
+    async def send(self: DJDiscordContext, *args, **kwargs) -> discord.Message:
+        with tracing.span("discord.send"):
+            return await super().send(*args, **kwargs)
+
+    async def update_voice_state(
+            self: DJDiscordContext,
+            channel_id: typing.Optional[int]) -> None:
+        """**`[coroutine]`** update_voice_state -> Ask the gateway to move the bot into (or out of) a voice channel"""
+        with tracing.span("discord.voice_state", channel=channel_id):
+            ws = self.bot._connection._get_websocket(self.guild.id)
+            await ws.voice_state(
+                str(self.guild.id),
+                str(channel_id) if channel_id is not None else None)
+
     @property
     def voice_queue(self: DJDiscordContext) -> dict:
         return self.bot.voice_queue
@@ -56,13 +93,15 @@ class DJDiscordContext(discord.ext.commands.Context):
 
     @property
     def database(self: DJDiscordContext) -> DJDiscordDatabaseManager:
-        return DJDiscordDatabaseManager(self.bot.rdbconn, self.bot.psqlconn)
+        return self.bot.database
 
 
 class DJDiscord(discord.ext.commands.Bot):
     """DJDiscord [discord.ext.commands.Bot] -> Base class for DJ Discord"""
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args,
+    def __init__(self, command_prefix: str, *args, **kwargs):
+        self.prefixes = PrefixMatcher(command_prefix)
+        super().__init__(self.prefixes,
+                         *args,
                          **kwargs,
                          help_command=PrettyHelp(
                              dm_help=False,
@@ -72,6 +111,60 @@ class DJDiscord(discord.ext.commands.Bot):
                              show_index=False,
                          ))
         self.voice_queue = {}
+        self.database = None
+        self.resolutions = SingleFlight()
+        self.negative = TTLCache(float(os.environ.get("NEGATIVE_CACHE_TTL",
+                                                      60)),
+                                 maxsize=4096)
+        self.breakers = default_breakers(
+            failure_threshold=int(os.environ.get("BREAKER_THRESHOLD", 5)),
+            reset_timeout=float(os.environ.get("BREAKER_RESET_TIMEOUT", 30)),
+        )
+        self.admission = AdmissionController(
+            max_wait=float(os.environ.get("ADMISSION_MAX_WAIT", 5)))
+        self.playlists = PlaylistCache(
+            self,
+            max_songs=int(os.environ.get("PLAYLIST_CACHE_SONGS", 100000)),
+            max_resolutions=int(
+                os.environ.get("PLAYLIST_CACHE_RESOLUTIONS", 50000)))
+        self.presets = EqualizerPresets(
+            self,
+            max_guilds=int(os.environ.get("EQUALIZER_PRESET_GUILDS", 10000)))
+        self.snapshots = PlayerSnapshotManager(
+            self,
+            interval=float(os.environ.get("SNAPSHOT_INTERVAL", 30)),
+            concurrency=int(os.environ.get("RESUME_CONCURRENCY", 4)),
+            spacing=float(os.environ.get("RESUME_SPACING", 0.5)),
+        )
+        self.reaper = PlayerReaper(
+            self,
+            idle_timeout=float(os.environ.get("PLAYER_IDLE_TIMEOUT", 300)),
+            empty_timeout=float(os.environ.get("PLAYER_EMPTY_TIMEOUT", 60)),
+        )
+        self.retention = LogRetention(
+            self,
+            retention=float(os.environ.get("LOG_RETENTION_DAYS", 7)) * 86400,
+            minute_retention=float(
+                os.environ.get("LOG_MINUTE_ROLLUP_DAYS", 30)) * 86400,
+            hour_retention=float(os.environ.get("LOG_HOUR_ROLLUP_DAYS",
+                                                365)) * 86400,
+            batch_size=int(os.environ.get("LOG_DELETE_BATCH", 500)),
+        )
+        self.watchdog = LoopWatchdog(
+            self.loop,
+            threshold=float(os.environ.get("WATCHDOG_THRESHOLD", 0.25)))
+        self._resumed = False
+        self._register_metrics()
+        tracing.configure(
+            sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", 0)),
+            slow_threshold=float(os.environ.get("TRACE_SLOW_THRESHOLD", 1)),
+            path=os.environ.get("TRACE_FILE"),
+            collector=os.environ.get("TRACE_COLLECTOR_URL"),
+        )
+        if path := os.environ.get("RECORD_FILE"):
+            self.add_listener(
+                recorder.start(path, self.prefixes).gateway,
+                "on_socket_response")
         for object in os.listdir("./commands"):
             if (os.path.isfile("./commands/%s" % object) and os.path.splitext(
                     "./commands/%s" % object)[1] == ".py"):
@@ -84,12 +177,14 @@ class DJDiscord(discord.ext.commands.Bot):
         await self.wait_until_ready()
         await self.change_presence(activity=discord.Activity(
             type=discord.ActivityType.competing,
-            name="{} server{}. Prefix: dj;".format(
-                len(self.guilds), "" if len(self.guilds) == 1 else "s"),
+            name="{} server{}. Prefix: {}".format(
+                len(self.guilds), "" if len(self.guilds) == 1 else "s",
+                self.prefixes),
         ))
         await asyncio.sleep(120)
 
     async def on_connect(self):
+        self.prefixes.bind(self.user.id)
         self.lavalink = lavalink.Client(self.user.id)
         self.lavalink.add_node(
             os.environ["LAVALINK_HOST"],
@@ -108,6 +203,12 @@ class DJDiscord(discord.ext.commands.Bot):
             auth_flow, hold_authentication=True)
         await self.spotify_api_client.get_auth_token_with_client_credentials()
         await self.spotify_api_client.create_new_client()
+        self.spotify = SpotifyMetadata(
+            self.spotify_api_client,
+            ttl=float(os.environ.get("SPOTIFY_CACHE_TTL", 3600)),
+            resolutions=self.resolutions,
+            breaker=self.breakers["spotify"],
+            negative=self.negative)
         self.rdbconn = await rethinkdb.r.connect(
             db="djdiscord",
             host=os.environ["RETHINKDB_HOST"],
@@ -122,13 +223,65 @@ class DJDiscord(discord.ext.commands.Bot):
             host=os.environ["POSTGRESQL_HOST"],
             port=os.environ["POSTGRESQL_PORT"],
         )
+        if recorder.active is not None:
+            self.rdbconn = recorder.RecordingRethinkDB(self.rdbconn)
+            self.psqlconn = recorder.RecordingPostgres(self.psqlconn)
+        self.database = DJDiscordDatabaseManager(self.rdbconn, self.psqlconn)
 
     async def on_ready(self):
         print("Ready!")
+        if not self._resumed:
+            self._resumed = True
+            print("Resumed %d player(s)" % await self.snapshots.resume())
+            try:
+                await self.prefixes.ensure_column(self.database)
+                print("Loaded %d guild prefix(es)" %
+                      await self.prefixes.load(self.database))
+            except Exception as error:
+                print("Failed to load guild prefixes: %r" % error)
+            try:
+                await errors.ensure_indexes(self.database)
+            except Exception as error:
+                print("Failed to create the error tables: %r" % error)
+            try:
+                await self.presets.ensure_table()
+            except Exception as error:
+                print("Failed to create the equalizer presets table: %r" % error)
+            self.snapshots.start()
+            self.reaper.start()
+            self.retention.start()
+            self.playlists.start()
+            self.watchdog.start()
+            if port := os.environ.get("METRICS_PORT"):
+                await metrics.start_http_server(
+                    os.environ.get("METRICS_HOST", "127.0.0.1"), int(port))
+
+    async def close(self) -> None:
+        self.watchdog.stop()
+        if self.database is not None:
+            self.snapshots.stop()
+            self.reaper.stop()
+            self.retention.stop()
+            self.playlists.stop()
+            try:
+                await self.snapshots.flush()
+            except Exception as error:
+                print("Failed to write player snapshots: %r" % error)
+        await super().close()
+        recorder.stop()
 
     async def on_message(self, message):
-        if not message.author.bot and "<@!788392608254787595>" in message.content:
-            return await message.channel.send("My prefix is dj;")
+        if message.author.bot:
+            return
+
+        guild_id = message.guild.id if message.guild else None
+        match = self.prefixes.match(message.content, guild_id)
+        if match is None:
+            # Can't be a command, don't pay for a Context
+            return
+        if match == MENTION:
+            return await message.channel.send(
+                "My prefix is %s" % self.prefixes.prefixes(guild_id)[0])
 
         return await self.process_commands(message)
 
@@ -140,6 +293,135 @@ class DJDiscord(discord.ext.commands.Bot):
         ctx = await self.get_context(message, cls=DJDiscordContext)
         await self.invoke(ctx)
 
+    async def get_tracks(self, node: lavalink.Node, query: str) -> dict:
+        """**`[coroutine]`** get_tracks -> Load tracks from Lavalink, sharing identical in-flight loads"""
+        if ("lavalink", query) in self.negative:
+            raise NoResultsError(query)
+
+        results = await self.resolutions.do("lavalink", (node.name, query),
+                                            self.breakers["lavalink"].call,
+                                            self._load_tracks, node, query)
+
+        if not results or not results.get("tracks"):
+            self.negative.set(("lavalink", query), True)
+            raise NoResultsError(query)
+        return results
+
+    async def _load_tracks(self, node: lavalink.Node, query: str) -> dict:
+        with metrics.lavalink_duration.time(
+                operation="loadtracks"), tracing.span("lavalink.loadtracks",
+                                                      node=node.name,
+                                                      query=query):
+            return await recorder.capture("lavalink", query,
+                                          node.get_tracks(query))
+
+    async def invoke(self, ctx: DJDiscordContext) -> None:
+        if ctx.command is None:
+            return await super().invoke(ctx)
+
+        with tracing.tracer.trace("command",
+                                  command=ctx.command.qualified_name,
+                                  guild=getattr(ctx.guild, "id", None)) as span:
+            self.watchdog.track(ctx.command.qualified_name)
+            try:
+                await super().invoke(ctx)
+            finally:
+                self.watchdog.untrack()
+            if span is not None and ctx.command_failed:
+                span.error = "command failed"
+
+        if ctx.command is not None:
+            metrics.command_duration.observe(
+                time.perf_counter() - ctx.created_at,
+                command=ctx.command.qualified_name)
+            if ctx.command_failed:
+                metrics.command_failures.inc(
+                    command=ctx.command.qualified_name)
+
+    def _register_metrics(self) -> None:
+        def _players() -> typing.List[lavalink.DefaultPlayer]:
+            if getattr(self, "lavalink", None) is None:
+                return []
+            return list(self.lavalink.player_manager.players.values())
+
+        def _caches() -> dict:
+            caches = {
+                "negative": self.negative,
+                "playlists": self.playlists.cache,
+                "playlist_authors": self.playlists.authors,
+                "playlist_names": self.playlists.names,
+            }
+            if getattr(self, "spotify", None) is not None:
+                caches["spotify"] = self.spotify.tracks
+            return caches
+
+        metrics.registry.register(
+            metrics.CallbackMetric(
+                "djdiscord_players_active", "Live Lavalink players",
+                lambda: len(_players())))
+        metrics.registry.register(
+            metrics.CallbackMetric(
+                "djdiscord_players_playing", "Players currently playing",
+                lambda: sum(player.is_playing for player in _players())))
+        metrics.registry.register(
+            metrics.CallbackMetric(
+                "djdiscord_queued_tracks", "Tracks waiting in every queue",
+                lambda: sum(len(player.queue) for player in _players())))
+        metrics.registry.register(
+            metrics.CallbackMetric(
+                "djdiscord_queue_length_max", "Length of the longest queue",
+                lambda: max((len(player.queue) for player in _players()),
+                            default=0)))
+        metrics.registry.register(
+            metrics.CallbackMetric(
+                "djdiscord_cache_hits_total", "Cache lookups that hit",
+                lambda: {
+                    name: cache.hits
+                    for name, cache in _caches().items()
+                }, ["cache"], "counter"))
+        metrics.registry.register(
+            metrics.CallbackMetric(
+                "djdiscord_cache_misses_total", "Cache lookups that missed",
+                lambda: {
+                    name: cache.misses
+                    for name, cache in _caches().items()
+                }, ["cache"], "counter"))
+        metrics.registry.register(
+            metrics.CallbackMetric("djdiscord_singleflight_calls_total",
+                                   "Resolutions requested",
+                                   lambda: dict(self.resolutions.calls),
+                                   ["namespace"], "counter"))
+        metrics.registry.register(
+            metrics.CallbackMetric(
+                "djdiscord_singleflight_deduplicated_total",
+                "Resolutions that joined an identical in-flight call",
+                lambda: dict(self.resolutions.deduplicated), ["namespace"],
+                "counter"))
+        metrics.registry.register(
+            metrics.CallbackMetric(
+                "djdiscord_circuit_breaker_open",
+                "1 when a source's circuit breaker is open, 0.5 when half-open",
+                lambda: {
+                    name: {
+                        breaker.CLOSED: 0,
+                        breaker.HALF_OPEN: 0.5,
+                        breaker.OPEN: 1
+                    }[breaker.state]
+                    for name, breaker in self.breakers.items()
+                }, ["source"]))
+        metrics.registry.register(
+            metrics.CallbackMetric(
+                "djdiscord_circuit_breaker_rejected_total",
+                "Calls rejected by an open circuit breaker", lambda: {
+                    name: breaker.rejected
+                    for name, breaker in self.breakers.items()
+                }, ["source"], "counter"))
+        metrics.registry.register(
+            metrics.CallbackMetric(
+                "djdiscord_admission_waiting",
+                "Commands currently queued by admission control",
+                lambda: self.admission.waiting))
+
     @property
     def templates(self):
         return Templates
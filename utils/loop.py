@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import os
+import typing
+
+# Threads of the default executor show up under this name in profiles
+EXECUTOR_THREAD_PREFIX = "djdiscord-executor"
+
+
+def available() -> typing.Dict[str, typing.Callable[[], asyncio.AbstractEventLoop]]:
+    """available -> Event loop implementations that can be used here, by name"""
+    loops = {"asyncio": asyncio.new_event_loop}
+    try:
+        import uvloop
+    except ImportError:
+        pass
+    else:
+        loops["uvloop"] = uvloop.new_event_loop
+    return loops
+
+
+def install(name: str = "uvloop") -> str:
+    """install -> Make `name` the event loop every new loop is created with, returning the one installed
+
+    Falls back to the default asyncio loop when uvloop isn't installed, so it stays an optional dependency.
+    Has to run before the bot is constructed, discord.py grabs its loop in `Client.__init__`"""
+    if name == "uvloop":
+        try:
+            import uvloop
+        except ImportError:
+            print("uvloop isn't installed, using the default asyncio event loop")
+        else:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            return "uvloop"
+    elif name != "asyncio":
+        raise ValueError("Unknown event loop %r" % name)
+
+    asyncio.set_event_loop_policy(asyncio.DefaultEventLoopPolicy())
+    return "asyncio"
+
+
+def default_workers() -> int:
+    """default_workers -> Executor threads for our workload
+
+    The executor mostly runs youtube_dl extractions, which spend their time waiting on the network
+    rather than holding the GIL, so it gets more threads than cores. Capped like the stdlib's default"""
+    return min(32, (os.cpu_count() or 1) * 2 + 4)
+
+
+def configure(loop: asyncio.AbstractEventLoop,
+              workers: typing.Optional[int] = None
+              ) -> concurrent.futures.ThreadPoolExecutor:
+    """configure -> Give `loop` a default executor with `workers` named threads"""
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=workers or default_workers(),
+        thread_name_prefix=EXECUTOR_THREAD_PREFIX)
+    loop.set_default_executor(executor)
+    return executor
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import time
+import typing
+
+LabelValues = typing.Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+
+def _format_labels(labelnames: typing.Sequence[str],
+                   values: LabelValues,
+                   extra: str = "") -> str:
+    pairs = [
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace(
+            '"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(labelnames, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: typing.Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: typing.Dict[str, typing.Any]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> typing.Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return "# HELP %s %s\n# TYPE %s %s\n%s" % (
+            self.name, self.documentation, self.name, self.type, "".join(
+                "%s\n" % sample for sample in self.samples()))
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: typing.Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> typing.Iterator[str]:
+        for key, value in self._values.items():
+            yield "%s%s %r" % (self.name, _format_labels(self.labelnames,
+                                                         key), value)
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+
+class CallbackMetric(Metric):
+    """CallbackMetric -> Metric whose samples are read from `function` when scraped
+
+    `function` returns a number, or a mapping of label value tuples to numbers"""
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 function: typing.Callable[[], typing.Union[float, dict]],
+                 labelnames: typing.Sequence[str] = (),
+                 type: str = "gauge") -> None:
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self.type = type
+
+    def samples(self) -> typing.Iterator[str]:
+        values = self.function()
+        if not isinstance(values, dict):
+            values = {(): values}
+
+        for key, value in values.items():
+            if not isinstance(key, tuple):
+                key = (key, )
+            yield "%s%s %r" % (self.name, _format_labels(
+                self.labelnames, key), float(value))
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 labelnames: typing.Sequence[str] = (),
+                 buckets: typing.Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: typing.Dict[LabelValues, typing.List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        counts = self._values.get(key)
+        if counts is None:
+            counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def time(self, **labels) -> _Timer:
+        return _Timer(self, labels)
+
+    def count(self, **labels) -> int:
+        counts = self._values.get(self._key(labels))
+        return int(sum(counts[:-1])) if counts else 0
+
+    def samples(self) -> typing.Iterator[str]:
+        for key, counts in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"), ),
+                                    counts[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield "%s_bucket%s %d" % (self.name,
+                                          _format_labels(
+                                              self.labelnames, key,
+                                              'le="%s"' % le), cumulative)
+            labels = _format_labels(self.labelnames, key)
+            yield "%s_sum%s %r" % (self.name, labels, counts[-1])
+            yield "%s_count%s %d" % (self.name, labels, cumulative)
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: dict) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> _Timer:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.histogram.observe(time.perf_counter() - self.start,
+                               **self.labels)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: typing.Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> typing.Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self._metrics.values())
+
+
+registry = Registry()
+
+command_duration = registry.register(
+    Histogram("djdiscord_command_duration_seconds",
+              "Time spent invoking a command", ["command"]))
+command_failures = registry.register(
+    Counter("djdiscord_command_failures_total", "Commands that failed",
+            ["command"]))
+converter_duration = registry.register(
+    Histogram("djdiscord_converter_duration_seconds",
+              "Time spent converting a command argument", ["converter"]))
+database_duration = registry.register(
+    Histogram("djdiscord_database_query_duration_seconds",
+              "Time spent on a database round trip", ["backend"]))
+lavalink_duration = registry.register(
+    Histogram("djdiscord_lavalink_request_duration_seconds",
+              "Time spent on a Lavalink REST request", ["operation"]))
+loop_lag = registry.register(
+    Histogram("djdiscord_event_loop_lag_seconds",
+              "How late the event loop woke up a sleeping task",
+              buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                       2.5)))
+
+
+async def sample_loop_lag(interval: float = 0.5) -> None:
+    """**`[coroutine]`** sample_loop_lag -> Continuously record how late `asyncio.sleep(interval)` returns"""
+    loop = asyncio.get_event_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag.observe(max(loop.time() - start - interval, 0.0))
+
+
+async def start_http_server(host: str, port: int,
+                            _registry: Registry = registry):
+    """**`[coroutine]`** start_http_server -> Serve the registry in the Prometheus text format on /metrics"""
+    import aiohttp.web
+
+    async def _metrics(_: aiohttp.web.Request) -> aiohttp.web.Response:
+        return aiohttp.web.Response(text=_registry.render(),
+                                    content_type="text/plain",
+                                    charset="utf-8",
+                                    headers={"X-Content-Type-Options": "nosniff"})
+
+    app = aiohttp.web.Application()
+    app.router.add_get("/metrics", _metrics)
+    runner = aiohttp.web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await aiohttp.web.TCPSite(runner, host, port).start()
+    return runner
@@ -53,8 +53,11 @@ class Templates(metaclass=Template):
                                        color=0xF2DDA4)
 
 
-@dataclass
+@dataclass(frozen=True)
 class Song:
+    __slots__ = ("source", "url", "uploader", "title", "thumbnails",
+                 "created", "length", "host", "emoji", "_document")
+
     source: str
     url: str
     uploader: str
@@ -65,44 +68,98 @@ class Song:
 
     # lyrics: typing.Union[str, SongLyrics]
 
+    def __post_init__(self) -> None:
+        host = urlparse(self.url).netloc
+        object.__setattr__(self, "host", host)
+        object.__setattr__(self, "emoji",
+                           song_emoji_conversion.get(host, "\U0001f3b5"))
+        object.__setattr__(self, "_document", None)
+
     def __getitem__(self, item):
         if isinstance(item, str):
             return getattr(self, item, None)
 
     @property
-    def emoji(self) -> str:
-        return song_emoji_conversion[urlparse(self.url).netloc]
+    def json(self) -> dict:
+        if self._document is None:
+            object.__setattr__(
+                self, "_document", {
+                    "source": self.source,
+                    "uploader": self.uploader,
+                    "title": self.title,
+                    "thumbnails": self.thumbnails,
+                    "created": self.created,
+                    "length": self.length,
+                    "url": self.url,
+                })
+        return self._document
+
+    @staticmethod
+    def from_json(_dict: dict) -> Song:
+        song = Song(_dict["source"], _dict["url"], _dict["uploader"],
+                    _dict["title"], _dict["thumbnails"], _dict["created"],
+                    _dict["length"])
+        # The document is kept as-is and handed back by `json`, nothing is copied
+        object.__setattr__(song, "_document", _dict)
+        return song
+
+
+class SongList(typing.Sequence[Song]):
+    """SongList -> Decodes a playlist's song documents only when they are accessed"""
+    __slots__ = ("documents", "_songs")
+
+    def __init__(self, documents: typing.List[dict]) -> None:
+        self.documents = documents
+        self._songs: typing.List[typing.Optional[Song]] = [None] * len(
+            documents)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        song = self._songs[index]
+        if song is None:
+            song = self._songs[index] = Song.from_json(self.documents[index])
+        return song
+
+    def __iter__(self) -> typing.Iterator[Song]:
+        for index in range(len(self)):
+            yield self[index]
 
     @property
-    def json(self) -> dict:
-        return {
-            "source": self.source,
-            "uploader": self.uploader,
-            "title": self.title,
-            "thumbnails": self.thumbnails,
-            "created": self.created,
-            "length": self.length,
-            "url": self.url,
-        }
+    def json(self) -> typing.List[dict]:
+        return self.documents
 
 
-@dataclass
+@dataclass(frozen=True)
 class Station:
+    __slots__ = ("source", "call_sign", "frequency", "thumbnail", "url",
+                 "_document")
+
     source: str
     call_sign: str
     frequency: float
     thumbnail: typing.Optional[str]
     url: typing.Optional[str]
 
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "_document", None)
+
     @property
     def json(self) -> dict:
-        return {
-            "source": self.source,
-            "frequency": self.frequency,
-            "call_sign": self.call_sign,
-            "thumbnail": self.thumbnail,
-            "url": self.url
-        }
+        if self._document is None:
+            object.__setattr__(
+                self, "_document", {
+                    "source": self.source,
+                    "frequency": self.frequency,
+                    "call_sign": self.call_sign,
+                    "thumbnail": self.thumbnail,
+                    "url": self.url
+                })
+        return self._document
 
     @staticmethod
     def from_json(_dict: dict) -> Station:
@@ -112,7 +169,55 @@ class Station:
         frequency = _dict.get("frequency")
         url = _dict.get("url")
 
-        return Station(source, call_sign, frequency, thumbnail, url)
+        station = Station(source, call_sign, frequency, thumbnail, url)
+        object.__setattr__(station, "_document", _dict)
+        return station
+
+
+class TrackMeta:
+    """TrackMeta -> Compact metadata kept alongside every queued lavalink track
+
+    For radio stations `title` holds the call sign and `uploader` the frequency"""
+    __slots__ = ("title", "uploader", "url", "thumbnail", "duration", "kind")
+
+    SONG = 0
+    STATION = 1
+
+    def __init__(self, title: str, uploader: str, url: typing.Optional[str],
+                 thumbnail: typing.Optional[str], duration: int,
+                 kind: int) -> None:
+        self.title = title
+        self.uploader = uploader
+        self.url = url
+        self.thumbnail = thumbnail
+        self.duration = duration
+        self.kind = kind
+
+    @property
+    def json(self) -> list:
+        return [
+            self.title, self.uploader, self.url, self.thumbnail,
+            self.duration, self.kind
+        ]
+
+    @staticmethod
+    def from_json(_list: list) -> TrackMeta:
+        return TrackMeta(*_list)
+
+    @staticmethod
+    def from_song(song: typing.Union[Song, dict], duration: int) -> TrackMeta:
+        thumbnails = song["thumbnails"]
+        if isinstance(thumbnails, list):
+            thumbnails = thumbnails[-1]["url"] if thumbnails else None
+
+        return TrackMeta(song["title"], song["uploader"], song["url"],
+                         thumbnails, duration, TrackMeta.SONG)
+
+    @staticmethod
+    def from_station(station: Station, duration: int) -> TrackMeta:
+        return TrackMeta(station.call_sign, str(station.frequency),
+                         station.url, station.thumbnail, duration,
+                         TrackMeta.STATION)
 
 
 class YoutubeLogger(object):
@@ -385,17 +490,19 @@ class AfterCogInvokeOp:
                                 ctx.channel)
 
 
-@dataclass
+@dataclass(frozen=True)
 class Playlist:
+    __slots__ = ("id", "songs", "author", "cover")
+
     id: int
-    songs: list
+    songs: SongList
     author: typing.Union[discord.Member, int, discord.User]
     cover: str
 
     @staticmethod
     def from_json(_dict: dict) -> Playlist:
         _id = _dict["id"]
-        songs = _dict["songs"]
+        songs = SongList(_dict["songs"])
         author = _dict["author"]
         cover = _dict["cover"]
 
@@ -406,6 +513,7 @@ class Playlist:
             "songs":
             rethinkdb.r.row["songs"].delete_at(index - 1)
         }).run(ctx.database.rdbconn)
+        ctx.bot.playlists.invalidate(self.id)
 
     async def add_song(self, ctx: discord.ext.commands.Context,
                        song: Song) -> None:
@@ -413,3 +521,12 @@ class Playlist:
             "songs":
             rethinkdb.r.row["songs"].append(song.json)
         }).run(ctx.database.rdbconn)
+        ctx.bot.playlists.invalidate(self.id)
+
+    async def add_songs(self, ctx: discord.ext.commands.Context,
+                        songs: typing.List[Song]) -> None:
+        await rethinkdb.r.table("playlists").get(self.id).update({
+            "songs":
+            rethinkdb.r.row["songs"].add([song.json for song in songs])
+        }).run(ctx.database.rdbconn)
+        ctx.bot.playlists.invalidate(self.id)
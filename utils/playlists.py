@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+import typing
+
+import discord.ext.commands
+import rethinkdb
+
+from utils.cache import LRUCache
+from utils.objects import Playlist
+
+PLAYLISTS_TABLE = "playlists"
+
+r = rethinkdb.r
+
+
+class PlaylistCache:
+    """PlaylistCache -> Read-through LRU of playlists by ID and by author, kept coherent by a changefeed
+
+    Entries are weighed by song count, so a few huge playlists can't crowd out everybody else.
+    Which playlist an author or a name resolves to is cached separately and outlives the playlist
+    itself, so a resolved lookup that misses is a primary key `get` rather than a table scan.
+    Nothing is cached unless the `playlists` changefeed is live: edits from any process update or
+    drop cached entries, and everything is dropped if the feed is lost"""
+    def __init__(self,
+                 bot: discord.ext.commands.Bot,
+                 max_songs: int = 100000,
+                 max_resolutions: int = 50000,
+                 retry_delay: float = 5.0) -> None:
+        self.bot = bot
+        self.retry_delay = retry_delay
+        self.cache = LRUCache(max_songs,
+                              weigher=lambda playlist: len(playlist.songs) + 1)
+        # author ID -> playlist ID and playlist name -> playlist ID
+        self.authors = LRUCache(max_resolutions)
+        self.names = LRUCache(max_resolutions)
+        self.live = False
+        # Bumped by every change, a fetch that raced a change isn't cached
+        self.generation = 0
+        self._task: typing.Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._drop_all()
+
+    async def _run(self) -> None:
+        await self.bot.wait_until_ready()
+        while not self.bot.is_closed():
+            try:
+                feed = await self.bot.database.run(
+                    r.table(PLAYLISTS_TABLE).changes())
+                self.live = True
+                async for change in feed:
+                    self.apply(change)
+            except Exception as error:
+                print("Lost the playlist changefeed: %r" % error)
+            finally:
+                self._drop_all()
+            await asyncio.sleep(self.retry_delay)
+
+    def _drop_all(self) -> None:
+        self.live = False
+        self.generation += 1
+        self.cache.clear()
+        self.authors.clear()
+        self.names.clear()
+
+    def _link(self, document: dict) -> None:
+        self.authors.set(document["author"], document["id"])
+        if document.get("name") is not None:
+            self.names.set(document["name"], document["id"])
+
+    def _unlink(self, old: dict, new: typing.Optional[dict]) -> None:
+        new = new or {}
+        if new.get("author") != old["author"]:
+            self.authors.pop(old["author"])
+        if old.get("name") is not None and new.get("name") != old["name"]:
+            self.names.pop(old["name"])
+
+    def apply(self, change: dict) -> None:
+        """apply -> Bring cached entries in line with one changefeed change"""
+        self.generation += 1
+        old, new = change.get("old_val"), change.get("new_val")
+        cached = new is not None and new["id"] in self.cache
+        if old is not None:
+            self.cache.pop(old["id"])
+            # The playlist may have changed hands, been renamed or deleted
+            self._unlink(old, new)
+        if cached:
+            self.cache.set(new["id"], Playlist.from_json(new))
+
+    def invalidate(self, playlist_id: str) -> None:
+        """invalidate -> Forget a playlist, for writes made by this process that the feed hasn't echoed yet"""
+        self.generation += 1
+        self.cache.pop(playlist_id)
+
+    async def _load(self, fetch: typing.Callable[..., typing.Awaitable],
+                    *args, **kwargs) -> typing.Optional[Playlist]:
+        generation = self.generation
+        document = await fetch(*args, **kwargs)
+        if document is None:
+            return None
+
+        playlist = Playlist.from_json(document)
+        if self.live and generation == self.generation:
+            self.cache.set(playlist.id, playlist)
+            self._link(document)
+        return playlist
+
+    async def by_id(self, playlist_id: str) -> typing.Optional[Playlist]:
+        """**`[coroutine]`** by_id -> A playlist from memory, or from RethinkDB on a miss"""
+        playlist = self.cache.get(playlist_id)
+        if playlist is not None:
+            return playlist
+        return await self.bot.resolutions.do("playlist", ("id", playlist_id),
+                                             self._load, self._fetch_id,
+                                             playlist_id)
+
+    async def by_author(self, author_id: int) -> typing.Optional[Playlist]:
+        """**`[coroutine]`** by_author -> A member's playlist, looked up by ID once the author has been resolved"""
+        playlist_id = self.authors.get(author_id)
+        if playlist_id is not None:
+            return await self.by_id(playlist_id)
+        return await self.bot.resolutions.do("playlist",
+                                             ("author", author_id),
+                                             self._load, self._fetch_by,
+                                             author=author_id)
+
+    async def by_name(self, name: str) -> typing.Optional[Playlist]:
+        """**`[coroutine]`** by_name -> A playlist by name, looked up by ID once the name has been resolved"""
+        playlist_id = self.names.get(name)
+        if playlist_id is not None:
+            return await self.by_id(playlist_id)
+        return await self.bot.resolutions.do("playlist", ("name", name),
+                                             self._load, self._fetch_by,
+                                             name=name)
+
+    async def _fetch_id(self, playlist_id: str) -> typing.Optional[dict]:
+        return await self.bot.database.run(
+            r.table(PLAYLISTS_TABLE).get(playlist_id))
+
+    async def _fetch_by(self, **kwargs) -> typing.Optional[dict]:
+        documents = await self.bot.database.get(**kwargs)
+        return documents[0] if documents else None
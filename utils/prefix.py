@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import typing
+
+import discord
+import discord.ext.commands
+
+# What `PrefixMatcher.match` makes of a message
+COMMAND = "command"
+MENTION = "mention"
+
+
+class PrefixMatcher:
+    """PrefixMatcher -> Decides from the raw content whether a message could be a command, before any Context is built
+
+    Guilds that set their own prefix are kept in an in-memory cache filled from the configuration table,
+    every other guild uses the default. Also usable as the bot's `command_prefix`, so `get_context`
+    agrees with the fast path"""
+    def __init__(self, default: str) -> None:
+        self.default = (default, )
+        self.guilds: typing.Dict[int, typing.Tuple[str, ...]] = {}
+        self.mentions: typing.Tuple[str, ...] = ()
+
+    def __str__(self) -> str:
+        return self.default[0]
+
+    def __call__(self, bot: discord.ext.commands.Bot,
+                 message: discord.Message) -> typing.List[str]:
+        return list(
+            self.prefixes(message.guild.id if message.guild else None))
+
+    def bind(self, user_id: int) -> None:
+        """bind -> Precompute both forms of the bot's mention"""
+        self.mentions = ("<@%d>" % user_id, "<@!%d>" % user_id)
+
+    def prefixes(self,
+                 guild_id: typing.Optional[int]) -> typing.Tuple[str, ...]:
+        return self.guilds.get(guild_id, self.default)
+
+    def set(self, guild_id: int, prefix: typing.Optional[str]) -> None:
+        """set -> Give a guild its own prefix, or return it to the default with `None`"""
+        if prefix is None or (prefix, ) == self.default:
+            self.guilds.pop(guild_id, None)
+        else:
+            self.guilds[guild_id] = (prefix, )
+
+    def match(self, content: str,
+              guild_id: typing.Optional[int]) -> typing.Optional[str]:
+        """match -> `MENTION` if the bot is mentioned, `COMMAND` if the message starts with a prefix, else `None`"""
+        # Cheap scan first, most messages don't mention anyone
+        if "<@" in content:
+            for mention in self.mentions:
+                if mention in content:
+                    return MENTION
+        if content.startswith(self.guilds.get(guild_id, self.default)):
+            return COMMAND
+        return None
+
+    async def ensure_column(self, database) -> None:
+        """**`[coroutine]`** ensure_column -> Add the prefix column to configuration tables created before it existed"""
+        await database.run(
+            """ALTER TABLE configuration ADD COLUMN IF NOT EXISTS prefix TEXT"""
+        )
+
+    async def load(self, database) -> int:
+        """**`[coroutine]`** load -> Fill the cache with every guild's configured prefix"""
+        rows = await database.psqlconn.fetch(
+            """SELECT id, prefix FROM configuration WHERE prefix IS NOT NULL"""
+        )
+        for row in rows:
+            self.set(row["id"], row["prefix"])
+        return len(self.guilds)
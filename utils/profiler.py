@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import typing
+
+# Innermost frames of threads parked waiting for work: the event loop in select, executor
+# workers blocked on their queue and anything waiting on an Event or Condition
+PARKED = {
+    ("select", "selectors.py"),
+    ("_worker", "thread.py"),
+    ("get", "queue.py"),
+    ("wait", "threading.py"),
+}
+
+
+def _parked(frame) -> bool:
+    return (frame.f_code.co_name,
+            os.path.basename(frame.f_code.co_filename)) in PARKED
+
+
+def _describe(code) -> str:
+    return "%s (%s:%d)" % (code.co_name, os.path.basename(
+        code.co_filename), code.co_firstlineno)
+
+
+class SamplingProfiler:
+    """SamplingProfiler -> Periodically samples the event loop's stack, or every thread's, from a background thread
+
+    Nothing is hooked into the interpreter, so the cost is one `sys._current_frames()` walk per
+    `interval`. When `task` is given, event loop samples are only kept while that task is running.
+    Threads parked waiting for work are counted but not recorded, so they don't crowd out the
+    functions actually running"""
+    def __init__(self,
+                 loop: typing.Optional[asyncio.AbstractEventLoop] = None,
+                 interval: float = 0.005,
+                 task: typing.Optional[asyncio.Task] = None,
+                 all_threads: bool = False) -> None:
+        self.loop = loop
+        self.interval = interval
+        self.task = task
+        self.all_threads = all_threads
+        self.samples = 0
+        # Samples taken of each thread, pools counting once per worker
+        self.ticks: typing.Counter[str] = collections.Counter()
+        self.stacks: typing.Counter[typing.Tuple[str, ...]] = collections.Counter()
+        self.started_at: typing.Optional[float] = None
+        self.stopped_at: typing.Optional[float] = None
+        self._loop_thread = threading.get_ident()
+        self._thread: typing.Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def duration(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.stopped_at or time.perf_counter()) - self.started_at
+
+    def start(self) -> SamplingProfiler:
+        self._loop_thread = threading.get_ident()
+        self._stopped.clear()
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample_forever,
+                                        name="djdiscord-profiler",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> SamplingProfiler:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped_at = time.perf_counter()
+        return self
+
+    def _sample_forever(self) -> None:
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            self.sample(exclude=own)
+
+    def sample(self, exclude: typing.Optional[int] = None) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == exclude:
+                continue
+
+            if ident == self._loop_thread:
+                if self.task is not None and not self._running(self.task):
+                    continue
+                thread = "event-loop"
+            elif not self.all_threads:
+                continue
+            else:
+                # Collapse "ThreadPoolExecutor-0_3" and friends into one row per pool
+                thread = names.get(ident, "thread-%d" % ident).rsplit("_", 1)[0]
+
+            self.ticks[thread] += 1
+            if _parked(frame):
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(_describe(frame.f_code))
+                frame = frame.f_back
+            stack.append(thread)
+            self.stacks[tuple(reversed(stack))] += 1
+        self.samples += 1
+
+    def _running(self, task: asyncio.Task) -> bool:
+        try:
+            return asyncio.current_task(self.loop) is task
+        except RuntimeError:
+            return False
+
+    def collapsed(self) -> str:
+        """collapsed -> Render the samples as collapsed stacks, the input format of flamegraph.pl and speedscope"""
+        return "".join("%s %d\n" % (";".join(stack), count)
+                       for stack, count in self.stacks.most_common())
+
+    def top(self,
+            limit: int = 10) -> typing.List[typing.Tuple[str, str, float, float]]:
+        """top -> The hottest functions as (thread, function, self share, total share)
+
+        Shares are of the samples taken of that thread, so none of them can pass 1"""
+        own: typing.Counter[typing.Tuple[str, str]] = collections.Counter()
+        total: typing.Counter[typing.Tuple[str, str]] = collections.Counter()
+        for stack, count in self.stacks.items():
+            if len(stack) < 2:
+                continue
+            thread = stack[0]
+            own[thread, stack[-1]] += count
+            for function in set(stack[1:]):
+                total[thread, function] += count
+
+        return [(thread, function, samples / self.ticks[thread],
+                 total[thread, function] / self.ticks[thread])
+                for (thread, function), samples in own.most_common(limit)]
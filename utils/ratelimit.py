@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import time
+import typing
+
+from utils import metrics
+from utils.exceptions import RateLimitedError
+
+admission_rejected = metrics.registry.register(
+    metrics.Counter("djdiscord_admission_rejected_total",
+                    "Commands rejected by admission control",
+                    ["scope", "cost_class"]))
+admission_queued = metrics.registry.register(
+    metrics.Counter("djdiscord_admission_queued_total",
+                    "Commands held back by admission control until tokens were free",
+                    ["cost_class"]))
+
+
+@dataclasses.dataclass(frozen=True)
+class CostClass:
+    """CostClass -> Refill rates (tokens per second) and bursts of the buckets a kind of work draws from"""
+    name: str
+    user_rate: float
+    user_burst: float
+    guild_rate: float
+    guild_burst: float
+
+
+# youtube_dl and Lavalink REST behind every extraction, PIL behind every render
+DEFAULT_CLASSES = {
+    "extract": CostClass("extract", 0.2, 4, 1.0, 10),
+    "render": CostClass("render", 0.5, 3, 2.0, 6),
+}
+
+# Command -> (cost class, tokens it costs), commands missing here are free
+DEFAULT_COSTS = {
+    "play": ("extract", 2),
+    "rawplay": ("extract", 2),
+    "add": ("extract", 1),
+    "radiostart": ("extract", 1),
+    "spotify": ("extract", 4),
+    "now": ("render", 1),
+}
+
+
+class TokenBucket:
+    """TokenBucket -> `capacity` tokens refilled at `rate` per second
+
+    Tokens may be borrowed against the future, a queued command takes its tokens right away
+    so later arrivals line up behind it"""
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, cost: float, now: float) -> float:
+        """delay -> Seconds until `cost` tokens are available"""
+        self.refill(now)
+        return max(cost - self.tokens, 0.0) / self.rate
+
+
+class AdmissionController:
+    """AdmissionController -> Token buckets per user and per guild for every cost class
+
+    A command waits when its buckets will have the tokens within `max_wait` seconds and is
+    rejected with a retry-after otherwise, so one busy guild can't saturate the shared workers"""
+    def __init__(self,
+                 classes: typing.Optional[typing.Dict[str, CostClass]] = None,
+                 costs: typing.Optional[typing.Dict[str, typing.Tuple[
+                     str, float]]] = None,
+                 max_wait: float = 5.0,
+                 max_buckets: int = 10000,
+                 clock: typing.Callable[[], float] = time.monotonic) -> None:
+        self.classes = DEFAULT_CLASSES if classes is None else classes
+        self.costs = DEFAULT_COSTS if costs is None else costs
+        self.max_wait = max_wait
+        self.max_buckets = max_buckets
+        self.clock = clock
+        self.buckets: typing.Dict[typing.Tuple[str, int, str],
+                                  TokenBucket] = {}
+        self.rejected = 0
+        self.queued = 0
+        self.waiting = 0
+
+    def _bucket(self, key: typing.Tuple[str, int, str], rate: float,
+                capacity: float, now: float) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_buckets:
+                self.sweep(now)
+            bucket = self.buckets[key] = TokenBucket(rate, capacity, now)
+        return bucket
+
+    def sweep(self, now: float) -> int:
+        """sweep -> Forget buckets that have refilled, a fresh bucket would be identical"""
+        full = []
+        for key, bucket in self.buckets.items():
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                full.append(key)
+        for key in full:
+            del self.buckets[key]
+        return len(full)
+
+    def reserve(self, command: str, user_id: int,
+                guild_id: typing.Optional[int]) -> float:
+        """reserve -> Charge a command to its buckets, returning how long it has to wait
+
+        Raises RateLimitedError, without charging anything, when the wait would exceed `max_wait`"""
+        charge = self.costs.get(command)
+        if charge is None:
+            return 0.0
+
+        name, cost = charge
+        cost_class = self.classes[name]
+        now = self.clock()
+        buckets = [("user",
+                    self._bucket(("user", user_id, name), cost_class.user_rate,
+                                 cost_class.user_burst, now))]
+        if guild_id is not None:
+            buckets.append(
+                ("guild",
+                 self._bucket(("guild", guild_id, name),
+                              cost_class.guild_rate, cost_class.guild_burst,
+                              now)))
+
+        scope, delay = max(((scope, bucket.delay(cost, now))
+                            for scope, bucket in buckets),
+                           key=lambda pair: pair[1])
+        if delay > self.max_wait:
+            self.rejected += 1
+            admission_rejected.inc(scope=scope, cost_class=name)
+            raise RateLimitedError(scope, delay)
+
+        for _, bucket in buckets:
+            bucket.tokens -= cost
+        if delay:
+            self.queued += 1
+            admission_queued.inc(cost_class=name)
+        return delay
+
+    async def admit(self, ctx) -> None:
+        """**`[coroutine]`** admit -> Wait until the invoking command may run, or raise RateLimitedError"""
+        delay = self.reserve(ctx.command.qualified_name, ctx.author.id,
+                             ctx.guild.id if ctx.guild is not None else None)
+        if not delay:
+            return
+
+        self.waiting += 1
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.waiting -= 1
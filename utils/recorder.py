@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import dataclasses
+import re
+import time
+import typing
+
+import msgpack
+import rethinkdb.ast
+import rethinkdb.net
+
+from utils.prefix import PrefixMatcher
+
+CAPTURE_VERSION = 1
+
+# Chatty events that say nothing about how commands perform
+IGNORED_EVENTS = {"PRESENCE_UPDATE", "TYPING_START"}
+
+# Fields that identify a person rather than describe traffic
+PERSONAL_FIELDS = {
+    "username", "global_name", "nick", "avatar", "banner", "email",
+    "discriminator", "name"
+}
+SECRET_FIELDS = {"token", "session_id", "_trace"}
+
+SNOWFLAKE = re.compile(r"(?<!\d)\d{15,20}(?!\d)")
+
+# Fake snowflakes stay 18 digits long so mentions and converters still parse them
+FAKE_SNOWFLAKE_BASE = 100000000000000000
+
+
+@dataclasses.dataclass
+class Record:
+    """Record -> One gateway dispatch or backend response in a capture"""
+    at: float
+    kind: str
+    key: str
+    data: typing.Any
+    duration: float = 0.0
+
+
+class ReplayedError(Exception):
+    """ReplayedError -> Stands in for whatever a backend raised while it was recorded"""
+    def __init__(self, name: str, message: str) -> None:
+        super().__init__("%s: %s" % (name, message))
+        self.name = name
+
+
+class RecordedCursor(list):
+    """RecordedCursor -> A drained RethinkDB cursor that can still be iterated with `async for`"""
+    async def __aiter__(self):
+        for document in self:
+            yield document
+
+
+class Anonymizer:
+    """Anonymizer -> Swaps snowflakes and names for stable fakes, the same input always maps to the same fake"""
+    def __init__(self) -> None:
+        self.snowflakes: typing.Dict[int, int] = {}
+        self.names: typing.Dict[str, str] = {}
+
+    def snowflake(self, value: int) -> int:
+        if value not in self.snowflakes:
+            self.snowflakes[value] = FAKE_SNOWFLAKE_BASE + len(self.snowflakes)
+        return self.snowflakes[value]
+
+    def text(self, value: str) -> str:
+        return SNOWFLAKE.sub(lambda match: str(self.snowflake(int(match[0]))),
+                             value)
+
+    def name(self, value: str) -> str:
+        if value not in self.names:
+            self.names[value] = "anonymous-%d" % len(self.names)
+        return self.names[value]
+
+    def __call__(self, value: typing.Any) -> typing.Any:
+        if isinstance(value, dict):
+            return {key: self._field(key, item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self(item) for item in value]
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, int) and 10**14 < value < 10**20:
+            return self.snowflake(value)
+        if isinstance(value, str):
+            return self.text(value)
+        return value
+
+    def _field(self, key: str, value: typing.Any) -> typing.Any:
+        if key in SECRET_FIELDS and isinstance(value, str):
+            return "redacted"
+        if key in PERSONAL_FIELDS and isinstance(value, str):
+            return self.name(value)
+        return self(value)
+
+
+def _default(value: typing.Any) -> typing.Any:
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, "_asdict"):
+        return value._asdict()
+    return str(value)
+
+
+def query_key(query: rethinkdb.ast.RqlQuery) -> str:
+    """query_key -> What a ReQL query is recorded under
+
+    Writes carry timestamps, case IDs and system stats that never repeat, so only their target counts"""
+    if isinstance(query, (rethinkdb.ast.Insert, rethinkdb.ast.Update,
+                          rethinkdb.ast.Delete)):
+        return "%s.%s(...)" % (query._args[0], type(query).__name__.lower())
+    return str(query)
+
+
+class Recorder:
+    """Recorder -> Appends anonymized gateway dispatches and backend responses to a msgpack capture
+
+    Message content is only kept for messages that start with their guild's prefix or mention the bot"""
+    def __init__(self,
+                 path: str,
+                 prefixes: typing.Optional[PrefixMatcher] = None) -> None:
+        self.path = path
+        self.prefixes = prefixes or PrefixMatcher("dj;")
+        self.anonymizer = Anonymizer()
+        self.user_id: typing.Optional[str] = None
+        self.records = 0
+        self.started = time.perf_counter()
+        self._packer = msgpack.Packer(default=_default,
+                                      use_bin_type=True,
+                                      datetime=True)
+        self._file = open(path, "wb")
+        self._write("header", "", {
+            "version": CAPTURE_VERSION,
+            "recorded_at": time.time()
+        })
+
+    async def gateway(self, payload: dict) -> None:
+        """**`[coroutine]`** gateway -> `on_socket_response` listener recording every dispatch"""
+        if payload.get("op") != 0 or payload.get("t") in IGNORED_EVENTS:
+            return
+
+        data = payload.get("d")
+        if payload["t"] == "READY":
+            self.user_id = data["user"]["id"]
+        if payload["t"] in ("MESSAGE_CREATE",
+                            "MESSAGE_UPDATE") and "content" in data:
+            data = dict(data)
+            data["content"] = self._content(
+                data["content"],
+                int(data["guild_id"]) if data.get("guild_id") else None)
+        self._write("gateway", payload["t"], self.anonymizer(data))
+
+    def backend(self, kind: str, key: str, data: typing.Any,
+                duration: float) -> None:
+        self._write(kind, self.anonymizer.text(key), self.anonymizer(data),
+                    duration)
+
+    def _content(self, content: str, guild_id: typing.Optional[int]) -> str:
+        if self.prefixes.match(content, guild_id) is not None or (
+                self.user_id is not None and self.user_id in content):
+            return content
+        # Keep the shape of the conversation without what was said
+        return "x" * len(content)
+
+    def _write(self,
+               kind: str,
+               key: str,
+               data: typing.Any,
+               duration: float = 0.0) -> None:
+        self._file.write(
+            self._packer.pack([
+                time.perf_counter() - self.started, kind, key, data, duration
+            ]))
+        self.records += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+active: typing.Optional[Recorder] = None
+
+
+def start(path: str,
+          prefixes: typing.Optional[PrefixMatcher] = None) -> Recorder:
+    """start -> Begin recording into `path`, every capture point writes to it until `stop`"""
+    global active
+    stop()
+    active = Recorder(path, prefixes)
+    return active
+
+
+def stop() -> None:
+    global active
+    if active is not None:
+        active.close()
+        active = None
+
+
+async def capture(kind: str, key: str, awaitable: typing.Awaitable) -> typing.Any:
+    """**`[coroutine]`** capture -> Await a backend call, recording its response (or error) when recording"""
+    if active is None:
+        return await awaitable
+
+    recorder = active
+    started = time.perf_counter()
+    try:
+        response = await awaitable
+    except Exception as error:
+        recorder.backend(kind, key, {
+            "__error__": type(error).__name__,
+            "message": str(error)
+        }, time.perf_counter() - started)
+        raise
+
+    recorder.backend(kind, key, response, time.perf_counter() - started)
+    return response
+
+
+def read(path: str) -> typing.Iterator[Record]:
+    """read -> Stream the records of a capture back, header included"""
+    with open(path, "rb") as file:
+        for item in msgpack.Unpacker(file, raw=False, timestamp=3):
+            yield Record(*item)
+
+
+def unwrap(data: typing.Any) -> typing.Any:
+    """unwrap -> Give back a recorded response, raising it again if it was an error"""
+    if isinstance(data, dict) and "__error__" in data:
+        raise ReplayedError(data["__error__"], data["message"])
+    return data
+
+
+def _streams(term: typing.Any) -> bool:
+    if isinstance(term, rethinkdb.ast.Changes):
+        return True
+    return isinstance(term, rethinkdb.ast.RqlQuery) and any(
+        _streams(arg) for arg in term._args)
+
+
+class RecordingRethinkDB:
+    """RecordingRethinkDB -> Wraps a RethinkDB connection, recording every query's result
+
+    Cursors are drained before they're recorded, fine for the table sizes the bot reads.
+    Changefeeds never end, they're passed through without being recorded"""
+    def __init__(self, connection: rethinkdb.net.Connection) -> None:
+        self.connection = connection
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self.connection, name)
+
+    async def _start(self, term: rethinkdb.ast.RqlQuery,
+                     **global_optargs) -> typing.Any:
+        if _streams(term):
+            return await self.connection._start(term, **global_optargs)
+        return await capture("rethinkdb", query_key(term),
+                             self._run(term, **global_optargs))
+
+    async def _run(self, term: rethinkdb.ast.RqlQuery,
+                   **global_optargs) -> typing.Any:
+        result = await self.connection._start(term, **global_optargs)
+        if isinstance(result, rethinkdb.net.Cursor):
+            return RecordedCursor([document async for document in result])
+        return result
+
+
+class RecordingPostgres:
+    """RecordingPostgres -> Wraps an asyncpg connection, recording what the bot's statements return"""
+    def __init__(self, connection) -> None:
+        self.connection = connection
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self.connection, name)
+
+    async def execute(self, query: str, *args, **kwargs) -> str:
+        return await capture("postgresql", "%s %r" % (query, args),
+                             self.connection.execute(query, *args, **kwargs))
+
+    async def fetch(self, query: str, *args, **kwargs) -> list:
+        return await capture(
+            "postgresql", "%s %r" % (query, args),
+            self._rows(self.connection.fetch(query, *args, **kwargs)))
+
+    async def fetchrow(self, query: str, *args,
+                       **kwargs) -> typing.Optional[dict]:
+        return await capture(
+            "postgresql", "%s %r" % (query, args),
+            self._row(self.connection.fetchrow(query, *args, **kwargs)))
+
+    async def _rows(self, awaitable: typing.Awaitable) -> typing.List[dict]:
+        return [dict(record) for record in await awaitable]
+
+    async def _row(self, awaitable: typing.Awaitable) -> typing.Optional[dict]:
+        record = await awaitable
+        return dict(record) if record is not None else None
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import datetime
+import typing
+
+import discord.ext.commands
+import rethinkdb
+import rethinkdb.ast
+
+from utils import metrics
+from utils.objects import LogOpcodes
+
+LOGS_TABLE = "logs"
+ROLLUPS_TABLE = "log_rollups"
+
+# Secondary indexes the retention queries range over
+LOGGED_AT_INDEX = "logged_at"
+BUCKET_INDEX = "granularity_bucket"
+
+GRANULARITIES = {"minute": 60, "hour": 3600}
+
+# Most minutes rolled up in one pass, a long outage is caught up on over several passes
+MAX_MINUTES_PER_PASS = 120
+
+COMMAND_OPS = (LogOpcodes.before_command_invoke, LogOpcodes.before_cog_invoke)
+
+logs_deleted = metrics.registry.register(
+    metrics.Counter("djdiscord_retention_deleted_total",
+                    "Expired rows deleted by log retention", ["table"]))
+
+r = rethinkdb.r
+
+
+def floor(moment: datetime.datetime, seconds: int) -> datetime.datetime:
+    """floor -> Start of the `seconds` long bucket `moment` falls in"""
+    epoch = moment.timestamp()
+    return datetime.datetime.fromtimestamp(epoch - epoch % seconds,
+                                           datetime.timezone.utc)
+
+
+def _rollup(granularity: str, bucket: datetime.datetime) -> dict:
+    return {
+        "id": "%s-%d" % (granularity, bucket.timestamp()),
+        "granularity": granularity,
+        "bucket": bucket,
+        "invocations": 0,
+        "errors": 0,
+        "commands": {},
+        "samples": 0,
+        "cpu": 0.0,
+        "ram": 0.0,
+    }
+
+
+def _average(rollup: dict, samples: int, cpu: float, ram: float) -> None:
+    total = rollup["samples"] + samples
+    if not total:
+        return
+    rollup["cpu"] = (rollup["cpu"] * rollup["samples"] + cpu * samples) / total
+    rollup["ram"] = (rollup["ram"] * rollup["samples"] + ram * samples) / total
+    rollup["samples"] = total
+
+
+def fold_logs(logs: typing.Iterable[dict]) -> typing.List[dict]:
+    """fold_logs -> Per-minute rollups of raw log documents"""
+    rollups: typing.Dict[datetime.datetime, dict] = {}
+    for log in logs:
+        bucket = floor(log["logged_at"], GRANULARITIES["minute"])
+        rollup = rollups.get(bucket)
+        if rollup is None:
+            rollup = rollups[bucket] = _rollup("minute", bucket)
+
+        if log.get("op") == LogOpcodes.error:
+            rollup["errors"] += 1
+        elif log.get("op") in COMMAND_OPS:
+            rollup["invocations"] += 1
+            if command := log.get("command"):
+                rollup["commands"][command] = rollup["commands"].get(
+                    command, 0) + 1
+
+        if system := log.get("system_info"):
+            _average(rollup, 1, system.get("cpu", 0.0), system.get("ram", 0.0))
+
+    return [rollups[bucket] for bucket in sorted(rollups)]
+
+
+def fold_rollups(rollups: typing.Iterable[dict],
+                 granularity: str) -> typing.List[dict]:
+    """fold_rollups -> Coarser rollups out of finer ones, averages stay weighted by sample count"""
+    seconds = GRANULARITIES[granularity]
+    folded: typing.Dict[datetime.datetime, dict] = {}
+    for rollup in rollups:
+        bucket = floor(rollup["bucket"], seconds)
+        coarse = folded.get(bucket)
+        if coarse is None:
+            coarse = folded[bucket] = _rollup(granularity, bucket)
+
+        coarse["invocations"] += rollup["invocations"]
+        coarse["errors"] += rollup["errors"]
+        commands = collections.Counter(coarse["commands"])
+        commands.update(rollup["commands"])
+        coarse["commands"] = dict(commands)
+        _average(coarse, rollup["samples"], rollup["cpu"], rollup["ram"])
+
+    return [folded[bucket] for bucket in sorted(folded)]
+
+
+class LogRetention:
+    """LogRetention -> Rolls raw logs up per minute and hour, then deletes what has expired
+
+    Raw logs are only deleted once they're older than `retention` and already rolled up.
+    Deletes go through the `logged_at` index `batch_size` rows at a time with `batch_delay`
+    seconds between batches, so cleaning up a backlog never monopolises the database"""
+    def __init__(self,
+                 bot: discord.ext.commands.Bot,
+                 retention: float = 7 * 86400,
+                 minute_retention: float = 30 * 86400,
+                 hour_retention: float = 365 * 86400,
+                 interval: float = 300.0,
+                 batch_size: int = 500,
+                 batch_delay: float = 0.5) -> None:
+        self.bot = bot
+        self.retention = retention
+        self.rollup_retention = {
+            "minute": minute_retention,
+            "hour": hour_retention
+        }
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.rolled_up_to: typing.Optional[datetime.datetime] = None
+        self._task: typing.Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        await self.bot.wait_until_ready()
+        try:
+            await self.ensure_indexes()
+        except Exception as error:
+            print("Failed to create the log retention indexes: %r" % error)
+            return
+
+        while not self.bot.is_closed():
+            try:
+                await self.run_once()
+            except Exception as error:
+                print("Failed to roll up or expire logs: %r" % error)
+            await asyncio.sleep(self.interval)
+
+    async def ensure_indexes(self) -> None:
+        """**`[coroutine]`** ensure_indexes -> Create the rollup table and the indexes retention ranges over"""
+        database = self.bot.database
+        if ROLLUPS_TABLE not in await database.run(r.table_list()):
+            await database.run(r.table_create(ROLLUPS_TABLE))
+
+        if LOGGED_AT_INDEX not in await database.run(
+                r.table(LOGS_TABLE).index_list()):
+            await database.run(
+                r.table(LOGS_TABLE).index_create(LOGGED_AT_INDEX))
+        if BUCKET_INDEX not in await database.run(
+                r.table(ROLLUPS_TABLE).index_list()):
+            await database.run(
+                r.table(ROLLUPS_TABLE).index_create(
+                    BUCKET_INDEX, [r.row["granularity"], r.row["bucket"]]))
+
+        await database.run(r.table(LOGS_TABLE).index_wait(LOGGED_AT_INDEX))
+        await database.run(r.table(ROLLUPS_TABLE).index_wait(BUCKET_INDEX))
+
+    async def run_once(self) -> typing.Dict[str, int]:
+        """**`[coroutine]`** run_once -> Roll up what's new, then delete expired logs and rollups"""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        await self.roll_up(now)
+
+        deleted = {}
+        cutoff = now - datetime.timedelta(seconds=self.retention)
+        if self.rolled_up_to is not None:
+            # Never delete logs the rollups haven't seen yet
+            cutoff = min(cutoff, self.rolled_up_to)
+        deleted[LOGS_TABLE] = await self.delete_expired(
+            r.table(LOGS_TABLE).between(r.minval, cutoff,
+                                        index=LOGGED_AT_INDEX), LOGS_TABLE)
+
+        for granularity, retention in self.rollup_retention.items():
+            cutoff = now - datetime.timedelta(seconds=retention)
+            deleted[ROLLUPS_TABLE] = deleted.get(
+                ROLLUPS_TABLE, 0) + await self.delete_expired(
+                    r.table(ROLLUPS_TABLE).between([granularity, r.minval],
+                                                   [granularity, cutoff],
+                                                   index=BUCKET_INDEX),
+                    ROLLUPS_TABLE)
+        return deleted
+
+    async def _watermark(self, now: datetime.datetime) -> datetime.datetime:
+        latest = [
+            rollup async for rollup in await self.bot.database.run(
+                r.table(ROLLUPS_TABLE).between(
+                    ["minute", r.minval], ["minute", r.maxval],
+                    index=BUCKET_INDEX).order_by(
+                        index=r.desc(BUCKET_INDEX)).limit(1))
+        ]
+        if latest:
+            return latest[0]["bucket"] + datetime.timedelta(
+                seconds=GRANULARITIES["minute"])
+
+        oldest = [
+            log async for log in await self.bot.database.run(
+                r.table(LOGS_TABLE).order_by(
+                    index=LOGGED_AT_INDEX).limit(1).pluck("logged_at"))
+        ]
+        return floor(oldest[0]["logged_at"] if oldest else now,
+                     GRANULARITIES["minute"])
+
+    async def roll_up(self, now: datetime.datetime) -> int:
+        """**`[coroutine]`** roll_up -> Build rollups for every finished minute (and hour) since the last pass"""
+        if self.rolled_up_to is None:
+            self.rolled_up_to = await self._watermark(now)
+
+        start = self.rolled_up_to
+        end = min(floor(now, GRANULARITIES["minute"]),
+                  start + datetime.timedelta(minutes=MAX_MINUTES_PER_PASS))
+        if end <= start:
+            return 0
+
+        # Only what the rollups need crosses the wire, not tracebacks
+        logs = [
+            log async for log in await self.bot.database.run(
+                r.table(LOGS_TABLE).between(
+                    start, end, index=LOGGED_AT_INDEX).pluck(
+                        "op", "command", "logged_at",
+                        {"system_info": ["cpu", "ram"]}))
+        ]
+        minutes = fold_logs(logs)
+        if minutes:
+            await self.bot.database.run(
+                r.table(ROLLUPS_TABLE).insert(minutes, conflict="replace"))
+
+        # Hours that ended inside this pass are complete now, fold their minutes up
+        hour = GRANULARITIES["hour"]
+        for bucket in range(
+                int(floor(start, hour).timestamp()),
+                int(floor(end, hour).timestamp()), hour):
+            bucket = datetime.datetime.fromtimestamp(bucket,
+                                                     datetime.timezone.utc)
+            minutes_of_hour = [
+                rollup async for rollup in await self.bot.database.run(
+                    r.table(ROLLUPS_TABLE).between(
+                        ["minute", bucket],
+                        ["minute", bucket + datetime.timedelta(seconds=hour)],
+                        index=BUCKET_INDEX))
+            ]
+            hours = fold_rollups(minutes_of_hour, "hour")
+            if hours:
+                await self.bot.database.run(
+                    r.table(ROLLUPS_TABLE).insert(hours, conflict="replace"))
+
+        self.rolled_up_to = end
+        return len(minutes)
+
+    async def delete_expired(self, selection: rethinkdb.ast.RqlQuery,
+                             table: str) -> int:
+        """**`[coroutine]`** delete_expired -> Delete a range in throttled batches, returning how many rows went"""
+        deleted = 0
+        while True:
+            result = await self.bot.database.run(
+                selection.limit(self.batch_size).delete(durability="soft"))
+            deleted += result.deleted
+            logs_deleted.inc(result.deleted, table=table)
+            if result.deleted < self.batch_size:
+                return deleted
+            await asyncio.sleep(self.batch_delay)
@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import asyncio
+import typing
+from dataclasses import dataclass
+
+import discord.ext.commands
+import lavalink
+import rethinkdb
+
+from utils.objects import TrackMeta
+
+SNAPSHOT_TABLE = "player_snapshots"
+
+# 1: tracks kept the `raw_info` dict they were queued with, 2: a compact TrackMeta as `meta`
+SNAPSHOT_VERSION = 2
+
+
+@dataclass
+class PlayerSnapshot:
+    id: int
+    voice_channel: int
+    text_channel: typing.Optional[int]
+    queue: typing.List[dict]
+    position: int
+    volume: int
+    equalizer: typing.List[float]
+    repeat: bool
+    paused: bool
+    version: int = SNAPSHOT_VERSION
+
+    @property
+    def json(self) -> dict:
+        return {
+            "id": self.id,
+            "voice_channel": self.voice_channel,
+            "text_channel": self.text_channel,
+            "queue": self.queue,
+            "position": self.position,
+            "volume": self.volume,
+            "equalizer": self.equalizer,
+            "repeat": self.repeat,
+            "paused": self.paused,
+            "version": self.version,
+        }
+
+    @staticmethod
+    def from_json(_dict: dict) -> PlayerSnapshot:
+        return PlayerSnapshot(_dict["id"], _dict["voice_channel"],
+                              _dict.get("text_channel"), _dict["queue"],
+                              _dict.get("position", 0),
+                              _dict.get("volume", 100),
+                              _dict.get("equalizer", [0.0] * 15),
+                              _dict.get("repeat", False),
+                              _dict.get("paused", False),
+                              _dict.get("version", 1))
+
+    @staticmethod
+    def from_player(player: lavalink.DefaultPlayer) -> PlayerSnapshot:
+        tracks = [player.current] if player.current is not None else []
+        tracks.extend(player.queue)
+
+        return PlayerSnapshot(player.guild_id, int(player.channel_id),
+                              player.fetch("channel"),
+                              [encode_track(track) for track in tracks],
+                              int(player.position), player.volume,
+                              list(player.equalizer), player.repeat,
+                              player.paused)
+
+
+def encode_track(track: lavalink.AudioTrack) -> dict:
+    return {
+        "track": track.track,
+        "requester": track.requester,
+        "info": {
+            "identifier": track.identifier,
+            "isSeekable": track.is_seekable,
+            "author": track.author,
+            "length": track.duration,
+            "isStream": track.stream,
+            "title": track.title,
+            "uri": track.uri,
+        },
+        "meta": track.extra["meta"].json,
+    }
+
+
+def _meta_from_raw_info(raw_info: dict, duration: int) -> TrackMeta:
+    if "call_sign" in raw_info:
+        return TrackMeta(raw_info["call_sign"], str(raw_info["frequency"]),
+                         raw_info["url"], raw_info.get("thumbnail"),
+                         duration, TrackMeta.STATION)
+    return TrackMeta.from_song(raw_info, duration)
+
+
+def decode_track(_dict: dict,
+                 version: int = SNAPSHOT_VERSION) -> lavalink.AudioTrack:
+    if version < 2:
+        meta = _meta_from_raw_info(_dict["raw_info"], _dict["info"]["length"])
+    else:
+        meta = TrackMeta.from_json(_dict["meta"])
+    return lavalink.AudioTrack(_dict, _dict["requester"], meta=meta)
+
+
+def fingerprint(player: lavalink.DefaultPlayer) -> int:
+    """fingerprint -> Hash of everything in a snapshot but the position, which moves on every flush"""
+    return hash((
+        player.channel_id,
+        player.fetch("channel"),
+        player.current.track if player.current is not None else None,
+        tuple(track.track for track in player.queue),
+        player.volume,
+        tuple(player.equalizer),
+        player.repeat,
+        player.paused,
+    ))
+
+
+class PlayerSnapshotManager:
+    """PlayerSnapshotManager -> Periodically persists player state and restores it on startup"""
+    def __init__(self,
+                 bot: discord.ext.commands.Bot,
+                 interval: float = 30.0,
+                 concurrency: int = 4,
+                 spacing: float = 0.5) -> None:
+        self.bot = bot
+        self.interval = interval
+        self.concurrency = concurrency
+        self.spacing = spacing
+        self._fingerprints: typing.Dict[int, int] = {}
+        self._positions: typing.Dict[int, int] = {}
+        self._task: typing.Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        await self.bot.wait_until_ready()
+        while not self.bot.is_closed():
+            try:
+                await self.flush()
+            except Exception as error:
+                print("Failed to write player snapshots: %r" % error)
+            await asyncio.sleep(self.interval)
+
+    async def flush(self) -> int:
+        """**`[coroutine]`** flush -> Write snapshots for every guild whose player changed since the last flush
+
+        Players that only moved along their track get their position field updated, not a new snapshot"""
+        changed = []
+        moved = []
+        active = set()
+
+        for guild_id, player in self.bot.lavalink.player_manager.players.items():
+            if not player.is_connected or (player.current is None
+                                           and not player.queue):
+                continue
+
+            active.add(guild_id)
+            digest = fingerprint(player)
+            position = int(player.position)
+            if self._fingerprints.get(guild_id) == digest:
+                if self._positions.get(guild_id) != position:
+                    self._positions[guild_id] = position
+                    moved.append({"id": guild_id, "position": position})
+                continue
+
+            self._fingerprints[guild_id] = digest
+            self._positions[guild_id] = position
+            changed.append(PlayerSnapshot.from_player(player).json)
+
+        stale = [
+            guild_id for guild_id in self._fingerprints
+            if guild_id not in active
+        ]
+        for guild_id in stale:
+            del self._fingerprints[guild_id]
+            self._positions.pop(guild_id, None)
+
+        if changed:
+            await self.bot.database.run(
+                rethinkdb.r.table(SNAPSHOT_TABLE).insert(changed,
+                                                         conflict="replace"))
+
+        if moved:
+            await self.bot.database.run(
+                rethinkdb.r.table(SNAPSHOT_TABLE).insert(moved,
+                                                         conflict="update"))
+
+        if stale:
+            await self.bot.database.run(
+                rethinkdb.r.table(SNAPSHOT_TABLE).get_all(*stale).delete())
+
+        return len(changed)
+
+    async def resume(self) -> int:
+        """**`[coroutine]`** resume -> Rejoin and restart every persisted session"""
+        snapshots = [
+            PlayerSnapshot.from_json(document) async for document in await
+            self.bot.database.run(rethinkdb.r.table(SNAPSHOT_TABLE))
+        ]
+
+        if not snapshots:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*(self._resume_one(snapshot, semaphore)
+                                         for snapshot in snapshots),
+                                       return_exceptions=True)
+
+        failed = []
+        for snapshot, result in zip(snapshots, results):
+            if result is True:
+                continue
+            failed.append(snapshot.id)
+            if isinstance(result, Exception):
+                print("Failed to resume the player in %d: %r" %
+                      (snapshot.id, result))
+        if failed:
+            await self.bot.database.run(
+                rethinkdb.r.table(SNAPSHOT_TABLE).get_all(*failed).delete())
+
+        return len(snapshots) - len(failed)
+
+    async def _resume_one(self, snapshot: PlayerSnapshot,
+                          semaphore: asyncio.Semaphore) -> bool:
+        guild = self.bot.get_guild(snapshot.id)
+        if guild is None or guild.get_channel(snapshot.voice_channel) is None:
+            return False
+
+        if not snapshot.queue:
+            return False
+
+        # Holding the semaphore through the sleep caps voice state updates at
+        # `concurrency` per `spacing` seconds so we don't stampede the gateway
+        async with semaphore:
+            player = self.bot.lavalink.player_manager.create(
+                guild.id, endpoint=str(guild.region))
+            ws = self.bot._connection._get_websocket(guild.id)
+            await ws.voice_state(str(guild.id), str(snapshot.voice_channel))
+            await asyncio.sleep(self.spacing)
+
+        for _ in range(20):
+            if player.is_connected:
+                break
+            await asyncio.sleep(0.5)
+        else:
+            return False
+
+        tracks = [
+            decode_track(track, snapshot.version) for track in snapshot.queue
+        ]
+
+        player.store("channel", snapshot.text_channel)
+        for track in tracks[1:]:
+            player.add(requester=track.requester, track=track)
+
+        await player.set_volume(snapshot.volume)
+        if any(snapshot.equalizer):
+            await player.set_gains(*enumerate(snapshot.equalizer))
+        player.set_repeat(snapshot.repeat)
+
+        await player.play(tracks[0], start_time=snapshot.position)
+        if snapshot.paused:
+            await player.set_pause(True)
+
+        self._fingerprints[snapshot.id] = fingerprint(player)
+        self._positions[snapshot.id] = snapshot.position
+        return True
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import typing
+
+import async_spotify
+
+from utils import recorder
+from utils.breaker import CircuitBreaker, http_status
+from utils.cache import SingleFlight, TTLCache
+from utils.exceptions import CircuitOpenError, NoResultsError
+
+spotify_url = re.compile(
+    r"^https:\/\/open\.spotify\.com\/(?P<kind>track|playlist|album)\/(?P<id>[a-zA-Z0-9]+)"
+)
+
+# Spotify IDs are 22 base62 characters, anything else fails the whole batch it's sent in
+track_id_pattern = re.compile(r"^[0-9A-Za-z]{22}$")
+
+# The largest page size each endpoint accepts
+page_sizes = {
+    "playlist": 100,
+    "album": 50,
+}
+
+# Client credential tokens live for an hour, refresh them a minute early
+TOKEN_LIFETIME = 3600
+TOKEN_MARGIN = 60
+
+# Used when a 429 doesn't tell us how long to back off for
+DEFAULT_RETRY_AFTER = 1.0
+
+
+def parse_url(url: str) -> typing.Optional[typing.Tuple[str, str]]:
+    if match := spotify_url.match(url):
+        return match.group("kind"), match.group("id")
+
+
+def _retry_after(error: Exception) -> typing.Optional[float]:
+    if (retry_after := getattr(error, "retry_after", None)) is not None:
+        return float(retry_after)
+
+    get_json = getattr(error, "get_json", None)
+    if get_json is None:
+        return None
+
+    payload = get_json() or {}
+    if payload.get("error", {}).get("status") == 429:
+        return float(payload.get("retry_after", DEFAULT_RETRY_AFTER))
+
+
+class SpotifyMetadata:
+    """SpotifyMetadata -> Cached, batched access to the Spotify Web API
+
+    Concurrent `track` lookups issued within `batch_delay` seconds of each other are
+    folded into a single several-tracks request of up to `batch_size` IDs"""
+    def __init__(self,
+                 client: async_spotify.SpotifyApiClient,
+                 ttl: float = 3600.0,
+                 batch_size: int = 50,
+                 batch_delay: float = 0.05,
+                 resolutions: typing.Optional[SingleFlight] = None,
+                 breaker: typing.Optional[CircuitBreaker] = None,
+                 negative: typing.Optional[TTLCache] = None) -> None:
+        self.client = client
+        self.resolutions = resolutions or SingleFlight()
+        self.breaker = breaker
+        self.tracks = TTLCache(ttl, maxsize=8192)
+        # Track IDs Spotify had nothing for, shared with the bot's other negative results
+        self.missing = negative if negative is not None else TTLCache(
+            60.0, maxsize=1024)
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.requests = 0
+        self.throttled = 0
+        self._futures: typing.Dict[str, asyncio.Future] = {}
+        self._pending: typing.List[str] = []
+        self._flush_handle: typing.Optional[asyncio.TimerHandle] = None
+        self._token_expires = 0.0
+        self._blocked_until = 0.0
+        self._token_lock: typing.Optional[asyncio.Lock] = None
+
+    async def track(self, track_id: str) -> dict:
+        """**`[coroutine]`** track -> Fetch a track, from the cache if it's fresh"""
+        if (track := self.tracks.get(track_id)) is not None:
+            return track
+
+        if (not track_id_pattern.match(track_id)
+                or ("spotify", track_id) in self.missing):
+            raise NoResultsError(track_id)
+
+        return await self.resolutions.do("spotify", track_id, self._lookup,
+                                         track_id)
+
+    async def _lookup(self, track_id: str) -> dict:
+        loop = asyncio.get_event_loop()
+        future = self._futures.get(track_id)
+        if future is None:
+            future = self._futures[track_id] = loop.create_future()
+            self._pending.append(track_id)
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.batch_delay,
+                                                     self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        pending, self._pending = self._pending, []
+        for index in range(0, len(pending), self.batch_size):
+            asyncio.ensure_future(
+                self._fetch({
+                    track_id: self._futures[track_id]
+                    for track_id in pending[index:index + self.batch_size]
+                }))
+
+    async def _fetch(self, batch: typing.Dict[str, asyncio.Future]) -> None:
+        try:
+            await self._resolve(batch)
+        finally:
+            for track_id in batch:
+                self._futures.pop(track_id, None)
+
+    async def _resolve(self, batch: typing.Dict[str, asyncio.Future]) -> None:
+        try:
+            response = await self._request(self.client.track.get_several,
+                                           list(batch))
+        except Exception as error:
+            status = http_status(error)
+            if status is not None and 400 <= status < 500 and status != 429:
+                if len(batch) > 1:
+                    # Whatever Spotify objected to, it shouldn't fail everybody else's lookup
+                    await asyncio.gather(*(self._resolve({track_id: future})
+                                           for track_id, future in batch.items()))
+                    return
+                track_id, future = next(iter(batch.items()))
+                self.missing.set(("spotify", track_id), True)
+                error = NoResultsError(track_id)
+
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for track in response["tracks"]:
+            if track is None:
+                continue
+            self.tracks.set(track["id"], track)
+            if (future := batch.get(track["id"])) is not None and not future.done():
+                future.set_result(track)
+
+        for track_id, future in batch.items():
+            if not future.done():
+                self.missing.set(("spotify", track_id), True)
+                future.set_exception(NoResultsError(track_id))
+
+    async def pages(
+        self, kind: str, _id: str
+    ) -> typing.AsyncIterator[typing.Tuple[int, typing.List[dict]]]:
+        """**`[async iterator]`** pages -> Yield (total, tracks) for every page of a playlist or album"""
+        offset = 0
+        while True:
+            if kind == "playlist":
+                page = await self._request(self.client.playlists.get_tracks,
+                                           _id,
+                                           limit=page_sizes[kind],
+                                           offset=offset)
+                tracks = [
+                    item["track"] for item in page["items"]
+                    if item.get("track") is not None
+                ]
+            elif kind == "album":
+                page = await self._request(self.client.albums.get_tracks,
+                                           _id,
+                                           limit=page_sizes[kind],
+                                           offset=offset)
+                tracks = page["items"]
+            else:
+                raise ValueError("Cannot page through a Spotify %s" % kind)
+
+            for track in tracks:
+                if track.get("id") is not None:
+                    self.tracks.set(track["id"], track)
+
+            yield page["total"], tracks
+
+            offset += len(page["items"])
+            if page.get("next") is None or not page["items"]:
+                return
+
+    async def _request(self, method: typing.Callable[..., typing.Awaitable],
+                       *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        for attempt in range(3):
+            if (delay := self._blocked_until - loop.time()) > 0:
+                await asyncio.sleep(delay)
+
+            await self._ensure_token()
+            self.requests += 1
+            try:
+                if self.breaker is None:
+                    call = method(*args, **kwargs)
+                else:
+                    call = self.breaker.call(method, *args, **kwargs)
+                return await recorder.capture(
+                    "spotify", "%s %r %r" % (method.__name__, args, kwargs),
+                    call)
+            except CircuitOpenError:
+                raise
+            except Exception as error:
+                retry_after = _retry_after(error)
+                if retry_after is None or attempt == 2:
+                    raise
+
+                # Every request waits out the window, not only this one
+                self.throttled += 1
+                self._blocked_until = max(self._blocked_until,
+                                          loop.time() + retry_after)
+
+    async def _ensure_token(self) -> None:
+        loop = asyncio.get_event_loop()
+        if loop.time() < self._token_expires:
+            return
+
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+
+        async with self._token_lock:
+            if loop.time() < self._token_expires:
+                return
+
+            await self.client.get_auth_token_with_client_credentials()
+            self._token_expires = loop.time() + TOKEN_LIFETIME - TOKEN_MARGIN
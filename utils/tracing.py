@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import json
+import random
+import time
+import typing
+import uuid
+
+# (trace, span) the running code belongs to, None outside a traced command
+_current: contextvars.ContextVar[typing.Optional[typing.Tuple[
+    Trace, Span]]] = contextvars.ContextVar("djdiscord_span", default=None)
+
+
+class Span:
+    """Span -> One timed operation inside a trace"""
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "attributes",
+                 "error")
+
+    def __init__(self, name: str, parent_id: typing.Optional[str],
+                 attributes: dict) -> None:
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.end: typing.Optional[float] = None
+        self.attributes = attributes
+        self.error: typing.Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else
+                time.perf_counter()) - self.start
+
+    def json(self, origin: float) -> dict:
+        return {
+            "name": self.name,
+            "id": self.span_id,
+            "parent": self.parent_id,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Trace:
+    """Trace -> Every span recorded while handling one command"""
+    __slots__ = ("trace_id", "sampled", "started_at", "spans")
+
+    def __init__(self, sampled: bool) -> None:
+        self.trace_id = uuid.uuid4().hex
+        self.sampled = sampled
+        self.started_at = time.time()
+        self.spans: typing.List[Span] = []
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    def json(self) -> dict:
+        origin = self.root.start
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "duration_ms": round(self.root.duration * 1000, 3),
+            "sampled": self.sampled,
+            "spans": [span.json(origin) for span in self.spans],
+        }
+
+
+class _SpanContext:
+    __slots__ = ("trace", "name", "attributes", "span", "token")
+
+    def __init__(self, trace: typing.Optional[Trace], name: str,
+                 attributes: dict) -> None:
+        self.trace = trace
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> typing.Optional[Span]:
+        if self.trace is None:
+            return None
+
+        # A new trace never becomes a child of whatever the caller was doing
+        current = _current.get()
+        self.span = Span(
+            self.name, current[1].span_id
+            if current is not None and current[0] is self.trace else None,
+            self.attributes)
+        self.trace.spans.append(self.span)
+        self.token = _current.set((self.trace, self.span))
+        return self.span
+
+    def __exit__(self, kind, value, _) -> None:
+        if self.trace is None:
+            return
+
+        self.span.end = time.perf_counter()
+        if value is not None:
+            self.span.error = "%s: %s" % (kind.__name__, value)
+        _current.reset(self.token)
+
+
+class Tracer:
+    """Tracer -> Records command traces and exports the sampled or slow ones
+
+    Every span of every trace is kept in memory until the command finishes, so a command that
+    turns out to be slower than `slow_threshold` seconds is always exported in full"""
+    def __init__(self,
+                 sample_rate: float = 0.0,
+                 slow_threshold: float = 1.0,
+                 exporter: typing.Optional[typing.Callable[[dict],
+                                                           None]] = None,
+                 enabled: bool = True) -> None:
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.exporter = exporter
+        self.enabled = enabled
+        self.traces = 0
+        self.exported = 0
+        self.slow = 0
+
+    def trace(self, name: str, **attributes) -> _TraceContext:
+        """trace -> Open the root span of a new trace"""
+        return _TraceContext(self, name, attributes)
+
+    def finish(self, trace: Trace) -> None:
+        self.traces += 1
+        slow = trace.root.duration >= self.slow_threshold
+        if slow:
+            self.slow += 1
+
+        if (trace.sampled or slow) and self.exporter is not None:
+            self.exported += 1
+            self.exporter(trace.json())
+
+
+class _TraceContext(_SpanContext):
+    __slots__ = ("tracer", )
+
+    def __init__(self, tracer: Tracer, name: str, attributes: dict) -> None:
+        super().__init__(
+            Trace(random.random() < tracer.sample_rate)
+            if tracer.enabled else None, name, attributes)
+        self.tracer = tracer
+
+    def __exit__(self, kind, value, traceback) -> None:
+        super().__exit__(kind, value, traceback)
+        if self.trace is not None:
+            self.tracer.finish(self.trace)
+
+
+class JSONLinesExporter:
+    """JSONLinesExporter -> Appends finished traces to a file, one JSON document per line
+
+    Writes are batched and done in the default executor so exporting never blocks the loop"""
+    def __init__(self, path: str, flush_delay: float = 1.0) -> None:
+        self.path = path
+        self.flush_delay = flush_delay
+        self._buffer: typing.List[str] = []
+        self._flush_handle: typing.Optional[asyncio.TimerHandle] = None
+
+    def __call__(self, trace: dict) -> None:
+        self._buffer.append(json.dumps(trace, default=str))
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_event_loop().call_later(
+                self.flush_delay, self._flush)
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        lines, self._buffer = self._buffer, []
+        asyncio.get_event_loop().run_in_executor(None, self._write, lines)
+
+    def _write(self, lines: typing.List[str]) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write("".join("%s\n" % line for line in lines))
+
+
+class CollectorExporter:
+    """CollectorExporter -> POSTs batches of finished traces to an HTTP collector"""
+    def __init__(self, url: str, flush_delay: float = 1.0) -> None:
+        self.url = url
+        self.flush_delay = flush_delay
+        self._buffer: typing.List[dict] = []
+        self._flush_handle: typing.Optional[asyncio.TimerHandle] = None
+
+    def __call__(self, trace: dict) -> None:
+        self._buffer.append(trace)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_event_loop().call_later(
+                self.flush_delay, self._flush)
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        traces, self._buffer = self._buffer, []
+        asyncio.ensure_future(self._post(traces))
+
+    async def _post(self, traces: typing.List[dict]) -> None:
+        import aiohttp
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                await session.post(self.url,
+                                   data=json.dumps({"traces": traces},
+                                                   default=str),
+                                   headers={"Content-Type": "application/json"})
+        except Exception as error:
+            print("Failed to export %d trace(s): %r" % (len(traces), error))
+
+
+tracer = Tracer(enabled=False)
+
+
+def configure(sample_rate: float = 0.0,
+              slow_threshold: float = 1.0,
+              path: typing.Optional[str] = None,
+              collector: typing.Optional[str] = None) -> Tracer:
+    """configure -> Point the global tracer at a file or collector, tracing stays off without either"""
+    tracer.sample_rate = sample_rate
+    tracer.slow_threshold = slow_threshold
+    if collector:
+        tracer.exporter = CollectorExporter(collector)
+    elif path:
+        tracer.exporter = JSONLinesExporter(path)
+    else:
+        tracer.exporter = None
+    tracer.enabled = tracer.exporter is not None
+    return tracer
+
+
+def span(name: str, **attributes) -> _SpanContext:
+    """span -> Open a child span of the running trace, a no-op outside of one"""
+    current = _current.get()
+    return _SpanContext(current[0] if current is not None else None, name,
+                        attributes)
+
+
+def current_trace() -> typing.Optional[Trace]:
+    current = _current.get()
+    return current[0] if current is not None else None
+
+
+def detach(loop: asyncio.AbstractEventLoop,
+           coroutine: typing.Coroutine) -> asyncio.Task:
+    """detach -> Start a background task that isn't part of the running trace
+
+    Tasks copy the context they're created in, one outliving its command would otherwise
+    keep adding spans to a trace that has already been exported"""
+    context = contextvars.copy_context()
+    context.run(_current.set, None)
+    return context.run(loop.create_task, coroutine)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import datetime
+import typing
+
+import aiohttp
+import msgpack
+
+from utils.exceptions import PlaylistFormatError
+from utils.objects import Playlist
+
+EXPORT_FORMAT = "djdiscord/playlist"
+EXPORT_VERSION = 1
+
+# Songs are written as arrays in this order rather than maps, keys would be most of the file
+SONG_FIELDS = ("url", "title", "uploader", "source", "thumbnails", "created",
+               "length")
+
+# What each field may hold, anything else would only fail once the song is played or listed
+SONG_TYPES = {
+    "url": (str, ),
+    "title": (str, ),
+    "uploader": (str, type(None)),
+    "source": (str, ),
+    "thumbnails": (list, str),
+    "created": (datetime.datetime, str),
+    "length": (int, ),
+}
+
+# Largest upload `load_url` reads, Discord won't take bigger attachments anyway
+MAX_IMPORT_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+def _default(value: typing.Any) -> typing.Any:
+    return str(value)
+
+
+def dump(playlist: Playlist) -> bytes:
+    """dump -> A playlist as a versioned msgpack stream: a header map, then one array per song
+
+    Songs are exported with everything they were resolved to, importing them resolves nothing"""
+    packer = msgpack.Packer(default=_default, use_bin_type=True, datetime=True)
+    parts = [
+        packer.pack({
+            "format": EXPORT_FORMAT,
+            "version": EXPORT_VERSION,
+            "songs": len(playlist.songs),
+            "exported_at": datetime.datetime.now(datetime.timezone.utc),
+        })
+    ]
+    parts.extend(
+        packer.pack([document.get(field) for field in SONG_FIELDS])
+        for document in playlist.songs.json)
+    return b"".join(parts)
+
+
+class PlaylistDecoder:
+    """PlaylistDecoder -> Decodes an export fed to it chunk by chunk, as it arrives
+
+    Raises PlaylistFormatError for anything that isn't a playlist export this version can read"""
+    def __init__(self, max_size: int = MAX_IMPORT_SIZE) -> None:
+        self.header: typing.Optional[dict] = None
+        self.songs: typing.List[dict] = []
+        self.max_size = max_size
+        self.size = 0
+        self._unpacker = msgpack.Unpacker(raw=False,
+                                          timestamp=3,
+                                          max_buffer_size=max_size)
+
+    def feed(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise PlaylistFormatError("That file is too big to import")
+        self._unpacker.feed(chunk)
+
+        try:
+            for item in self._unpacker:
+                if self.header is None:
+                    self._read_header(item)
+                else:
+                    self._read_song(item)
+        except PlaylistFormatError:
+            raise
+        except (msgpack.UnpackException, ValueError):
+            raise PlaylistFormatError("That file isn't a playlist export")
+
+    def _read_header(self, item: typing.Any) -> None:
+        if not isinstance(item, dict) or item.get("format") != EXPORT_FORMAT:
+            raise PlaylistFormatError("That file isn't a playlist export")
+        if item.get("version") != EXPORT_VERSION:
+            raise PlaylistFormatError(
+                "That export is version %r, I can only import version %d" %
+                (item.get("version"), EXPORT_VERSION))
+        songs = item.get("songs")
+        if not isinstance(songs, int) or isinstance(songs, bool) or songs < 0:
+            raise PlaylistFormatError("That export has a malformed header")
+        self.header = item
+
+    def _read_song(self, item: typing.Any) -> None:
+        if not isinstance(item, list) or len(item) != len(SONG_FIELDS):
+            raise PlaylistFormatError("That export has a malformed song in it")
+        song = dict(zip(SONG_FIELDS, item))
+        for field, value in song.items():
+            if not isinstance(value, SONG_TYPES[field]) or isinstance(
+                    value, bool):
+                raise PlaylistFormatError(
+                    "That export has a song with a malformed %s" % field)
+        self.songs.append(song)
+
+    def close(self) -> typing.List[dict]:
+        """close -> The decoded songs, once the whole export has been fed"""
+        if self.header is None or len(self.songs) != self.header["songs"]:
+            raise PlaylistFormatError("That export is incomplete")
+        return self.songs
+
+
+async def load_url(url: str, max_size: int = MAX_IMPORT_SIZE) -> typing.List[dict]:
+    """**`[coroutine]`** load_url -> Download and decode an export in `CHUNK_SIZE` chunks, never holding the whole file"""
+    decoder = PlaylistDecoder(max_size)
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                decoder.feed(chunk)
+    return decoder.close()
@@ -1,3 +1,7 @@
+import asyncio
+import time
+import typing
+
 import discord.ext.commands
 
 from utils.objects import Playlist, Station
@@ -94,3 +98,98 @@ class VoiceState:
         if self.voice:
             await self.voice.disconnect()
             del self
+
+
+class PlayerReaper:
+    """PlayerReaper -> Destroys players that are idle or left alone in their voice channel"""
+    def __init__(self,
+                 bot: discord.ext.commands.Bot,
+                 idle_timeout: float = 300.0,
+                 empty_timeout: float = 60.0,
+                 interval: float = 30.0) -> None:
+        self.bot = bot
+        self.idle_timeout = idle_timeout
+        self.empty_timeout = empty_timeout
+        self.interval = interval
+        self.reaped = 0
+        # Queued and playing tracks released along with reaped players
+        self.freed_tracks = 0
+        self._idle_since: typing.Dict[int, float] = {}
+        self._task: typing.Optional[asyncio.Task] = None
+
+    @property
+    def live(self) -> int:
+        return len(self.bot.lavalink.player_manager.players)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        await self.bot.wait_until_ready()
+        while not self.bot.is_closed():
+            try:
+                await self.reap()
+            except Exception as error:
+                print("Failed to reap idle players: %r" % error)
+            await asyncio.sleep(self.interval)
+
+    def _listeners(self, player) -> int:
+        if not player.is_connected:
+            return 0
+
+        channel = self.bot.get_channel(int(player.channel_id))
+        if channel is None:
+            return 0
+
+        return sum(not member.bot for member in channel.members)
+
+    async def reap(self) -> int:
+        """**`[coroutine]`** reap -> Destroy every player that has been idle for longer than its timeout"""
+        now = time.monotonic()
+        expired = []
+
+        for guild_id, player in self.bot.lavalink.player_manager.players.items():
+            if not self._listeners(player):
+                timeout = self.empty_timeout
+            elif not player.is_playing or player.paused:
+                timeout = self.idle_timeout
+            else:
+                self._idle_since.pop(guild_id, None)
+                continue
+
+            if now - self._idle_since.setdefault(guild_id, now) >= timeout:
+                expired.append(guild_id)
+
+        if not expired:
+            return 0
+
+        freed = 0
+        for guild_id in expired:
+            freed += await self.destroy(guild_id)
+
+        self.reaped += len(expired)
+        self.freed_tracks += freed
+        print("Reaped %d idle player(s) holding %d track(s), %d live" %
+              (len(expired), freed, self.live))
+        return len(expired)
+
+    async def destroy(self, guild_id: int) -> int:
+        """**`[coroutine]`** destroy -> Disconnect from voice and release the guild's player, returning how many tracks it held"""
+        self._idle_since.pop(guild_id, None)
+        player = self.bot.lavalink.player_manager.get(guild_id)
+        if player is None:
+            return 0
+
+        tracks = len(player.queue) + (player.current is not None)
+        player.queue.clear()
+        if player.is_connected:
+            ws = self.bot._connection._get_websocket(guild_id)
+            await ws.voice_state(str(guild_id), None)
+        await self.bot.lavalink.player_manager.destroy(guild_id)
+        return tracks
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import dataclasses
+import datetime
+import sys
+import threading
+import time
+import traceback
+import typing
+
+from utils import metrics
+
+loop_stalls = metrics.registry.register(
+    metrics.Counter("djdiscord_event_loop_stalls_total",
+                    "Callbacks that blocked the event loop past the threshold",
+                    ["command"]))
+
+
+@dataclasses.dataclass
+class Stall:
+    """Stall -> A callback that kept the event loop busy for longer than the watchdog threshold"""
+    detected_at: datetime.datetime
+    command: typing.Optional[str]
+    stack: typing.List[str]
+    duration: typing.Optional[float] = None
+
+    @property
+    def culprit(self) -> str:
+        return self.stack[-1].strip().splitlines()[0] if self.stack else "?"
+
+
+class LoopWatchdog:
+    """LoopWatchdog -> Measures event loop lag and captures the stack of whatever blocks it
+
+    A heartbeat task stamps the time every `interval` seconds. A separate thread notices when the
+    stamp goes stale for `threshold` seconds and snapshots the loop thread's stack while it is
+    still stuck, along with the command that task was running"""
+    def __init__(self,
+                 loop: asyncio.AbstractEventLoop,
+                 threshold: float = 0.25,
+                 interval: float = 0.1,
+                 history: int = 50) -> None:
+        self.loop = loop
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls: typing.Deque[Stall] = collections.deque(maxlen=history)
+        # Task -> qualified name of the command it is invoking
+        self.commands: typing.Dict[asyncio.Task, str] = {}
+        self._beat = time.monotonic()
+        self._pending: typing.Optional[Stall] = None
+        self._loop_thread: typing.Optional[int] = None
+        self._heartbeat: typing.Optional[asyncio.Task] = None
+        self._thread: typing.Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        if self._heartbeat is not None:
+            return
+
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat = self.loop.create_task(self._run())
+        self._thread = threading.Thread(target=self._watch,
+                                        name="djdiscord-watchdog",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+
+    def track(self, command: str) -> None:
+        """track -> Attribute stalls in the current task to `command` until `untrack` is called"""
+        if (task := asyncio.current_task()) is not None:
+            self.commands[task] = command
+
+    def untrack(self) -> None:
+        if (task := asyncio.current_task()) is not None:
+            self.commands.pop(task, None)
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+
+            lag = max(now - expected, 0.0)
+            metrics.loop_lag.observe(lag)
+
+            if (stall := self._pending) is not None:
+                self._pending = None
+                # The loop got going again between the thread's check and its capture
+                if lag < self.threshold:
+                    continue
+                stall.duration = lag
+                self.stalls.append(stall)
+                loop_stalls.inc(command=stall.command or "")
+                print("Event loop blocked for %.3fs%s at %s" %
+                      (lag, " in %s" % stall.command if stall.command else "",
+                       stall.culprit))
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.threshold / 2):
+            if (self._pending is None
+                    and time.monotonic() - self._beat >= self.threshold +
+                    self.interval):
+                self._pending = self._capture()
+
+    def _capture(self) -> Stall:
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = traceback.format_stack(frame) if frame is not None else []
+
+        # Reading another loop's running task is racy, but the loop is stuck so it won't change
+        try:
+            task = asyncio.current_task(self.loop)
+        except RuntimeError:
+            task = None
+        return Stall(datetime.datetime.now(), self.commands.get(task), stack)